@@ -1,6 +1,37 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib import admin
 
-from core.models import State, NotificationType, System, Template, Provider, Notification, Organisation
+from core.backend.send_pacer import backlog_subquery, effective_rate
+from core.models import State, NotificationType, System, Template, Provider, Notification, Organisation, DeviceToken, \
+    Campaign, SMSRoute, Suppression, NotificationRecipient
+
+
+class PacingBacklogAdminMixin:
+    """
+    Shows the paced backlog of each row and how long it takes to drain at the row's effective send rate.
+    """
+    backlog_field = None
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(backlog=backlog_subquery(self.backlog_field))
+
+    def send_rate_limit(self, obj):
+        raise NotImplementedError
+
+    @admin.display(description="Backlog", ordering="backlog")
+    def backlog(self, obj):
+        return obj.backlog
+
+    @admin.display(description="Drain time")
+    def drain_time(self, obj):
+        rate = self.send_rate_limit(obj)
+        if not obj.backlog:
+            return "-"
+        if not rate:
+            return "unpaced"
+        return str(timedelta(seconds=round(obj.backlog / rate)))
 
 
 @admin.register(State)
@@ -14,33 +45,45 @@ class NotificationTypeAdmin(admin.ModelAdmin):
     search_fields = ('id', 'name', 'description')
 
 @admin.register(System)
-class SystemAdmin(admin.ModelAdmin):
+class SystemAdmin(PacingBacklogAdminMixin, admin.ModelAdmin):
+    backlog_field = 'system'
     list_display = (
         'name', 'description', 'email_signature', 'sms_signature', 'default_from_email', 'callback_type',
-        'date_modified', 'date_created')
+        'max_send_rate', 'max_sms_segments', 'coalesce_window', 'backlog', 'drain_time', 'date_modified',
+        'date_created')
     list_filter = ('callback_type',)
     search_fields = (
         'id', 'name', 'description', 'email_signature', 'sms_signature', 'default_from_email', 'callback_type',
         'queue_name')
 
+    def send_rate_limit(self, obj):
+        return obj.max_send_rate
+
 @admin.register(Organisation)
-class OrganisationAdmin(admin.ModelAdmin):
-    list_display = ('name', 'description', 'system', 'date_modified', 'date_created')
+class OrganisationAdmin(PacingBacklogAdminMixin, admin.ModelAdmin):
+    backlog_field = 'organisation'
+    list_display = (
+        'name', 'description', 'system', 'max_send_rate', 'backlog', 'drain_time', 'date_modified', 'date_created')
     list_filter = ('system',)
+    list_select_related = ('system',)
     search_fields = ('id', 'name', 'description', 'system__name')
 
+    def send_rate_limit(self, obj):
+        return effective_rate(obj.max_send_rate, obj.system.max_send_rate)
+
 @admin.register(Template)
 class TemplateAdmin(admin.ModelAdmin):
     list_display = (
-        'name', 'description', 'notification_type', 'subject', 'body', 'is_active', 'date_modified',
-        'date_created')
+        'name', 'description', 'notification_type', 'subject', 'body', 'coalesce_window', 'is_active',
+        'date_modified', 'date_created')
     list_filter = ('notification_type', 'is_active')
     search_fields = ('id', 'name', 'description', 'notification_type__name', 'subject')
 
 @admin.register(Provider)
 class ProviderAdmin(admin.ModelAdmin):
     list_display = (
-        'name', 'description', 'notification_type', 'priority', 'config', 'is_active', 'date_modified', 'date_created')
+        'name', 'description', 'notification_type', 'priority', 'cost_per_segment', 'config', 'is_active',
+        'date_modified', 'date_created')
     list_filter = ('notification_type', 'is_active')
     search_fields = ('id', 'name', 'description', 'notification_type__name')
 
@@ -48,9 +91,61 @@ class ProviderAdmin(admin.ModelAdmin):
 class NotificationAdmin(admin.ModelAdmin):
     list_display = (
         'system', 'organisation', 'unique_identifier', 'notification_type', 'recipients', 'template', 'provider',
-        'context', 'sent_time', 'status', 'date_modified', 'date_created')
+        'context', 'send_at', 'sent_time', 'status', 'recipient_count', 'sent_count', 'failed_count',
+        'coalesced_count', 'date_modified', 'date_created')
     list_filter = ('system', 'organisation', 'notification_type', 'template', 'provider', 'status')
     search_fields = (
         'id', 'system__name', 'organisation__name', 'unique_identifier', 'notification_type__name', 'recipients',
         'template__name', 'provider__name', 'status__name')
+    raw_id_fields = ('coalesced_into',)
+
+@admin.register(NotificationRecipient)
+class NotificationRecipientAdmin(admin.ModelAdmin):
+    list_display = (
+        'recipient', 'notification', 'status', 'provider_message_id', 'error', 'delivered_at', 'date_modified',
+        'date_created')
+    list_filter = ('status',)
+    list_select_related = ('notification__system', 'notification__notification_type')
+    search_fields = ('recipient', 'provider_message_id', 'notification__id')
+    raw_id_fields = ('notification',)
+
+@admin.register(DeviceToken)
+class DeviceTokenAdmin(admin.ModelAdmin):
+    list_display = ('token', 'is_valid', 'invalid_reason', 'invalidated_at', 'date_modified', 'date_created')
+    list_filter = ('is_valid', 'invalid_reason')
+    search_fields = ('id', 'token', 'token_hash')
+
+@admin.register(Campaign)
+class CampaignAdmin(PacingBacklogAdminMixin, admin.ModelAdmin):
+    backlog_field = 'campaign'
+    list_display = (
+        'name', 'system', 'organisation', 'notification_type', 'template', 'status', 'send_rate', 'rows_read',
+        'rows_rejected', 'notifications_created', 'backlog', 'drain_time', 'started_at', 'completed_at',
+        'date_created')
+    list_filter = ('system', 'notification_type', 'status')
+    search_fields = ('id', 'name', 'system__name', 'organisation__name', 'template__name')
+    readonly_fields = (
+        'status', 'run_token', 'source_offset', 'rows_read', 'rows_rejected', 'notifications_created', 'error',
+        'started_at', 'completed_at')
+    list_select_related = ('system', 'organisation', 'notification_type', 'template')
+
+    def send_rate_limit(self, obj):
+        return effective_rate(
+            obj.send_rate or settings.CAMPAIGN_DEFAULT_SEND_RATE, obj.organisation and obj.organisation.max_send_rate,
+            obj.system.max_send_rate)
+
+@admin.register(SMSRoute)
+class SMSRouteAdmin(admin.ModelAdmin):
+    list_display = (
+        'prefix', 'provider', 'priority', 'cost_per_segment', 'description', 'is_active', 'date_modified',
+        'date_created')
+    list_filter = ('provider', 'is_active')
+    list_select_related = ('provider',)
+    search_fields = ('id', 'prefix', 'description', 'provider__name')
 
+@admin.register(Suppression)
+class SuppressionAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'system', 'reason', 'date_modified', 'date_created')
+    list_filter = ('reason', 'system')
+    list_select_related = ('system',)
+    search_fields = ('id', 'recipient', 'system__name')
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import queue
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Optional, Tuple, Any, Union
+
+from asgiref.sync import sync_to_async
+from celery import Task
+from celery.exceptions import Retry
+from django.utils import timezone
+from kombu import Message
+
+from core.backend.db_connections import DatabaseThreadPoolExecutor
+from core.backend.metrics import QUEUE_WAIT
+from core.backend.notification_manager import NotificationManager
+from core.backend.worker_warmup import warm_up_worker, warmup_enabled
+from core.models import Provider
+from notify.celery import app
+
+logger = logging.getLogger(__name__)
+
+SEND_NOTIFICATION_TASK = "notify.send_notification"
+DELIVER_NOTIFICATION_TASK = "notify.deliver_notification"
+
+
+class AsyncDeliveryWorker:
+    """
+    Delivery worker that runs many in-flight sends concurrently on a single asyncio event loop.
+
+    A consumer thread pulls Celery task messages from the broker and hands them to the loop.
+    Notification sends use the providers' send_async, bounded globally by `concurrency` and per
+    provider by `provider_concurrency`. Database work runs on a bounded thread pool.
+    """
+
+    def __init__(
+            self, queue_name: Optional[str] = None, concurrency: int = 500, provider_concurrency: int = 50,
+            db_threads: int = 20, max_retries: int = 3, retry_delay: int = 30):
+        self.queue_name = queue_name or app.conf.task_default_queue
+        self.concurrency = concurrency
+        self.provider_concurrency = provider_concurrency
+        self.db_threads = db_threads
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._provider_semaphores: Dict[Any, asyncio.Semaphore] = {}
+        self._in_flight: set = set()
+        self._in_flight_lock = threading.Lock()
+        self._finished: "queue.Queue[Message]" = queue.Queue()
+        self._stopping = threading.Event()
+
+    def provider_semaphore(self, provider: Provider) -> asyncio.Semaphore:
+        """
+        Returns the semaphore bounding concurrent sends through a provider.
+
+        A provider's config may set `max_concurrency` to override the worker-wide default.
+        """
+        semaphore = self._provider_semaphores.get(provider.id)
+        if semaphore is None:
+            limit = int(provider.config.get("max_concurrency", self.provider_concurrency))
+            semaphore = asyncio.Semaphore(limit)
+            self._provider_semaphores[provider.id] = semaphore
+        return semaphore
+
+    def run(self) -> None:
+        """
+        Runs the worker until SIGINT or SIGTERM, then drains in-flight sends.
+        """
+        asyncio.run(self._main())
+
+    async def _main(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop.set_default_executor(
+            DatabaseThreadPoolExecutor(max_workers=self.db_threads, thread_name_prefix="delivery-db"))
+        self._slots = asyncio.Semaphore(self.concurrency)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self._loop.add_signal_handler(sig, self._stopping.set)
+
+        if warmup_enabled():
+            # Consume only once reference data, templates and provider clients are warm
+            await asyncio.to_thread(warm_up_worker)
+
+        consumer = threading.Thread(target=self._consume, name="delivery-consumer", daemon=True)
+        consumer.start()
+        logger.info(
+            "AsyncDeliveryWorker - consuming '%s' with concurrency %d (%d per provider)",
+            self.queue_name, self.concurrency, self.provider_concurrency)
+
+        while not self._stopping.is_set():
+            await asyncio.sleep(0.5)
+
+        logger.info("AsyncDeliveryWorker - shutting down, waiting for %d in-flight sends", len(self._in_flight))
+        while self._in_flight:
+            await asyncio.sleep(0.1)
+        await asyncio.to_thread(consumer.join, 10)
+
+    def _consume(self) -> None:
+        """
+        Consumer thread: receives messages and acknowledges the ones the loop has finished with.
+
+        Broker channels are not thread-safe, so acks always happen on this thread.
+        """
+        with app.connection_for_read() as connection:
+            task_queue = app.amqp.queues[self.queue_name]
+            with connection.Consumer(
+                    [task_queue], callbacks=[self._on_message], accept=["json"], prefetch_count=self.concurrency):
+                while not self._stopping.is_set():
+                    try:
+                        connection.drain_events(timeout=0.2)
+                    except socket.timeout:
+                        pass
+                    self._ack_finished()
+                # Give in-flight sends the chance to finish so their messages are acked rather than redelivered
+                while self._in_flight:
+                    self._ack_finished()
+                    self._stopping.wait(0.2)
+                self._ack_finished()
+
+    def _ack_finished(self) -> None:
+        while True:
+            try:
+                message = self._finished.get_nowait()
+            except queue.Empty:
+                return
+            message.ack()
+
+    def _on_message(self, body: Tuple, message: Message) -> None:
+        future = asyncio.run_coroutine_threadsafe(self._handle(body, message), self._loop)
+        with self._in_flight_lock:
+            self._in_flight.add(future)
+        future.add_done_callback(self._discard_in_flight)
+
+    def _discard_in_flight(self, future) -> None:
+        with self._in_flight_lock:
+            self._in_flight.discard(future)
+
+    async def _handle(self, body: Tuple, message: Message) -> None:
+        """
+        Processes one task message and queues it for acknowledgement.
+
+        Failed tasks are republished (see _retry); tasks this worker does not know are dropped.
+        """
+        task_name = message.headers.get("task")
+        try:
+            args, kwargs, _ = body
+
+            eta = message.headers.get("eta")
+            if eta:
+                eta = datetime.fromisoformat(eta)
+                if eta.tzinfo is None:
+                    eta = eta.replace(tzinfo=dt_timezone.utc)
+                delay = (eta - timezone.now()).total_seconds()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            async with self._slots:
+                try:
+                    if task_name == SEND_NOTIFICATION_TASK:
+                        await self._send_notification(*args, enqueued_at=message.headers.get("enqueued_at"), **kwargs)
+                    elif task_name == DELIVER_NOTIFICATION_TASK:
+                        await self._deliver_notification(*args, **kwargs)
+                    elif task_name in app.tasks:
+                        # Tasks without an async implementation run in-process on the thread pool
+                        await sync_to_async(self._run_task, thread_sensitive=False)(
+                            app.tasks[task_name], message, args, kwargs)
+                    else:
+                        logger.error("AsyncDeliveryWorker - dropping unknown task %s", task_name)
+                except Retry as ex:
+                    await sync_to_async(self._retry, thread_sensitive=False)(message, args, kwargs, when=ex.when)
+                except Exception as ex:
+                    logger.exception("AsyncDeliveryWorker - %s exception: %s", task_name, ex)
+                    await sync_to_async(self._retry, thread_sensitive=False)(message, args, kwargs)
+        finally:
+            self._finished.put(message)
+
+    async def _send_notification(self, notification_data: Dict, enqueued_at: Optional[float] = None) -> None:
+        queued_at = None
+        if enqueued_at:
+            QUEUE_WAIT.observe(max(time.time() - enqueued_at, 0.0), task=SEND_NOTIFICATION_TASK)
+            queued_at = datetime.fromtimestamp(enqueued_at, tz=dt_timezone.utc)
+
+        manager = NotificationManager()
+        notification = await sync_to_async(manager.save_notification, thread_sensitive=False)(
+            notification_data, queued_at=queued_at)
+        if notification and not (notification.send_at or notification.paced):
+            await manager.send_notification_async(notification, provider_limiter=self.provider_semaphore)
+
+    async def _deliver_notification(self, notification_id: str) -> None:
+        manager = NotificationManager()
+        notification = await sync_to_async(manager.claim_stored_notification, thread_sensitive=False)(
+            notification_id)
+        if notification:
+            await manager.send_notification_async(notification, provider_limiter=self.provider_semaphore)
+
+    @staticmethod
+    def _run_task(task: Task, message: Message, args: Tuple, kwargs: Dict) -> Any:
+        """
+        Runs a Celery task in this thread with the message's request, as a Celery worker would.
+
+        Unlike task.apply(), a retry the task asks for is not re-run straight away: the Retry is raised
+        with the task's countdown or ETA for _handle to republish it.
+        """
+        task.push_request(
+            id=message.headers.get("id"), args=args, kwargs=kwargs, retries=message.headers.get("retries", 0) or 0,
+            is_eager=True, called_directly=False)
+        try:
+            return task.run(*args, **kwargs)
+        finally:
+            task.pop_request()
+
+    def _retry(
+            self, message: Message, args: Tuple, kwargs: Dict,
+            when: Optional[Union[float, int, datetime]] = None) -> None:
+        """
+        Republishes a failed task with a countdown, mirroring the Celery task's retry policy.
+
+        :param when: Countdown in seconds or ETA the task asked for when it retried itself; retry_delay if None.
+        """
+        retries = message.headers.get("retries", 0) or 0
+        if retries >= self.max_retries:
+            logger.error("AsyncDeliveryWorker - giving up on %s after %d retries", message.headers.get("id"), retries)
+            return
+        schedule = {"eta": when} if isinstance(when, datetime) else {
+            "countdown": self.retry_delay if when is None else when}
+        app.send_task(
+            message.headers.get("task"), args=args, kwargs=kwargs, retries=retries + 1, queue=self.queue_name,
+            **schedule)
@@ -0,0 +1,258 @@
+import base64
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from email.mime.base import MIMEBase
+from os.path import basename
+from typing import Dict, List, Optional, Tuple, Union, BinaryIO
+
+from django.conf import settings
+
+from core.backend.metrics import CACHE_REQUESTS
+
+# 57 raw bytes encode to exactly one 76 character base64 line, so chunks that are a multiple of 57
+# can be encoded independently and concatenated without re-wrapping lines.
+STREAM_CHUNK_SIZE = 57 * 1024
+
+BLOB_PREFIX = "sha256:"
+
+AttachmentReference = Union[str, Dict[str, str]]
+
+
+class EncodedAttachmentCache:
+    """
+    Size-bounded LRU cache of base64-encoded attachment payloads keyed by content hash.
+
+    Payloads larger than max_entry_bytes (a quarter of the cache by default) are never cached, so one
+    large file cannot flush it.
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 4 if max_entry_bytes is None else max_entry_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> Optional[str]:
+        """
+        Returns the cached encoded payload for a content hash and marks it as recently used.
+
+        :param digest: The sha256 hex digest of the raw attachment content.
+        :return: The encoded payload, or None on a cache miss.
+        """
+        with self._lock:
+            encoded = self._entries.get(digest)
+            if encoded is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+        CACHE_REQUESTS.inc(cache="attachment", result="miss" if encoded is None else "hit")
+        return encoded
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+        CACHE_REQUESTS.inc(cache="attachment", result="miss")
+
+    def cacheable(self, size: int) -> bool:
+        return size <= self.max_entry_bytes
+
+    def put(self, digest: str, encoded: str) -> None:
+        """
+        Caches an encoded payload, evicting the least recently used entries to stay within max_bytes.
+
+        :param digest: The sha256 hex digest of the raw attachment content.
+        :param encoded: The base64-encoded payload.
+        """
+        size = len(encoded)
+        if not self.cacheable(size):
+            return
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                return
+            self._entries[digest] = encoded
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+attachment_cache = EncodedAttachmentCache(getattr(settings, "ATTACHMENT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Content hash of files referenced by path, keyed by (path, size, mtime) so unchanged files are never re-hashed
+PATH_DIGESTS_MAX_ENTRIES = 10000
+_path_digests: Dict[Tuple[str, int, int], str] = {}
+_path_digests_lock = threading.Lock()
+
+
+def blob_path(digest: str) -> str:
+    """
+    Returns the location of a content-addressed blob in the blob store.
+
+    :param digest: The sha256 hex digest of the blob.
+    :return: Absolute path of the blob file.
+    """
+    if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+        raise ValueError(f"Invalid blob reference: {digest}")
+    return os.path.join(str(settings.ATTACHMENT_BLOB_ROOT), digest[:2], digest)
+
+
+def store_blob(source: BinaryIO) -> str:
+    """
+    Streams a file-like object into the content-addressed blob store.
+
+    :param source: Binary file-like object to store.
+    :return: A blob reference ("sha256:<digest>") usable as an email attachment.
+    """
+    os.makedirs(str(settings.ATTACHMENT_BLOB_ROOT), exist_ok=True)
+    sha256 = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=str(settings.ATTACHMENT_BLOB_ROOT), delete=False) as tmp:
+        for chunk in iter(lambda: source.read(STREAM_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+            tmp.write(chunk)
+    digest = sha256.hexdigest()
+    destination = blob_path(digest)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(tmp.name, destination)
+    return BLOB_PREFIX + digest
+
+
+def _encoded_size(size: int) -> int:
+    # Every 57 raw bytes (or fewer, for the last line) become a 76 character line and its newline
+    return -(-size // 57) * 77
+
+
+def _stream_encode(path: str) -> Tuple[str, str]:
+    """
+    Base64-encodes a file chunk by chunk while hashing it, without holding the raw content in memory.
+
+    :param path: File to encode.
+    :return: Tuple of (sha256 hex digest, encoded payload).
+    """
+    sha256 = hashlib.sha256()
+    encoded = bytearray()
+    with open(path, "rb") as fil:
+        for chunk in iter(lambda: fil.read(STREAM_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+            encoded += base64.encodebytes(chunk)
+    return sha256.hexdigest(), encoded.decode("ascii")
+
+
+def is_blob_reference(reference: AttachmentReference) -> bool:
+    """
+    Whether an attachment reference names a blob in the blob store rather than a file path.
+    """
+    if isinstance(reference, str):
+        return reference.startswith(BLOB_PREFIX)
+    return isinstance(reference, dict) and bool(reference.get("blob")) and not reference.get("path")
+
+
+def _confined_path(path: str) -> str:
+    """
+    Resolves a file path referenced by an attachment, which must lie inside the blob store.
+
+    :raises ValueError: If the path resolves (e.g. through '..' or a symlink) to anywhere else.
+    """
+    root = os.path.realpath(str(settings.ATTACHMENT_BLOB_ROOT))
+    resolved = os.path.realpath(path)
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"Attachment path is outside the attachment store: {path}")
+    return resolved
+
+
+def _parse_reference(reference: AttachmentReference) -> Tuple[str, Optional[str], Optional[str], Optional[str]]:
+    """
+    Normalises an attachment reference into (path, digest, filename, content_type).
+
+    A reference is either a blob reference ("sha256:<digest>"), a file path inside ATTACHMENT_BLOB_ROOT,
+    or a dict with a 'blob' or 'path' key and optional 'filename' and 'content_type' keys.
+    """
+    if isinstance(reference, str):
+        reference = {"blob": reference} if reference.startswith(BLOB_PREFIX) else {"path": reference}
+
+    digest = None
+    if reference.get("blob"):
+        digest = reference["blob"].removeprefix(BLOB_PREFIX)
+        path = blob_path(digest)
+    elif reference.get("path"):
+        path = _confined_path(reference["path"])
+    else:
+        raise ValueError("Attachment reference requires a 'path' or 'blob'")
+
+    filename = reference.get("filename") or (basename(path) if digest is None else digest[:12])
+    return path, digest, filename, reference.get("content_type")
+
+
+def get_encoded_payload(path: str, digest: Optional[str] = None) -> str:
+    """
+    Returns the base64-encoded content of a file, from the cache when the content was seen before.
+
+    Files whose encoding is too large to cache are encoded for the message being built and dropped with it.
+
+    :param path: File to encode.
+    :param digest: The content hash if already known (blob references).
+    :raises ValueError: If the file is larger than ATTACHMENT_MAX_BYTES.
+    :return: The encoded payload.
+    """
+    stat = os.stat(path)
+    max_size = getattr(settings, "ATTACHMENT_MAX_BYTES", 25 * 1024 * 1024)
+    if stat.st_size > max_size:
+        raise ValueError(f"Attachment is larger than {max_size} bytes: {basename(path)}")
+    if not attachment_cache.cacheable(_encoded_size(stat.st_size)):
+        return _stream_encode(path)[1]
+
+    stat_key = None
+    if digest is None:
+        stat_key = (path, stat.st_size, stat.st_mtime_ns)
+        digest = _path_digests.get(stat_key)
+
+    if digest is not None:
+        encoded = attachment_cache.get(digest)
+        if encoded is not None:
+            return encoded
+    else:
+        attachment_cache.record_miss()
+
+    digest, encoded = _stream_encode(path)
+    if stat_key is not None:
+        with _path_digests_lock:
+            if len(_path_digests) >= PATH_DIGESTS_MAX_ENTRIES:
+                _path_digests.clear()
+            _path_digests[stat_key] = digest
+    attachment_cache.put(digest, encoded)
+    return encoded
+
+
+def build_attachment_parts(references: Optional[List[AttachmentReference]]) -> List[MIMEBase]:
+    """
+    Builds MIME parts for a list of attachment references, reusing cached encodings.
+
+    :param references: Blob references, file paths inside the blob store or reference dicts.
+    :raises ValueError: If a reference is invalid, outside the blob store or too large.
+    :return: List of base64-encoded MIME parts ready to attach to a message.
+    """
+    parts = []
+    for reference in references or []:
+        path, digest, filename, content_type = _parse_reference(reference)
+        content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        maintype, subtype = content_type.split("/", 1)
+
+        part = MIMEBase(maintype, subtype, name=filename)
+        part.set_payload(get_encoded_payload(path, digest))
+        part['Content-Transfer-Encoding'] = 'base64'
+        part['Content-Disposition'] = f'attachment; filename="{filename}"'
+        parts.append(part)
+    return parts
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from kombu.serialization import dumps
+
+from notify.celery import app
+
+if TYPE_CHECKING:
+    import aio_pika
+    from aio_pika.pool import Pool
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTaskPublisher:
+    """
+    Non-blocking publisher of Celery task messages for the ASGI ingestion views.
+
+    Messages are built with Celery's own protocol (so ordinary Celery workers and the asyncio
+    delivery worker consume them unchanged) and published over aio-pika using a pool of channels
+    on one robust connection per event loop. Brokers other than AMQP, and eager mode, fall back to
+    Celery's publisher in a worker thread.
+    """
+
+    def __init__(self, broker_url: str, channel_pool_size: int = 10):
+        self.broker_url = broker_url
+        self.channel_pool_size = channel_pool_size
+        self._connection: Optional["aio_pika.abc.AbstractRobustConnection"] = None
+        self._channel_pool: Optional["Pool"] = None
+        self._declared_queues: set = set()
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def uses_amqp(self) -> bool:
+        return self.broker_url.startswith(("amqp://", "amqps://")) and not app.conf.task_always_eager
+
+    async def _get_channel_pool(self) -> "Pool":
+        # aio-pika is only needed by ASGI deployments publishing over AMQP, so WSGI workers never import it
+        import aio_pika
+        from aio_pika.pool import Pool
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Connections are bound to the loop they were created on
+            self._loop, self._lock, self._connection, self._channel_pool = loop, asyncio.Lock(), None, None
+            self._declared_queues = set()
+
+        async with self._lock:
+            if self._channel_pool is None:
+                self._connection = await aio_pika.connect_robust(self.broker_url)
+                self._channel_pool = Pool(self._connection.channel, max_size=self.channel_pool_size)
+        return self._channel_pool
+
+    @staticmethod
+    def _build_message(task_name: str, args: Tuple, kwargs: Dict) -> Tuple[str, "aio_pika.Message"]:
+        import aio_pika
+
+        task_id = str(uuid.uuid4())
+        headers, properties, body, _ = app.amqp.as_task_v2(task_id, task_name, args=args, kwargs=kwargs)
+        headers["enqueued_at"] = time.time()
+        content_type, content_encoding, data = dumps(body, serializer=app.conf.task_serializer)
+        message = aio_pika.Message(
+            body=data if isinstance(data, bytes) else data.encode(content_encoding),
+            headers=headers,
+            content_type=content_type,
+            content_encoding=content_encoding,
+            correlation_id=properties.get("correlation_id", task_id),
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        )
+        return task_id, message
+
+    async def publish(
+            self, task_name: str, args: Tuple = (), kwargs: Optional[Dict] = None, queue: Optional[str] = None) -> str:
+        """
+        Publishes a task message without blocking the event loop.
+
+        :param task_name: Registered Celery task name.
+        :param args: Positional task arguments.
+        :param kwargs: Keyword task arguments.
+        :param queue: Destination queue (default: the Celery default queue).
+        :return: The task id.
+        """
+        queue = queue or app.conf.task_default_queue
+        kwargs = kwargs or {}
+
+        if not self.uses_amqp:
+            result = await sync_to_async(app.tasks[task_name].apply_async, thread_sensitive=False)(
+                args=args, kwargs=kwargs, queue=queue)
+            return result.id
+
+        task_id, message = self._build_message(task_name, args, kwargs)
+        channel_pool = await self._get_channel_pool()
+        async with channel_pool.acquire() as channel:
+            if queue not in self._declared_queues:
+                await channel.declare_queue(queue, durable=True)
+                self._declared_queues.add(queue)
+            await channel.default_exchange.publish(message, routing_key=queue)
+        return task_id
+
+
+task_publisher = AsyncTaskPublisher(
+    settings.CELERY_BROKER_URL, channel_pool_size=getattr(settings, "BROKER_CHANNEL_POOL_SIZE", 10))
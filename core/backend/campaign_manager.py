@@ -0,0 +1,351 @@
+import csv
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+from uuid import UUID
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from core.backend.recipient_normaliser import normalise_recipients
+from core.backend.send_pacer import backlog_queryset
+from core.backend.services import CampaignService, NotificationTypeService, OrganisationService, SystemService, \
+    TemplateService
+from core.backend.suppression_list import SUPPRESSIBLE_NOTIFICATION_TYPES, suppression_list
+from core.models import Campaign, Notification, State
+
+logger = logging.getLogger(__name__)
+
+SOURCE_EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+class CampaignSourceReader:
+    """
+    Streams recipient rows from a campaign's source file, starting at a byte offset.
+
+    Only the rows being read are held in memory. After each row, `offset` is the byte position of
+    the next one, so a later tick (or a resumed campaign) continues exactly where this one stopped.
+
+    :param fil: The source file, opened in binary mode.
+    :param source_format: "csv" (with a header row) or "ndjson" (one JSON object per line).
+    :param offset: Byte offset of the first row to read; 0 for the start of the file.
+    """
+
+    def __init__(self, fil: BinaryIO, source_format: str, offset: int = 0):
+        self.fil = fil
+        self.source_format = source_format
+        self.offset = 0
+        self.header: List[str] = []
+        if source_format == "csv":
+            self.fil.seek(0)
+            self.header = [column.strip() for column in next(csv.reader(self._lines()), [])]
+        if offset:
+            self.fil.seek(offset)
+            self.offset = offset
+
+    def _lines(self) -> Iterator[str]:
+        while True:
+            line = self.fil.readline()
+            if not line:
+                return
+            self.offset = self.fil.tell()
+            yield line.decode("utf-8-sig")
+
+    def rows(self) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Yields each row as a dict, or None for a row that cannot be parsed.
+        """
+        if self.source_format == "csv":
+            for values in csv.reader(self._lines()):
+                if values:
+                    yield dict(zip(self.header, values))
+            return
+
+        for line in self._lines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else None
+
+
+class CampaignManager:
+    @staticmethod
+    def _source_format(data: Dict, source: UploadedFile) -> str:
+        source_format = str(data.get("source_format") or "").lower()
+        if not source_format:
+            source_format = SOURCE_EXTENSIONS.get(os.path.splitext(source.name)[1].lower(), "")
+        if source_format not in dict(Campaign.SOURCE_FORMATS):
+            raise ValueError("'source_format' must be csv or ndjson")
+        return source_format
+
+    def create_campaign(self, data: Dict, source: UploadedFile) -> Campaign:
+        """
+        Creates a campaign from its settings and recipient file, and starts processing it.
+
+        :param data: Campaign settings: name, system, notification_type, template and optionally
+            organisation, context (a dict or JSON string), send_rate and source_format.
+        :param source: Uploaded CSV or NDJSON file with a "recipient" column/key per row. Other columns
+            or keys, and a "context" object in NDJSON rows, are merged over the shared context.
+        :return: The created campaign.
+        """
+        for key in ("name", "system", "notification_type", "template"):
+            if not data.get(key):
+                raise KeyError(f"Missing '{key}' in campaign data")
+
+        context = data.get("context") or {}
+        if isinstance(context, str):
+            context = json.loads(context)
+        if not isinstance(context, dict):
+            raise ValueError("'context' must be a dictionary")
+
+        system = SystemService().get(name=str(data["system"]).lower())
+        if system is None:
+            raise ValueError("Invalid system")
+        organisation = None
+        if data.get("organisation"):
+            organisation = OrganisationService().get(name=str(data["organisation"]).lower())
+            if organisation is None:
+                raise ValueError("Invalid organisation")
+        notification_type = NotificationTypeService().get(name=str(data["notification_type"]).lower())
+        if notification_type is None:
+            raise ValueError("Invalid notification type")
+        template = TemplateService().get(name=str(data["template"]).lower())
+        if template is None or template.notification_type_id != notification_type.id:
+            raise ValueError("Invalid template for the notification type")
+
+        send_rate = data.get("send_rate")
+        if send_rate not in (None, ""):
+            send_rate = int(send_rate)
+            if send_rate <= 0:
+                raise ValueError("'send_rate' must be positive")
+        else:
+            send_rate = None
+
+        campaign = CampaignService().create(
+            name=data["name"],
+            system=system,
+            organisation=organisation,
+            notification_type=notification_type,
+            template=template,
+            context=context,
+            source=source,
+            source_format=self._source_format(data, source),
+            send_rate=send_rate,
+        )
+        if campaign is None:
+            raise Exception("Campaign not created")
+        self._start(campaign.id, from_statuses=(Campaign.STATUS_PENDING,))
+        return campaign
+
+    @staticmethod
+    def _start(campaign_id: Union[UUID, str], from_statuses: Tuple[str, ...]) -> bool:
+        """
+        Starts a new chain of processing ticks. The new run token retires any chain still scheduled.
+        """
+        from core.tasks import process_campaign
+
+        run_token = uuid.uuid4()
+        fields = {"status": Campaign.STATUS_RUNNING, "run_token": run_token, "date_modified": timezone.now()}
+        if Campaign.STATUS_PENDING in from_statuses:
+            fields["started_at"] = timezone.now()
+        updated = CampaignService().manager.filter(pk=campaign_id, status__in=from_statuses).update(**fields)
+        if updated:
+            transaction.on_commit(lambda: process_campaign.delay(str(campaign_id), str(run_token)))
+        return bool(updated)
+
+    def resume(self, campaign_id: Union[UUID, str]) -> bool:
+        """
+        Resumes a paused campaign from the row where it stopped.
+
+        :param campaign_id: Campaign primary key.
+        :return: True if the campaign was paused and is running again.
+        """
+        return self._start(campaign_id, from_statuses=(Campaign.STATUS_PAUSED,))
+
+    @staticmethod
+    def pause(campaign_id: Union[UUID, str]) -> bool:
+        """
+        Stops materialising further recipients and holds back the campaign's paced backlog. Notifications
+        the send pacer already released (at most two pacer ticks' worth) are still sent.
+
+        :param campaign_id: Campaign primary key.
+        :return: True if the campaign was running and is now paused.
+        """
+        return bool(CampaignService().manager.filter(
+            pk=campaign_id, status__in=(Campaign.STATUS_PENDING, Campaign.STATUS_RUNNING)).update(
+            status=Campaign.STATUS_PAUSED, date_modified=timezone.now()))
+
+    @staticmethod
+    def cancel(campaign_id: Union[UUID, str]) -> bool:
+        """
+        Stops the campaign for good and fails its notifications that no worker has picked up yet.
+
+        :param campaign_id: Campaign primary key.
+        :return: True if the campaign was cancelled.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            cancelled = CampaignService().manager.filter(
+                pk=campaign_id,
+                status__in=(Campaign.STATUS_PENDING, Campaign.STATUS_RUNNING, Campaign.STATUS_PAUSED)).update(
+                status=Campaign.STATUS_CANCELLED, completed_at=now, date_modified=now)
+            if cancelled:
+                Notification.objects.filter(
+                    campaign_id=campaign_id, status=State.pending(), processing_started_at__isnull=True).update(
+                    status=State.failed(), date_modified=now)
+        return bool(cancelled)
+
+    @staticmethod
+    def fail(campaign_id: Union[UUID, str], error: str) -> None:
+        CampaignService().manager.filter(pk=campaign_id).update(
+            status=Campaign.STATUS_FAILED, error=error, completed_at=timezone.now(), date_modified=timezone.now())
+
+    @staticmethod
+    def progress(campaign_id: Union[UUID, str]) -> Optional[Dict[str, Any]]:
+        """
+        Returns a campaign's status, materialisation counters and its notifications counted by state.
+
+        :param campaign_id: Campaign primary key.
+        :return: Progress dictionary, or None if the campaign does not exist.
+        """
+        campaign = CampaignService().get(pk=campaign_id)
+        if campaign is None:
+            return None
+        notifications = {
+            row["status__name"]: row["count"]
+            for row in Notification.objects.filter(campaign_id=campaign_id).values("status__name").annotate(
+                count=Count("id"))
+        }
+        return {
+            "campaign_id": str(campaign.id),
+            "name": campaign.name,
+            "status": campaign.status,
+            "send_rate": campaign.send_rate or settings.CAMPAIGN_DEFAULT_SEND_RATE,
+            "rows_read": campaign.rows_read,
+            "rows_rejected": campaign.rows_rejected,
+            "notifications_created": campaign.notifications_created,
+            "notifications": notifications,
+            "backlog": backlog_queryset().filter(campaign_id=campaign_id).count(),
+            "error": campaign.error,
+            "started_at": campaign.started_at,
+            "completed_at": campaign.completed_at,
+        }
+
+    @staticmethod
+    def _build_notification(
+            campaign: Campaign, row: Dict[str, Any], pending: State, now) -> Optional[Notification]:
+        """
+        Turns one source row into an unsaved Notification, or None if the row has no recipient left to send to.
+        """
+        row = dict(row)
+        recipient = row.pop("recipient", None) or row.pop("recipients", None)
+        if not recipient:
+            return None
+        normalised = normalise_recipients(
+            campaign.notification_type.name, recipient if isinstance(recipient, list) else str(recipient))
+        recipients = normalised.valid
+        if not recipients:
+            return None
+        if campaign.notification_type.name in SUPPRESSIBLE_NOTIFICATION_TYPES:
+            recipients, _ = suppression_list.split(campaign.system, recipients)
+            if not recipients:
+                return None
+        unique_identifier = str(row.pop("unique_identifier", "") or "")
+
+        context = dict(campaign.context)
+        row_context = row.pop("context", None)
+        # CSV cells left empty fall back to the shared context
+        context.update({key: value for key, value in row.items() if key and value != ""})
+        if isinstance(row_context, dict):
+            context.update(row_context)
+
+        return Notification(
+            system=campaign.system,
+            organisation=campaign.organisation,
+            notification_type=campaign.notification_type,
+            template=campaign.template,
+            recipients=recipients,
+            rejected_recipients=normalised.rejected,
+            context=context,
+            unique_identifier=unique_identifier,
+            status=pending,
+            campaign=campaign,
+            queued_at=now,
+            paced=True,
+        )
+
+    def process_tick(self, campaign_id: Union[UUID, str], run_token: str) -> Optional[float]:
+        """
+        Materialises the next chunk of a running campaign into the paced backlog.
+
+        Each tick reads up to send_rate * CAMPAIGN_TICK_SECONDS rows (at most CAMPAIGN_MAX_CHUNK_SIZE)
+        and inserts their notifications with bulk inserts; the send pacer releases them to delivery at
+        the campaign's, organisation's and system's send rates. A tick only tops the campaign's backlog up
+        to two chunks, so a campaign held back by a slower system or organisation rate stops reading its
+        source instead of piling up notifications. The caller schedules the next tick after the returned
+        delay, so no worker is held in between.
+
+        :param campaign_id: Campaign primary key.
+        :param run_token: Token of the chain of ticks this one belongs to.
+        :return: Seconds until the next tick, or None when the campaign is finished, paused or cancelled.
+        """
+        started = time.perf_counter()
+        with transaction.atomic():
+            campaign = Campaign.objects.select_for_update().select_related(
+                "system", "organisation", "notification_type", "template").filter(pk=campaign_id).first()
+            if campaign is None or campaign.status != Campaign.STATUS_RUNNING or str(campaign.run_token) != run_token:
+                return None
+
+            rate = campaign.send_rate or settings.CAMPAIGN_DEFAULT_SEND_RATE
+            chunk_size = max(1, min(int(rate * settings.CAMPAIGN_TICK_SECONDS), settings.CAMPAIGN_MAX_CHUNK_SIZE))
+            backlog = Notification.objects.filter(
+                campaign_id=campaign.pk, status=State.pending(), processing_started_at__isnull=True).count()
+            to_read = min(chunk_size, 2 * chunk_size - backlog)
+            if to_read <= 0:
+                return settings.CAMPAIGN_TICK_SECONDS
+
+            now = timezone.now()
+            pending = State.pending()
+            notifications, rows_read, rejected, exhausted = [], 0, 0, True
+            with campaign.source.open("rb") as fil:
+                reader = CampaignSourceReader(fil, campaign.source_format, campaign.source_offset)
+                for row in reader.rows():
+                    rows_read += 1
+                    notification = self._build_notification(campaign, row, pending, now) if row else None
+                    if notification is None:
+                        rejected += 1
+                    else:
+                        notifications.append(notification)
+                    if rows_read >= to_read:
+                        exhausted = False
+                        break
+                offset = reader.offset
+
+            Notification.objects.bulk_create(notifications, batch_size=1000)
+            fields = {
+                "source_offset": offset,
+                "rows_read": F("rows_read") + rows_read,
+                "rows_rejected": F("rows_rejected") + rejected,
+                "notifications_created": F("notifications_created") + len(notifications),
+                "date_modified": now,
+            }
+            if exhausted:
+                fields.update(status=Campaign.STATUS_COMPLETED, completed_at=now)
+            Campaign.objects.filter(pk=campaign.pk).update(**fields)
+
+        logger.info(
+            "CampaignManager - campaign %s: %d rows read, %d notifications queued, %d rejected",
+            campaign_id, rows_read, len(notifications), rejected)
+        if exhausted:
+            return None
+        return max(0.0, chunk_size / rate - (time.perf_counter() - started))
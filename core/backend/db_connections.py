@@ -0,0 +1,88 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+from celery.signals import task_failure, task_retry
+from django.conf import settings
+from django.db import close_old_connections, connections, DatabaseError, InterfaceError
+from django.db.backends.signals import connection_created
+
+from core.backend.metrics import DB_CONNECTIONS_OPENED
+
+logger = logging.getLogger(__name__)
+
+
+def close_broken_connections() -> None:
+    """
+    Closes this thread's connections that saw a connection-level error or outlived CONN_MAX_AGE, so the
+    next query reconnects instead of failing on a dead socket.
+    """
+    for conn in connections.all(initialized_only=True):
+        try:
+            conn.close_if_unusable_or_obsolete()
+        except DatabaseError as ex:
+            logger.warning("DBConnections - could not close connection %s: %s", conn.alias, ex)
+
+
+def _open_pool(conn):
+    # Pools are shared by all threads; read them without the backend's `pool` property, which creates one
+    return getattr(type(conn), "_connection_pools", {}).get(conn.alias)
+
+
+def close_connection_pools() -> None:
+    """
+    Closes this process's connection pools, e.g. before forking so children do not share their sockets.
+    """
+    for conn in connections.all():
+        if _open_pool(conn) is not None:
+            conn.close_pool()
+
+
+def pool_stats() -> List[Tuple[Dict[str, str], float]]:
+    """
+    Returns the size and usage of this process's open connection pools, as gauge samples.
+    """
+    samples = []
+    for conn in connections.all():
+        pool = _open_pool(conn)
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        for stat in ("pool_min", "pool_max", "pool_size", "pool_available", "requests_waiting"):
+            samples.append(({"alias": conn.alias, "stat": stat}, float(stats.get(stat, 0))))
+    return samples
+
+
+class DatabaseThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    Thread pool for database work outside the request cycle (e.g. the asyncio delivery worker).
+
+    Each submitted call is treated like a request: afterwards the thread's connections are closed if they
+    are broken or older than CONN_MAX_AGE, and kept for the next call otherwise.
+    """
+
+    @staticmethod
+    def _run(fn: Callable, *args, **kwargs) -> Any:
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(self._run, fn, *args, **kwargs)
+
+
+@connection_created.connect
+def count_connection(sender, connection=None, **kwargs):
+    """ count new (or pooled) connections, to show how well connections are reused """
+    DB_CONNECTIONS_OPENED.inc(
+        alias=getattr(connection, "alias", ""), process_type=getattr(settings, "PROCESS_TYPE", ""))
+
+
+@task_failure.connect
+@task_retry.connect
+def reset_broken_connections(**kwargs):
+    """ drop connections a failed task left broken, so its retry and the next task get a fresh one """
+    exception = kwargs.get("exception", kwargs.get("reason"))
+    if isinstance(exception, (DatabaseError, InterfaceError)):
+        close_broken_connections()
@@ -0,0 +1,488 @@
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Optional, Sequence, Iterator, Callable
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Metric:
+    """
+    Base class for in-process metrics with a fixed set of label names.
+    """
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _label_values(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labelnames)
+
+    def snapshot(self) -> Dict[str, list]:
+        raise NotImplementedError
+
+    @staticmethod
+    def merge(snapshots: List[Dict[str, list]]) -> Dict[str, list]:
+        raise NotImplementedError
+
+    def render(self, values: Dict[str, list]) -> List[str]:
+        raise NotImplementedError
+
+    def values(self, snapshots: List[Dict[str, Dict[str, list]]]) -> Dict[str, list]:
+        """
+        Merges this metric's values out of every process's snapshot.
+        """
+        return self.merge([snapshot.get(self.name, {}) for snapshot in snapshots])
+
+    def _format_labels(self, label_values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, label_values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        escaped = (
+            '%s="%s"' % (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in pairs)
+        return "{" + ",".join(escaped) + "}"
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        registry.maybe_flush()
+
+    def snapshot(self) -> Dict[str, list]:
+        with self._lock:
+            return {json.dumps(key): [value] for key, value in self._values.items()}
+
+    @staticmethod
+    def merge(snapshots: List[Dict[str, list]]) -> Dict[str, list]:
+        merged: Dict[str, list] = {}
+        for snapshot in snapshots:
+            for key, (value,) in snapshot.items():
+                merged[key] = [merged.get(key, [0.0])[0] + value]
+        return merged
+
+    def render(self, values: Dict[str, list]) -> List[str]:
+        return [
+            f"{self.name}{self._format_labels(json.loads(key))} {value}" for key, (value,) in sorted(values.items())]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(
+            self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: one count per bucket (non-cumulative) plus the overflow bucket, then sum
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._label_values(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+        registry.maybe_flush()
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[str, list]:
+        with self._lock:
+            return {json.dumps(key): list(counts) for key, counts in self._values.items()}
+
+    @staticmethod
+    def merge(snapshots: List[Dict[str, list]]) -> Dict[str, list]:
+        merged: Dict[str, list] = {}
+        for snapshot in snapshots:
+            for key, counts in snapshot.items():
+                existing = merged.get(key)
+                merged[key] = counts[:] if existing is None else [a + b for a, b in zip(existing, counts)]
+        return merged
+
+    def render(self, values: Dict[str, list]) -> List[str]:
+        lines = []
+        for key, counts in sorted(values.items()):
+            label_values = json.loads(key)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._format_labels(label_values, ('le', repr(bound)))} {cumulative}")
+            cumulative += counts[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{self._format_labels(label_values, ('le', '+Inf'))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(label_values)} {counts[-1]}")
+            lines.append(f"{self.name}_count{self._format_labels(label_values)} {cumulative}")
+        return lines
+
+
+class Gauge(Metric):
+    """
+    Gauge whose value is read from a callback. `collect` reads this process: its samples go into the
+    process's snapshot with "process_type" and "process" labels, so every process's values are exposed.
+    `derive` is called at scrape time with every process's snapshot (e.g. a ratio of merged counters).
+    """
+    type_name = "gauge"
+
+    def __init__(
+            self, name: str, documentation: str, labelnames: Sequence[str] = (),
+            collect: Optional[Callable[[], List[Tuple[Dict[str, str], float]]]] = None,
+            derive: Optional[Callable[[List[Dict[str, Dict[str, list]]]], List[Tuple[Dict[str, str], float]]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+        self.derive = derive
+
+    def snapshot(self) -> Dict[str, list]:
+        if self.collect is None:
+            return {}
+        try:
+            samples = self.collect()
+        except Exception as ex:
+            logger.exception("Gauge - %s collect exception: %s", self.name, ex)
+            return {}
+        process = {
+            "process_type": getattr(settings, "PROCESS_TYPE", ""),
+            "process": f"{socket.gethostname()}-{os.getpid()}",
+        }
+        return {json.dumps(self._label_values({**labels, **process})): [value] for labels, value in samples}
+
+    @staticmethod
+    def merge(snapshots: List[Dict[str, list]]) -> Dict[str, list]:
+        # Every process reports its own label sets, so merging is a union
+        merged: Dict[str, list] = {}
+        for snapshot in snapshots:
+            merged.update(snapshot)
+        return merged
+
+    def values(self, snapshots: List[Dict[str, Dict[str, list]]]) -> Dict[str, list]:
+        if self.derive is None:
+            return super().values(snapshots)
+        try:
+            samples = self.derive(snapshots)
+        except Exception as ex:
+            logger.exception("Gauge - %s derive exception: %s", self.name, ex)
+            return {}
+        return {json.dumps(self._label_values(labels)): [value] for labels, value in samples}
+
+    def render(self, values: Dict[str, list]) -> List[str]:
+        return [
+            f"{self.name}{self._format_labels(json.loads(key))} {value}" for key, (value,) in sorted(values.items())]
+
+
+class MetricsRegistry:
+    """
+    Holds the process's metrics and renders them in the Prometheus text exposition format.
+
+    When METRICS_MULTIPROC_DIR is set, every process periodically writes a snapshot of its counters
+    and histograms to that directory and rendering merges all snapshots, so the web process can
+    expose what the Celery and delivery workers observed. Snapshots of processes on this host that
+    have exited (e.g. recycled prefork children) are folded into one per-host file on scrape, so the
+    directory does not grow with every process ever started.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+
+    @property
+    def multiproc_dir(self) -> Optional[str]:
+        return getattr(settings, "METRICS_MULTIPROC_DIR", None)
+
+    def register(self, metric: Metric) -> None:
+        self.metrics[metric.name] = metric
+
+    def snapshot(self) -> Dict[str, Dict[str, list]]:
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def maybe_flush(self) -> None:
+        if not self.multiproc_dir:
+            return
+        now = time.monotonic()
+        if now - self._last_flush < getattr(settings, "METRICS_FLUSH_INTERVAL", 5):
+            return
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = now
+            self.flush()
+        finally:
+            self._flush_lock.release()
+
+    def flush(self) -> None:
+        """
+        Atomically writes this process's snapshot to the multiprocess directory.
+        """
+        directory = self.multiproc_dir
+        if not directory:
+            return
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Hostname keeps processes in different containers sharing the directory apart
+            path = os.path.join(directory, f"{socket.gethostname()}-{os.getpid()}.json")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as fil:
+                json.dump(self.snapshot(), fil)
+            os.replace(tmp_path, path)
+        except Exception as ex:
+            logger.exception("MetricsRegistry - flush exception: %s", ex)
+
+    @staticmethod
+    def _is_running(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _merge_snapshots(self, snapshots: List[Dict[str, Dict[str, list]]]) -> Dict[str, Dict[str, list]]:
+        # Gauges describe live processes only, so they are left out
+        return {
+            name: metric.merge([snapshot.get(name, {}) for snapshot in snapshots])
+            for name, metric in self.metrics.items() if not isinstance(metric, Gauge)}
+
+    def compact(self) -> int:
+        """
+        Folds the snapshots of this host's exited processes into the host's "{hostname}-dead.json"
+        and removes them.
+
+        :return: Number of snapshots folded.
+        """
+        directory = self.multiproc_dir
+        hostname = socket.gethostname()
+        dead = []
+        for path in glob.glob(os.path.join(directory, f"{glob.escape(hostname)}-*.json")):
+            pid = os.path.basename(path)[len(hostname) + 1:-len(".json")]
+            if pid.isdigit() and not self._is_running(int(pid)):
+                dead.append(path)
+        if not dead:
+            return 0
+
+        dead_path = os.path.join(directory, f"{hostname}-dead.json")
+        try:
+            # Several web processes may scrape at once; only one folds a snapshot
+            with open(f"{dead_path}.lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                snapshots, folded = [], []
+                for path in [dead_path] + dead:
+                    try:
+                        with open(path) as fil:
+                            snapshots.append(json.load(fil))
+                        if path != dead_path:
+                            folded.append(path)
+                    except (OSError, ValueError):
+                        continue
+                if not folded:
+                    return 0
+                with open(f"{dead_path}.tmp", "w") as fil:
+                    json.dump(self._merge_snapshots(snapshots), fil)
+                os.replace(f"{dead_path}.tmp", dead_path)
+                for path in folded:
+                    os.remove(path)
+                return len(folded)
+        except Exception as ex:
+            logger.exception("MetricsRegistry - compact exception: %s", ex)
+            return 0
+
+    def _collect_snapshots(self) -> List[Dict[str, Dict[str, list]]]:
+        if not self.multiproc_dir:
+            return [self.snapshot()]
+        self.flush()
+        self.compact()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.multiproc_dir, "*.json")):
+            try:
+                with open(path) as fil:
+                    snapshots.append(json.load(fil))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        snapshots = self._collect_snapshots()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            values = metric.values(snapshots)
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type_name}")
+            lines.extend(metric.render(values))
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+atexit.register(registry.flush)
+
+
+def _cache_hit_ratios(snapshots: List[Dict[str, Dict[str, list]]]) -> list:
+    totals: Dict[str, Dict[str, float]] = {}
+    for key, (value,) in CACHE_REQUESTS.values(snapshots).items():
+        cache, result = json.loads(key)
+        totals.setdefault(cache, {"hit": 0.0, "miss": 0.0})[result] = value
+    return [
+        ({"cache": cache}, counts["hit"] / (counts["hit"] + counts["miss"]))
+        for cache, counts in sorted(totals.items()) if counts["hit"] + counts["miss"]
+    ]
+
+
+def _db_pool_stats() -> list:
+    from core.backend.db_connections import pool_stats
+    return pool_stats()
+
+
+STAGE_DURATION = Histogram(
+    "notify_stage_duration_seconds",
+    "Time spent in each stage of the notification pipeline.",
+    ("stage", "system", "notification_type", "provider"),
+)
+QUEUE_WAIT = Histogram(
+    "notify_queue_wait_seconds",
+    "Time between a task being published and a worker starting it.",
+    ("task",),
+)
+PROVIDER_ERRORS = Counter(
+    "notify_provider_errors_total",
+    "Provider sends that failed or raised.",
+    ("provider", "notification_type"),
+)
+NOTIFICATIONS_PROCESSED = Counter(
+    "notify_notifications_total",
+    "Status updates applied to notifications, by resulting state.",
+    ("system", "status"),
+)
+SUPPRESSED_RECIPIENTS = Counter(
+    "notify_suppressed_recipients_total",
+    "Recipients dropped because they are on a suppression list.",
+    ("system", "notification_type"),
+)
+REJECTED_RECIPIENTS = Counter(
+    "notify_rejected_recipients_total",
+    "Recipients dropped at ingestion because they are not valid phone numbers or email addresses.",
+    ("system", "notification_type"),
+)
+COALESCED_NOTIFICATIONS = Counter(
+    "notify_coalesced_notifications_total",
+    "Notifications merged into another notification's digest instead of being sent on their own.",
+    ("system", "notification_type"),
+)
+SMS_SEGMENTS = Counter(
+    "notify_sms_segments_total",
+    "SMS segments prepared for sending (segments per message times recipients), by encoding.",
+    ("system", "encoding"),
+)
+CACHE_REQUESTS = Counter(
+    "notify_cache_requests_total",
+    "Lookups in in-process caches, by result (hit or miss).",
+    ("cache", "result"),
+)
+DB_CONNECTIONS_OPENED = Counter(
+    "notify_db_connections_opened_total",
+    "Database connections opened, or checked out of the pool, by Django.",
+    ("alias", "process_type"),
+)
+DB_POOL = Gauge(
+    "notify_db_pool",
+    "Size and usage of each process's database connection pools, as of its last metrics flush.",
+    ("process_type", "process", "alias", "stat"),
+    collect=_db_pool_stats,
+)
+CACHE_HIT_RATIO = Gauge(
+    "notify_cache_hit_ratio",
+    "Hit ratio of in-process caches since process start, aggregated across processes.",
+    ("cache",),
+    derive=_cache_hit_ratios,
+)
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of an already sorted sequence.
+
+    :param sorted_values: Values in ascending order.
+    :param pct: Percentile between 0 and 100.
+    :return: The percentile value, or None when there are no values.
+    """
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+_stage_recorders = threading.local()
+
+
+@contextmanager
+def record_stages() -> Iterator[List[Tuple[str, float]]]:
+    """
+    Collects (stage, seconds) for every stage timed on this thread while the block runs.
+
+    Used by the benchmark and the task profiler to get per-stage breakdowns of individual runs.
+    """
+    recorders = getattr(_stage_recorders, "stack", None)
+    if recorders is None:
+        recorders = _stage_recorders.stack = []
+    samples: List[Tuple[str, float]] = []
+    recorders.append(samples)
+    try:
+        yield samples
+    finally:
+        # Remove by identity: lists compare equal by content
+        del recorders[next(index for index, recorder in enumerate(recorders) if recorder is samples)]
+
+
+@contextmanager
+def timed_stage(stage: str, **labels) -> Iterator[None]:
+    """
+    Times a block of the pipeline into notify_stage_duration_seconds.
+
+    :param stage: Stage name, e.g. 'save', 'prepare_content', 'provider_send', 'callback'.
+    :param labels: Optional system, notification_type and provider labels.
+    """
+    recorders = getattr(_stage_recorders, "stack", None)
+    metrics_enabled = getattr(settings, "METRICS_ENABLED", True)
+    if not metrics_enabled and not recorders:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        if metrics_enabled:
+            STAGE_DURATION.observe(duration, stage=stage, **labels)
+        for samples in recorders or ():
+            samples.append((stage, duration))
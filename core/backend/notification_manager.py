@@ -1,23 +1,40 @@
+import asyncio
+import contextlib
+import hashlib
+import json
 import logging
-from typing import Dict, Type, Any, Tuple, Optional, Union, List
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Type, Any, Tuple, Optional, Union, List, Callable
 from uuid import UUID
 
 import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
+from core.backend.metrics import timed_stage, COALESCED_NOTIFICATIONS, PROVIDER_ERRORS, NOTIFICATIONS_PROCESSED, \
+    REJECTED_RECIPIENTS, SUPPRESSED_RECIPIENTS
 from core.backend.notification_types.base_notification import BaseNotification
 from core.backend.notification_types.email_notification import EmailNotification
 from core.backend.notification_types.push_notification import PushNotification
 from core.backend.notification_types.sms_notification import SMSNotification
 
 from core.backend.providers.base_provider import BaseProvider
-from core.backend.providers.providers_registry import PROVIDER_CLASSES
+from core.backend.providers.providers_registry import get_provider_class
 
-from core.backend.services import SystemService, NotificationTypeService, TemplateService, NotificationService, \
-    StateService, OrganisationService
+from core.backend.recipient_normaliser import normalise_phone_numbers, normalise_recipients
+from core.backend.reference_cache import reference_cache
+from core.backend.services import NotificationRecipientService, NotificationService
+from core.backend.suppression_list import SUPPRESSIBLE_NOTIFICATION_TYPES, suppression_list
 
-from core.models import Notification, Provider, State, System
+from core.models import Notification, NotificationRecipient, Organisation, Provider, State, Suppression, System, \
+    Template
 from notify.celery import app
+from utils.query_budget import query_budget
 
 logger = logging.getLogger(__name__)
 
@@ -31,32 +48,13 @@ class NotificationManager:
             "push": PushNotification
         }
 
-    @staticmethod
-    def _clean_recipients(notification_type: str, recipients: Union[List[str], str]) -> List[str]:
-        """
-        Cleans the recipients.
-
-        Strips and normalizes recipients depending on the notification type.
-
-        :param notification_type: The type of notification (e.g. 'sms', 'email').
-        :param recipients: A comma-separated string or list of recipient identifiers.
-        :return: List of cleaned recipient strings.
-        """
-        cleaned_recipients = set()
-        if isinstance(recipients, str):
-            recipients = [recipient for recipient in recipients.split(",")]
-        for recipient in recipients:
-            recipient = recipient.strip()
-            if notification_type == "sms":
-                recipient = recipient.replace("+", "")
-            cleaned_recipients.add(recipient)
-        return list(cleaned_recipients)
-
     def _validate_notification_data(self, notification_data: Any):
         """
         Validate required fields in the notification data.
 
-        Ensures required keys exist and normalizes certain values.
+        Ensures required keys exist and normalizes certain values. Recipients are normalised in one batch;
+        invalid ones are dropped and kept under 'rejected_recipients', so one bad recipient does not fail the
+        others.
 
         :param notification_data: Dictionary of notification request data.
         """
@@ -76,60 +74,224 @@ class NotificationManager:
             notification_data['organisation'] = str(notification_data['organisation']).lower()
         notification_data['notification_type'] = str(notification_data['notification_type']).lower()
         notification_data['template'] = str(notification_data.get('template', '')).lower()
-        notification_data['recipients'] = self._clean_recipients(
-            notification_data['notification_type'], notification_data['recipients'])
+        recipients = normalise_recipients(notification_data['notification_type'], notification_data['recipients'])
+        notification_data['recipients'] = recipients.valid
+        notification_data['rejected_recipients'] = recipients.rejected
+        if not recipients.valid:
+            raise ValueError("No valid recipients")
+        if notification_data.get('send_at'):
+            notification_data['send_at'] = self._parse_send_at(notification_data['send_at'])
+
+    @staticmethod
+    def _parse_send_at(send_at: Union[str, datetime]) -> datetime:
+        """
+        Parses the time a notification is scheduled for. Times without an offset are taken as UTC.
 
-    def save_notification(self, notification_data: Dict) -> Optional[Notification]:
+        :param send_at: ISO 8601 string or datetime.
+        :return: Timezone-aware datetime.
+        """
+        if not isinstance(send_at, datetime):
+            try:
+                send_at = parse_datetime(str(send_at))
+            except ValueError:
+                send_at = None
+            if send_at is None:
+                raise ValueError("'send_at' must be an ISO 8601 date and time")
+        if timezone.is_naive(send_at):
+            send_at = timezone.make_aware(send_at, dt_timezone.utc)
+        return send_at
+
+    def save_notification(
+            self, notification_data: Dict, queued_at: Optional[datetime] = None) -> Optional[Notification]:
         """
         Create a notification instance in the database.
 
         :param notification_data: Dictionary containing notification parameters.
+        :param queued_at: When the notification was published to the broker, if known.
         :return: Notification object if successful, None otherwise.
         """
         try:
-            self._validate_notification_data(notification_data)
-
-            system = SystemService().get(name=notification_data.get('system'))
-            if system is None:
-                raise Exception("Invalid system")
-
-            organisation = None
-            if 'organisation' in notification_data and notification_data['organisation']:
-                organisation = OrganisationService().get(name=notification_data['organisation'])
-                if organisation is None:
-                    raise ValueError("Invalid organisation")
-
-            notification_type = NotificationTypeService().get(name=notification_data.get('notification_type'))
-            if notification_type is None:
-                raise Exception("Invalid notification type")
-
-            template = TemplateService().get(name=notification_data.get('template'))
-
-            notification = NotificationService().create(
-                system=system,
-                organisation=organisation,
-                unique_identifier=notification_data.get('unique_identifier', ''),
-                notification_type=notification_type,
-                recipients=notification_data.get('recipients'),
-                template=template,
-                context=notification_data.get('context'),
-                status=StateService().get(name='Pending')
-            )
-            if notification is None:
-                raise Exception("Notification not created")
-            return notification
-
+            with query_budget("save_notification"), timed_stage(
+                    "save", system=str(notification_data.get('system', '')).lower(),
+                    notification_type=str(notification_data.get('notification_type', '')).lower()):
+                return self._create_notification(notification_data, queued_at=queued_at)
         except Exception as ex:
             logger.exception(f"NotificationManager - save_notification exception: {ex}")
-            system = SystemService().get(name=notification_data.get('system'))
+            system = reference_cache.system(notification_data.get('system'))
             if system:
-                self.send_callback_to_system(system, {
+                payload = {
                     "status": "failed",
                     "message": str(ex),
                     "unique_identifier": notification_data.get("unique_identifier", None),
-                })
+                }
+                rejected = self._rejected_statuses(notification_data.get("rejected_recipients"))
+                if rejected:
+                    payload["recipients"] = [{"recipient": recipient, **result} for recipient, result in rejected.items()]
+                self.send_callback_to_system(system, payload)
             return None
 
+    def ingest_notification(self, notification_data: Dict) -> Notification:
+        """
+        Validates a notification and inserts its row at ingestion, for the claim-check ingestion mode: the
+        web tier then queues only the notification id, so the payload never travels through the broker.
+
+        Unlike save_notification, invalid data raises instead of being reported in a callback, so the
+        client gets the error in the response.
+
+        :param notification_data: Dictionary containing notification parameters.
+        :return: The created Notification; it is stored as dispatched if it is to be sent straight away.
+        """
+        with query_budget("claim_check_ingestion"), timed_stage(
+                "save", system=str(notification_data.get('system', '')).lower(),
+                notification_type=str(notification_data.get('notification_type', '')).lower()):
+            return self._create_notification(notification_data, queued_at=timezone.now(), claim_check=True)
+
+    def ingest_notifications(self, notifications: List[Dict]) -> List[Dict[str, Any]]:
+        """
+        Ingests several notifications in claim-check mode, each on its own, so one invalid notification
+        (or one that fails to be stored) does not reject the others.
+
+        :param notifications: Notification payloads.
+        :return: Per payload, in order, {"notification_id", "dispatched"} or {"error"}.
+        """
+        results = []
+        for notification_data in notifications:
+            try:
+                if not isinstance(notification_data, dict):
+                    raise ValueError("Notification must be an object")
+                notification = self.ingest_notification(notification_data)
+                results.append({
+                    "notification_id": str(notification.id),
+                    "dispatched": notification.dispatched_at is not None,
+                })
+            except (KeyError, ValueError) as ex:
+                results.append({"error": str(ex.args[0] if ex.args else ex)})
+            except Exception as ex:
+                logger.exception(f"NotificationManager - ingest_notifications exception: {ex}")
+                results.append({"error": str(ex) or ex.__class__.__name__})
+        return results
+
+    @staticmethod
+    def _rejected_statuses(rejected_recipients: Optional[Dict[str, str]]) -> Dict[str, Dict]:
+        """
+        Reports the recipients dropped at ingestion alongside the providers' recipient statuses.
+        """
+        return {
+            recipient: {"status": "rejected", "error": reason}
+            for recipient, reason in (rejected_recipients or {}).items()}
+
+    @staticmethod
+    def _coalescing_window(
+            system: System, organisation: Optional[Organisation], template: Optional[Template],
+            recipients: List[str], now: datetime) -> Tuple[Optional[str], Optional[datetime]]:
+        """
+        Works out whether a notification waits to be merged into a digest with the others sent to the same
+        recipient with the same template, and until when.
+
+        Windows are aligned to the epoch, so every notification in one window gets the same key and send_at:
+        the end of the window, when the dispatcher hands the first of them to a worker.
+
+        :return: Tuple of (coalesce key, end of the window), or (None, None) if the notification is not coalesced.
+        """
+        if template is None or not template.digest_body or len(recipients) != 1:
+            return None, None
+        window = template.coalesce_window if template.coalesce_window is not None else system.coalesce_window
+        if not window:
+            return None, None
+        key = hashlib.sha256(
+            f"{system.id}:{organisation.id if organisation else ''}:{template.id}:{recipients[0]}".encode()).hexdigest()
+        window_end = (int(now.timestamp()) // window + 1) * window
+        return key, datetime.fromtimestamp(window_end, tz=dt_timezone.utc)
+
+    def _create_notification(
+            self, notification_data: Dict, queued_at: Optional[datetime] = None,
+            claim_check: bool = False) -> Notification:
+        """
+        Validates the notification data, resolves its references from the reference cache and inserts the
+        notification row.
+
+        :param notification_data: Dictionary containing notification parameters.
+        :param queued_at: When the notification was published to the broker, if known.
+        :param claim_check: Whether the row is inserted at ingestion, with only its id queued afterwards.
+        :return: The created Notification.
+        """
+        self._validate_notification_data(notification_data)
+
+        system = reference_cache.system(notification_data.get('system'))
+        if system is None:
+            raise ValueError("Invalid system")
+
+        organisation = None
+        if 'organisation' in notification_data and notification_data['organisation']:
+            organisation = reference_cache.organisation(notification_data['organisation'])
+            if organisation is None:
+                raise ValueError("Invalid organisation")
+
+        notification_type = reference_cache.notification_type(notification_data.get('notification_type'))
+        if notification_type is None:
+            raise ValueError("Invalid notification type")
+
+        rejected_recipients = notification_data.get('rejected_recipients') or {}
+        if rejected_recipients:
+            REJECTED_RECIPIENTS.inc(
+                len(rejected_recipients), system=system.name, notification_type=notification_type.name)
+            logger.info("NotificationManager - dropped %d invalid recipients", len(rejected_recipients))
+
+        if notification_type.name in SUPPRESSIBLE_NOTIFICATION_TYPES:
+            recipients, suppressed = suppression_list.split(system, notification_data['recipients'])
+            if suppressed:
+                SUPPRESSED_RECIPIENTS.inc(len(suppressed), system=system.name, notification_type=notification_type.name)
+                logger.info("NotificationManager - dropped %d suppressed recipients", len(suppressed))
+                if not recipients:
+                    raise ValueError("All recipients are suppressed")
+                notification_data['recipients'] = recipients
+
+        # Systems and organisations with a send rate have their notifications released by the send pacer
+        paced = bool(system.max_send_rate or (organisation is not None and organisation.max_send_rate))
+
+        template = reference_cache.template(notification_data.get('template'))
+
+        now = timezone.now()
+        send_at = notification_data.get('send_at')
+        if send_at is not None and send_at <= now:
+            send_at = None
+
+        coalesce_key = None
+        if send_at is None:
+            coalesce_key, send_at = self._coalescing_window(
+                system, organisation, template, notification_data['recipients'], now)
+
+        # Scheduled, coalesced and paced notifications stay unclaimed until they are released to a worker
+        claimed = not (send_at or paced)
+        dispatched_at = None
+        if claim_check and claimed:
+            # The web tier queues the id once the row is committed. The row is stored as a dispatched
+            # scheduled notification, so if that message is lost the scheduled dispatcher queues it again
+            # after SCHEDULED_REDISPATCH_AFTER seconds; the delivery claim sends it only once
+            send_at = dispatched_at = now
+            claimed = False
+
+        notification = NotificationService().create(
+            system=system,
+            organisation=organisation,
+            unique_identifier=notification_data.get('unique_identifier', ''),
+            notification_type=notification_type,
+            recipients=notification_data.get('recipients'),
+            rejected_recipients=rejected_recipients,
+            template=template,
+            context=notification_data.get('context'),
+            status=State.pending(),
+            queued_at=queued_at,
+            send_at=send_at,
+            dispatched_at=dispatched_at,
+            paced=paced,
+            coalesce_key=coalesce_key,
+            processing_started_at=now if claimed else None
+        )
+        if notification is None:
+            raise Exception("Notification not created")
+        return notification
+
     def _get_notification_instance(self, notification) -> BaseNotification:
         """
         Instantiate a handler class based on the notification type.
@@ -143,6 +305,10 @@ class NotificationManager:
             raise ValueError(f"Unsupported notification type: {notification_type_name}")
         return notification_class(notification)
 
+    @staticmethod
+    def _metric_labels(notification: Notification) -> Dict[str, str]:
+        return {"system": notification.system.name, "notification_type": notification.notification_type.name}
+
     @staticmethod
     def _get_provider_class_instance(provider: Provider) -> BaseProvider:
         """
@@ -151,10 +317,94 @@ class NotificationManager:
         :param provider: Provider object from database.
         :return: Instance of BaseProvider.
         """
-        provider_class = PROVIDER_CLASSES.get(provider.class_name, None)
-        if provider_class is None:
-            raise ValueError(f"Unknown provider class: {provider.class_name}")
-        return provider_class(provider.config)
+        return get_provider_class(provider.class_name)(provider.config)
+
+    @staticmethod
+    def _prepare_send(
+            notification_handler: BaseNotification) -> Tuple[Dict[str, Any], List[Tuple[List[str], List[Provider]]]]:
+        """
+        Validates a notification and renders its content ahead of sending.
+
+        :param notification_handler: Handler instance for the notification.
+        :return: Tuple of (rendered content, recipient groups with the providers to try for each, in order).
+        """
+        notification_handler.validate()
+
+        recipient_groups = notification_handler.recipient_groups()
+        if not all(providers for _, providers in recipient_groups):
+            raise Exception(
+                f"No active providers found for {notification_handler.notification.notification_type.name} "
+                f"notifications")
+
+        notification = notification_handler.notification
+        with timed_stage(
+                "prepare_content", system=notification.system.name,
+                notification_type=notification.notification_type.name):
+            content = notification_handler.prepare_content()
+        return content, recipient_groups
+
+    def claim_stored_notification(self, notification_id: Union[UUID, str]) -> Optional[Notification]:
+        """
+        Claims a stored pending notification for sending and loads it. A coalesced notification also claims
+        the others waiting in its window and becomes their digest.
+
+        :param notification_id: Notification primary key.
+        :return: The notification, or None if it is gone or another worker already claimed it.
+        """
+        if not NotificationService().claim_for_delivery(notification_id):
+            logger.info("NotificationManager - notification %s already claimed, skipping", notification_id)
+            return None
+        notification = NotificationService().get_for_processing(pk=notification_id)
+        if notification is not None and notification.coalesce_key:
+            self._merge_coalesced(notification)
+        return notification
+
+    def _merge_coalesced(self, notification: Notification) -> None:
+        """
+        Turns a claimed notification into the digest of every notification in its coalescing window.
+
+        Its context becomes the newest context with all of them, oldest first, under 'notifications' and
+        their number under 'count', which the template's digest fields render. The others are marked as
+        coalesced into it, and their systems are told which notification carries them.
+
+        :param notification: The claimed notification.
+        """
+        coalesced = NotificationService().claim_coalesced(notification)
+        if not coalesced:
+            return
+        contexts = [
+            context for _, context in sorted(
+                [(notification.date_created, notification.context)] +
+                [(row['date_created'], row['context']) for row in coalesced], key=lambda item: item[0])]
+        notification.context = {**contexts[-1], "notifications": contexts, "count": len(contexts)}
+        notification.coalesced_count = len(coalesced)
+        NotificationService().update_fields(
+            pk=notification.id, context=notification.context, coalesced_count=notification.coalesced_count)
+
+        labels = self._metric_labels(notification)
+        COALESCED_NOTIFICATIONS.inc(len(coalesced), **labels)
+        NOTIFICATIONS_PROCESSED.inc(len(coalesced), system=labels["system"], status=State.coalesced().name)
+        logger.info(
+            "NotificationManager - coalesced %d notifications into notification %s", len(coalesced), notification.id)
+        for row in coalesced:
+            self.send_callback_to_system(notification.system, {
+                "notification_id": str(row['id']),
+                "unique_identifier": row['unique_identifier'],
+                "status": State.coalesced().name,
+                "coalesced_into": str(notification.id),
+            })
+
+    def deliver_notification(self, notification_id: Union[UUID, str]) -> bool:
+        """
+        Sends a notification that is already stored, e.g. one materialised by a campaign.
+
+        :param notification_id: Notification primary key.
+        :return: True if successfully sent, False otherwise (including when another worker claimed it).
+        """
+        notification = self.claim_stored_notification(notification_id)
+        if notification is None:
+            return False
+        return self.send_notification(notification)
 
     def send_notification(self, notification: Notification) -> bool:
         """
@@ -163,62 +413,295 @@ class NotificationManager:
         :param notification: Notification instance to send.
         :return: True if successfully sent, False otherwise.
         """
-        try:
-            notification_handler = self._get_notification_instance(notification)
-            notification_handler.validate()
+        with query_budget("send_notification"):
+            return self._send_notification(notification)
 
-            active_providers = notification_handler.active_providers()
-            if not active_providers.exists():
-                raise Exception(f"No active providers found for {notification.notification_type.name} notifications")
+    @staticmethod
+    def _suppress_rejected(notification: Notification, recipient_statuses: Dict[str, Dict]) -> None:
+        """
+        Suppresses the recipients a provider rejected for good, e.g. hard-bounced addresses or opted-out numbers.
 
-            content = notification_handler.prepare_content()
+        Providers flag them with a "suppress" reason in their recipient_statuses.
+        """
+        rejected: Dict[str, List[str]] = {}
+        for recipient, result in recipient_statuses.items():
+            if result.get("suppress"):
+                rejected.setdefault(result["suppress"], []).append(recipient)
+        for reason, recipients in rejected.items():
+            suppression_list.suppress(notification.system, recipients, reason)
+
+    def _send_to_group(
+            self, notification: Notification, content: Dict[str, Any], recipients: List[str],
+            providers: List[Provider]) -> Dict[str, Any]:
+        """
+        Sends to one group of recipients through the first of its providers that accepts the message.
+
+        :param notification: Notification being sent.
+        :param content: Rendered content.
+        :param recipients: Recipients of this group.
+        :param providers: Providers to try, in order.
+        :return: Outcome of the group; its status is None if every provider failed.
+        """
+        result = {
+            "recipients": recipients, "status": None, "provider": None, "recipient_statuses": {}, "attempts": 0,
+            "provider_request_ms": 0}
+        for provider in providers:
+            provider_class_instance = self._get_provider_class_instance(provider)
+
+            if not provider_class_instance.validate_config():
+                logger.warning(f"Invalid configuration for provider: {provider.name}")
+                continue
+
+            result["attempts"] += 1
+            started = time.perf_counter()
+            with timed_stage("provider_send", provider=provider.name, **self._metric_labels(notification)):
+                send_notification_state = provider_class_instance.send(recipients=recipients, content=content)
+            result["provider_request_ms"] += int((time.perf_counter() - started) * 1000)
+            self._suppress_rejected(notification, provider_class_instance.recipient_statuses)
+
+            if send_notification_state == State.failed():
+                logger.warning(f"Send notification failed for provider: {provider.name}")
+                PROVIDER_ERRORS.inc(provider=provider.name, notification_type=notification.notification_type.name)
+                continue
+
+            result.update(
+                status=send_notification_state, provider=provider,
+                recipient_statuses=provider_class_instance.recipient_statuses)
+            return result
+        return result
+
+    async def _send_to_group_async(
+            self, notification: Notification, content: Dict[str, Any], recipients: List[str],
+            providers: List[Provider], failed_state: State,
+            provider_limiter: Optional[Callable[[Provider], asyncio.Semaphore]] = None) -> Dict[str, Any]:
+        """
+        Async counterpart of _send_to_group, using the providers' send_async.
+        """
+        result = {
+            "recipients": recipients, "status": None, "provider": None, "recipient_statuses": {}, "attempts": 0,
+            "provider_request_ms": 0}
+        for provider in providers:
+            provider_class_instance = self._get_provider_class_instance(provider)
+
+            if not provider_class_instance.validate_config():
+                logger.warning(f"Invalid configuration for provider: {provider.name}")
+                continue
+
+            async with provider_limiter(provider) if provider_limiter else contextlib.nullcontext():
+                result["attempts"] += 1
+                started = time.perf_counter()
+                with timed_stage("provider_send", provider=provider.name, **self._metric_labels(notification)):
+                    send_notification_state = await provider_class_instance.send_async(
+                        recipients=recipients, content=content)
+                result["provider_request_ms"] += int((time.perf_counter() - started) * 1000)
+            if any(status.get("suppress") for status in provider_class_instance.recipient_statuses.values()):
+                await sync_to_async(self._suppress_rejected, thread_sensitive=False)(
+                    notification, provider_class_instance.recipient_statuses)
+
+            if send_notification_state == failed_state:
+                logger.warning(f"Send notification failed for provider: {provider.name}")
+                PROVIDER_ERRORS.inc(provider=provider.name, notification_type=notification.notification_type.name)
+                continue
+
+            result.update(
+                status=send_notification_state, provider=provider,
+                recipient_statuses=provider_class_instance.recipient_statuses)
+            return result
+        return result
+
+    @staticmethod
+    def _deliveries(notification: Notification, results: List[Dict[str, Any]]) -> List[NotificationRecipient]:
+        """
+        Builds the per-recipient delivery rows of a send from its recipient groups' outcomes.
 
-            for provider in active_providers:
-                provider_class_instance = self._get_provider_class_instance(provider)
+        Recipients of a group no provider accepted have failed; the others take the outcome their provider
+        reported for them, or else the group's: awaiting confirmation when the provider sends delivery
+        reports, sent otherwise.
+        """
+        deliveries = []
+        for result in results:
+            if result["status"] is None:
+                deliveries.extend(
+                    NotificationRecipient(
+                        notification=notification, recipient=recipient, status=NotificationRecipient.STATUS_FAILED,
+                        error="Not sent")
+                    for recipient in result["recipients"])
+                continue
+            accepted_status = (
+                NotificationRecipient.STATUS_CONFIRMATION_PENDING
+                if result["status"] == State.confirmation_pending() else NotificationRecipient.STATUS_SENT)
+            for recipient in result["recipients"]:
+                outcome = result["recipient_statuses"].get(recipient, {})
+                if outcome.get("status") == "failed":
+                    deliveries.append(NotificationRecipient(
+                        notification=notification, recipient=recipient, status=NotificationRecipient.STATUS_FAILED,
+                        error=str(outcome.get("error") or "")[:100]))
+                else:
+                    deliveries.append(NotificationRecipient(
+                        notification=notification, recipient=recipient, status=accepted_status,
+                        provider_message_id=outcome.get("message_id")))
+        return deliveries
+
+    def _complete_send(self, notification: Notification, results: List[Dict[str, Any]]) -> None:
+        """
+        Records the outcome of a send to one or more recipient groups.
 
-                if not provider_class_instance.validate_config():
-                    logger.warning(f"Invalid configuration for provider: {provider.name}")
-                    continue
+        Every recipient's outcome is written to the delivery table in one bulk upsert, and the notification
+        keeps the counts: it awaits confirmation while any recipient does, and is otherwise sent if any
+        recipient was sent to. Recipients of groups no provider accepted are reported as failed in the
+        callback. When groups went through different providers, the one that took the most recipients is
+        recorded.
 
-                send_notification_state = provider_class_instance.send(
-                    recipients=notification.recipients, content=content)
+        :param notification: Notification that was sent.
+        :param results: Outcome of each recipient group.
+        :raises Exception: If no provider accepted any group.
+        """
+        accepted = [result for result in results if result["status"] is not None]
+        if not accepted:
+            raise Exception("Notification not sent")
 
-                if send_notification_state == State.failed():
-                    logger.warning(f"Send notification failed for provider: {provider.name}")
-                    continue
+        recipient_statuses = self._rejected_statuses(notification.rejected_recipients)
+        for result in results:
+            if result["status"] is None:
+                logger.warning(
+                    "NotificationManager - no provider accepted %d recipients of notification %s",
+                    len(result["recipients"]), notification.id)
+                recipient_statuses.update(
+                    {recipient: {"status": "failed", "error": "Not sent"} for recipient in result["recipients"]})
+            else:
+                recipient_statuses.update(result["recipient_statuses"])
+
+        deliveries = self._deliveries(notification, results)
+        NotificationRecipientService().record_send(deliveries)
+        sent = sum(1 for delivery in deliveries if delivery.status == NotificationRecipient.STATUS_SENT)
+        failed = sum(1 for delivery in deliveries if delivery.status == NotificationRecipient.STATUS_FAILED)
+        if sent + failed < len(deliveries):
+            status = State.confirmation_pending()
+        else:
+            status = State.sent() if sent else State.failed()
+        data = {
+            "notification_id": notification.id,
+            "notification": notification,
+            "status": status,
+            "provider": max(accepted, key=lambda result: len(result["recipients"]))["provider"],
+            "recipient_statuses": recipient_statuses,
+            "provider_request_ms": sum(result["provider_request_ms"] for result in results),
+            "attempt_count": F("attempt_count") + sum(result["attempts"] for result in results),
+            "recipient_count": len(deliveries),
+            "sent_count": sent,
+            "failed_count": failed,
+        }
+        if sent:
+            data["sent_time"] = timezone.now()
 
-                data = {
-                    "notification_id": notification.id,
-                    "status": send_notification_state,
-                    "provider": provider,
-                }
-                if send_notification_state == State.sent():
-                    data["sent_time"] = timezone.now()
+        self.update_notification_status(**data)
 
-                self.update_notification_status(**data)
-                return True
+    def _send_notification(self, notification: Notification) -> bool:
+        results = []
+        try:
+            notification_handler = self._get_notification_instance(notification)
+            content, recipient_groups = self._prepare_send(notification_handler)
 
-            raise Exception("Notification not sent")
+            for recipients, providers in recipient_groups:
+                results.append(self._send_to_group(notification, content, recipients, providers))
+
+            self._complete_send(notification, results)
+            return True
 
         except Exception as ex:
             logger.exception(f"NotificationManager - send_notification exception: {ex}")
-            self.update_notification_status(notification_id=notification.id, status=State.failed(), message=str(ex))
+            attempts = sum(result["attempts"] for result in results)
+            self.update_notification_status(
+                notification_id=notification.id, notification=notification, status=State.failed(), message=str(ex),
+                recipient_statuses=self._rejected_statuses(notification.rejected_recipients),
+                provider_request_ms=sum(result["provider_request_ms"] for result in results) if attempts else None,
+                attempt_count=F("attempt_count") + attempts)
+            return False
+
+    async def send_notification_async(
+            self, notification: Notification,
+            provider_limiter: Optional[Callable[[Provider], asyncio.Semaphore]] = None) -> bool:
+        """
+        Sends a notification from an event loop using the providers' non-blocking send_async.
+
+        Database work runs in worker threads so the loop is only ever blocked on provider I/O. Recipient
+        groups routed to different providers are sent concurrently.
+
+        :param notification: Notification instance to send.
+        :param provider_limiter: Optional callable returning the semaphore that bounds in-flight sends per provider.
+        :return: True if successfully sent, False otherwise.
+        """
+        results = []
+        try:
+            notification_handler = self._get_notification_instance(notification)
+            content, recipient_groups = await sync_to_async(self._prepare_send, thread_sensitive=False)(
+                notification_handler)
+            failed_state = await sync_to_async(State.failed, thread_sensitive=False)()
+
+            results = await asyncio.gather(*(
+                self._send_to_group_async(
+                    notification, content, recipients, providers, failed_state, provider_limiter=provider_limiter)
+                for recipients, providers in recipient_groups))
+
+            await sync_to_async(self._complete_send, thread_sensitive=False)(notification, results)
+            return True
+
+        except Exception as ex:
+            logger.exception(f"NotificationManager - send_notification_async exception: {ex}")
+            attempts = sum(result["attempts"] for result in results)
+            await sync_to_async(
+                lambda: self.update_notification_status(
+                    notification_id=notification.id, notification=notification, status=State.failed(), message=str(ex),
+                    recipient_statuses=self._rejected_statuses(notification.rejected_recipients),
+                    provider_request_ms=sum(
+                        result["provider_request_ms"] for result in results) if attempts else None,
+                    attempt_count=F("attempt_count") + attempts),
+                thread_sensitive=False)()
             return False
 
     def update_notification_status(
-            self, notification_id: Union[UUID, str], status: State, message: str = None, **kwargs) -> None:
+            self, notification_id: Union[UUID, str], status: State, message: str = None,
+            recipient_statuses: Optional[Dict[str, Dict]] = None, notification: Optional[Notification] = None,
+            **kwargs) -> None:
         """
         Updates a notification's status and sends a callback to the system.
 
+        The row is written with a single UPDATE. Callers that already hold the notification pass it in;
+        otherwise it is loaded once with its related objects.
+
         :param notification_id: Notification primary key.
         :param status: New state to set.
         :param message: Optional failure message.
+        :param recipient_statuses: Optional per-recipient outcome reported by the provider.
+        :param notification: The notification instance, if the caller already has it.
         :param kwargs: Additional fields to update.
         """
-        notification = NotificationService().update(pk=notification_id, status=status, **kwargs)
         if notification is None:
+            notification = NotificationService().get_for_processing(pk=notification_id)
+            if notification is None:
+                raise Exception("Notification not updated")
+
+        if not NotificationService().update_fields(pk=notification.id, status=status, **kwargs):
             raise Exception("Notification not updated")
 
+        # Keep the in-memory instance in step with the row instead of re-reading it
+        notification.status = status
+        for field, value in kwargs.items():
+            if not hasattr(value, "resolve_expression"):
+                setattr(notification, field, value)
+
+        self._send_status_callback(notification, message=message, recipient_statuses=recipient_statuses)
+
+    def _send_status_callback(
+            self, notification: Notification, message: str = None,
+            recipient_statuses: Optional[Dict[str, Dict]] = None) -> None:
+        """
+        Sends the system a callback with a notification's current status.
+
+        :param notification: The notification, as it now is.
+        :param message: Optional failure message.
+        :param recipient_statuses: Optional outcome of the recipients this update is about.
+        """
         response_data = {
             "notification_id": str(notification.id),
             "unique_identifier": notification.unique_identifier,
@@ -228,11 +711,81 @@ class NotificationManager:
         if message is not None:
             response_data["message"] = message
 
+        if recipient_statuses:
+            response_data["recipients"] = [
+                {"recipient": recipient, **result} for recipient, result in recipient_statuses.items()]
+
+        if notification.recipient_count:
+            response_data["recipient_counts"] = {
+                "total": notification.recipient_count,
+                "sent": notification.sent_count,
+                "failed": notification.failed_count,
+            }
+
+        if notification.coalesced_count:
+            response_data["coalesced_count"] = notification.coalesced_count
+
         if notification.status in [State.sent(), State.confirmation_pending()]:
             response_data["sent_time"] = notification.sent_time
 
+        NOTIFICATIONS_PROCESSED.inc(system=notification.system.name, status=notification.status.name)
         self.send_callback_to_system(system=notification.system, payload=response_data)
 
+    def record_delivery_report(
+            self, notification_id: Union[UUID, str], delivery_status: str, delivered: bool,
+            addresses: Optional[Union[str, List[str]]] = None,
+            reported_at: Optional[Union[str, datetime]] = None) -> None:
+        """
+        Applies a provider's delivery report to the recipients it is for and updates the notification's
+        counts and aggregate status; the notification is only settled once every recipient is.
+
+        Notifications sent before per-recipient tracking have no delivery rows; the report then settles
+        the whole notification. When the report says the number can never be reached
+        (settings.SUPPRESSION_DLR_STATUSES), the number is suppressed for the system.
+
+        :param notification_id: Notification primary key.
+        :param delivery_status: Delivery status reported by the provider.
+        :param delivered: Whether the report confirms delivery.
+        :param addresses: Number(s) the report is for; every recipient still awaiting confirmation if omitted.
+        :param reported_at: When the provider says the outcome happened; now if omitted.
+        """
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        recipients = normalise_phone_numbers(addresses).valid if addresses else None
+        if isinstance(reported_at, str):
+            reported_at = parse_datetime(reported_at) if reported_at else None
+        reported_at = reported_at or timezone.now()
+
+        updated = NotificationRecipientService().record_delivery(
+            notification_id, recipients, delivered, delivery_status, reported_at)
+        if updated:
+            NotificationService().add_delivery_counts(
+                notification_id, sent=updated if delivered else 0, failed=0 if delivered else updated,
+                reported_at=reported_at)
+
+        notification = NotificationService().get_for_processing(pk=notification_id)
+        if notification is None:
+            raise Exception("Notification not updated")
+
+        if updated:
+            outcome = {"status": "sent"} if delivered else {"status": "failed", "error": delivery_status}
+            self._send_status_callback(
+                notification, recipient_statuses={recipient: outcome for recipient in recipients or []})
+        elif not notification.recipient_count:
+            if delivered:
+                self.update_notification_status(
+                    notification_id=notification.id, notification=notification, status=State.sent(),
+                    sent_time=reported_at, delivered_at=reported_at)
+            else:
+                self.update_notification_status(
+                    notification_id=notification.id, notification=notification, status=State.failed(),
+                    sent_time=None)
+
+        if not delivered and delivery_status in getattr(settings, "SUPPRESSION_DLR_STATUSES", ()):
+            if not recipients and len(notification.recipients) == 1:
+                recipients = notification.recipients
+            suppression_list.suppress(notification.system, recipients or [], Suppression.REASON_DELIVERY_FAILURE)
+
     def send_callback_to_system(self, system: System, payload: Dict) -> None:
         """
         Delegates callback dispatch based on the system's configured callback type.
@@ -240,12 +793,13 @@ class NotificationManager:
         :param system: System instance.
         :param payload: Payload to send.
         """
-        if system.callback_type == "webhook":
-            self._send_webhook_callback(system, payload)
-        elif system.callback_type == "queue":
-            self._send_queue_callback(system, payload)
-        else:
-            logger.warning(f"Unsupported callback type '{system.callback_type}' for system '{system.name}'.")
+        with timed_stage("callback", system=system.name):
+            if system.callback_type == "webhook":
+                self._send_webhook_callback(system, payload)
+            elif system.callback_type == "queue":
+                self._send_queue_callback(system, payload)
+            else:
+                logger.warning(f"Unsupported callback type '{system.callback_type}' for system '{system.name}'.")
 
     @staticmethod
     def _send_webhook_callback(system: System, payload: Dict) -> None:
@@ -264,7 +818,8 @@ class NotificationManager:
             headers["Authorization"] = f"Bearer {system.webhook_auth_token}"
 
         try:
-            response = requests.post(system.webhook_url, json=payload, headers=headers, timeout=5)
+            response = requests.post(
+                system.webhook_url, data=json.dumps(payload, cls=DjangoJSONEncoder), headers=headers, timeout=5)
             response.raise_for_status()
         except requests.RequestException as e:
             logger.error(f"Webhook callback to system '{system.name}' failed: {e}")
@@ -1,10 +1,25 @@
 from abc import ABC, abstractmethod
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, List, Tuple
 
-from django.db.models import QuerySet
+from django.template import Context, Template as DjangoTemplate
+
+from core.backend.reference_cache import reference_cache
+from core.models import Notification, Provider
+
+
+@lru_cache(maxsize=2048)
+def compile_template(source: str) -> DjangoTemplate:
+    """
+    Compiles template source once per process; the compiled template is rendered many times.
+
+    Keyed on the source itself, so an edited template is compiled afresh.
+
+    :param source: Django template source.
+    :return: The compiled template.
+    """
+    return DjangoTemplate(source)
 
-from core.backend.services import ProviderService
-from core.models import Notification
 
 class BaseNotification(ABC):
     """
@@ -22,17 +37,37 @@ class BaseNotification(ABC):
         self.template = notification.template
         self.recipients = notification.recipients
         self.context = notification.context
+        # A digest of coalesced notifications, whose context lists theirs under 'notifications'
+        self.digest = notification.coalesced_count > 0
 
-    def active_providers(self) -> QuerySet:
+    def render(self, field: str) -> str:
+        """
+        Renders a template field (e.g. 'subject' or 'body') with the context. A digest renders the
+        template's digest_<field> instead, when it has one.
+
+        :param field: Name of the template field.
+        :return: The rendered text.
+        """
+        source = getattr(self.template, field)
+        if self.digest:
+            source = getattr(self.template, f"digest_{field}") or source
+        return compile_template(source).render(Context(self.context))
+
+    def active_providers(self) -> List[Provider]:
         """
         Fetches all active providers for the given notification type.
 
-        :return: A queryset of Provider objects that are active for the notification type.
+        :return: A list of Provider objects that are active for the notification type, in priority order.
+        """
+        return reference_cache.active_providers(self.notification.notification_type)
+
+    def recipient_groups(self) -> List[Tuple[List[str], List[Provider]]]:
+        """
+        Splits the recipients into groups that are sent together, each with the providers to try in order.
+
+        :return: A list of (recipients, providers) tuples; by default one group sent through the active providers.
         """
-        return ProviderService().filter(
-            notification_type=self.notification.notification_type,
-            is_active=True
-        ).order_by('priority')
+        return [(self.recipients, self.active_providers())]
 
     @abstractmethod
     def prepare_content(self) -> Dict[str, str]:
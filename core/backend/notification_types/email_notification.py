@@ -1,10 +1,13 @@
-import re
+import logging
 from typing import Dict
 
 from django.core.exceptions import ValidationError
-from django.template import Template, Context
 
+from core.backend.attachments import is_blob_reference
 from core.backend.notification_types.base_notification import BaseNotification
+from core.backend.recipient_normaliser import normalise_email_addresses
+
+logger = logging.getLogger(__name__)
 
 
 class EmailNotification(BaseNotification):
@@ -20,8 +23,8 @@ class EmailNotification(BaseNotification):
 
         :return: A dictionary with rendered email content and metadata.
         """
-        subject = Template(self.template.subject).render(Context(self.context))
-        message = Template(self.template.body).render(Context(self.context))
+        subject = self.render('subject')
+        message = self.render('body')
 
         return {
             'from_address': self.notification.system.default_from_email,
@@ -36,17 +39,26 @@ class EmailNotification(BaseNotification):
     def validate(self) -> bool:
         """
         Validates the recipient email format and ensures subject is present in the template.
+        Invalid addresses are dropped; recipients are normalised at ingestion, so this only affects ones
+        stored by other means. Attachments in the context come from the client, so they may only name
+        blobs in the blob store, never files on the worker.
 
-        :raises ValidationError: if recipient email is invalid or subject is missing.
+        :raises ValidationError: if no recipient email is valid, subject is missing or an attachment is
+            not a blob reference.
         :return: True if validation passes.
         """
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-
-        for recipient in self.recipients:
-            if not re.match(email_pattern, recipient):
-                raise ValidationError("Invalid email address")
+        recipients = normalise_email_addresses(self.recipients)
+        if recipients.rejected:
+            logger.info("EmailNotification - Skipping %d invalid email addresses", len(recipients.rejected))
+        self.recipients = recipients.valid
+        if not self.recipients:
+            raise ValidationError("Invalid email address")
 
         if not self.template.subject:
             raise ValidationError("Email template requires a subject")
 
+        attachments = self.context.get('attachments') or []
+        if not isinstance(attachments, list) or not all(map(is_blob_reference, attachments)):
+            raise ValidationError("Attachments must be blob references (sha256:<digest>)")
+
         return True
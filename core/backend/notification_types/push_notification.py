@@ -1,9 +1,12 @@
+import logging
 from typing import Dict, Any
 
 from django.core.exceptions import ValidationError
-from django.template import Template, Context
 
 from core.backend.notification_types.base_notification import BaseNotification
+from core.backend.services import DeviceTokenService
+
+logger = logging.getLogger(__name__)
 
 
 class PushNotification(BaseNotification):
@@ -18,7 +21,7 @@ class PushNotification(BaseNotification):
 
         :return: Dictionary with keys 'title' and 'body' for the push message.
         """
-        body = Template(self.template.body).render(Context(self.context))
+        body = self.render('body')
 
         return {
             'title': self.context.get('title', 'Notification'),
@@ -29,11 +32,19 @@ class PushNotification(BaseNotification):
     def validate(self) -> bool:
         """
         Validates that the push notification has a recipient (typically a device token).
+        Tokens previously reported dead by the provider are dropped before sending.
 
-        :raises ValidationError: if no recipient is found.
+        :raises ValidationError: if no usable recipient is found.
         :return: True if validation passes.
         """
         if not self.recipients:
             raise ValidationError("Push notification requires a device token")
 
+        invalid_tokens = DeviceTokenService().invalid_tokens(self.recipients)
+        if invalid_tokens:
+            logger.info("PushNotification - Skipping %d invalid device tokens", len(invalid_tokens))
+            self.recipients = [token for token in self.recipients if token not in invalid_tokens]
+            if not self.recipients:
+                raise ValidationError("All device tokens are invalid")
+
         return True
@@ -1,10 +1,17 @@
-import re
-from typing import Dict
+import logging
+from typing import Any, Dict, List, Tuple
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.template import Template, Context
 
+from core.backend.metrics import SMS_SEGMENTS
 from core.backend.notification_types.base_notification import BaseNotification
+from core.backend.recipient_normaliser import normalise_phone_numbers
+from core.backend.reference_cache import reference_cache
+from core.backend.sms_encoding import segment_sms
+from core.models import Provider
+
+logger = logging.getLogger(__name__)
 
 
 class SMSNotification(BaseNotification):
@@ -12,34 +19,54 @@ class SMSNotification(BaseNotification):
     Handles SMS notifications by rendering template content and validating input data.
     """
 
-    def prepare_content(self) -> Dict[str, str]:
+    def prepare_content(self) -> Dict[str, Any]:
         """
-        Renders the SMS body content using Django's templating engine and checks character limit.
+        Renders the SMS body content using Django's templating engine and works out how it is sent: its
+        encoding and the number of segments it is billed as.
 
-        :raises ValidationError: If rendered SMS body exceeds 160 characters.
-        :return: A dictionary with the SMS body.
+        :raises ValidationError: If the rendered SMS body needs more segments than the system allows.
+        :return: A dictionary with the SMS body, its encoding and segment count.
         """
-        body = Template(self.template.body).render(Context(self.context))
-        if len(body) > 160:  # Typical SMS character limit
-            raise ValidationError("SMS content exceeds 160 characters")
+        body = self.render('body')
+        sms = segment_sms(body)
+        max_segments = self.notification.system.max_sms_segments or settings.SMS_MAX_SEGMENTS
+        if sms.segments > max_segments:
+            raise ValidationError(
+                f"SMS content needs {sms.segments} {sms.encoding} segments, more than the {max_segments} allowed")
+        SMS_SEGMENTS.inc(
+            sms.segments * len(self.recipients), system=self.notification.system.name, encoding=sms.encoding)
 
         # TODO: HANDLE LOGIC TO USE DIFFERENT SMS_SERVICE_ID IF NEED BE
 
         return {
             'sender_id': self.notification.system.name,
             'body': body,
+            'encoding': sms.encoding,
+            'segments': sms.segments,
             'unique_identifier': str(self.notification.id)
         }
 
+    def recipient_groups(self) -> List[Tuple[List[str], List[Provider]]]:
+        """
+        Groups the recipients by SMS route, so each group goes through the providers routed for its prefix,
+        cheapest per segment first.
+
+        :return: A list of (recipients, providers) tuples.
+        """
+        return reference_cache.sms_router().split(self.recipients, self.active_providers())
+
     def validate(self) -> bool:
         """
-        Validates that the SMS has a valid phone number and that template content is present.
+        Validates that the SMS has at least one valid phone number. Recipients are normalised at ingestion,
+        so this only drops numbers stored by other means that are not valid E.164 numbers.
 
-        :raises ValidationError: If phone number or template content is invalid.
+        :raises ValidationError: If no recipient is a valid phone number.
         :return: True if validation passes.
         """
-        phone_pattern = r'254\d{9}'
-        for recipient in self.recipients:
-            if not re.match(phone_pattern, recipient):
-                raise ValidationError("Invalid phone number")
+        recipients = normalise_phone_numbers(self.recipients)
+        if recipients.rejected:
+            logger.info("SMSNotification - Skipping %d invalid phone numbers", len(recipients.rejected))
+        self.recipients = recipients.valid
+        if not self.recipients:
+            raise ValidationError("Invalid phone number")
         return True
@@ -0,0 +1,472 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import ssl
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Optional, Tuple, Any, Callable, Awaitable
+from urllib.parse import parse_qs
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Africa's Talking per-recipient status codes used in simulated responses
+AT_SUCCESS = (101, "Success")
+AT_FAILURE = (501, "GatewayError")
+
+
+class SimulatorBehaviour:
+    """
+    Latency, error injection and throttling applied to every request a simulator receives.
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, max_rps: float = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self._tokens = max_rps
+        self._refilled_at = time.monotonic()
+
+    async def delay(self) -> None:
+        seconds = max(self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms), 0) / 1000
+        if seconds:
+            await asyncio.sleep(seconds)
+
+    def should_fail(self) -> bool:
+        return random.random() < self.error_rate
+
+    def throttled(self) -> bool:
+        """
+        Token bucket allowing `max_rps` requests per second with bursts of up to one second's worth.
+        """
+        if not self.max_rps:
+            return False
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._refilled_at) * self.max_rps, self.max_rps)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+
+class SimulatorStats:
+    """
+    Throughput counters shared by all simulators running in the process.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def inc(self, simulator: str, counter: str, amount: int = 1) -> None:
+        counters = self.counters.setdefault(simulator, {})
+        counters[counter] = counters.get(counter, 0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "uptime_s": round(elapsed, 1),
+            "simulators": {
+                name: {
+                    **counters,
+                    "requests_per_sec": round(counters.get("requests", 0) / elapsed, 2),
+                }
+                for name, counters in sorted(self.counters.items())
+            },
+        }
+
+
+async def _read_body(receive: Callable[[], Awaitable[Dict]]) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _respond(send: Callable[[Dict], Awaitable[None]], status: int, payload: Any, headers=()) -> None:
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class HTTPSimulator:
+    """
+    Base ASGI application for the HTTP gateway simulators.
+
+    Subclasses implement `handle`; GET /stats returns the shared counters and throttled requests
+    are answered with HTTP 429 before reaching the handler.
+    """
+    name = ""
+
+    def __init__(self, behaviour: SimulatorBehaviour, stats: SimulatorStats):
+        self.behaviour = behaviour
+        self.stats = stats
+
+    async def __call__(self, scope: Dict, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        if scope["method"] == "GET" and scope["path"] == "/stats":
+            await _respond(send, 200, self.stats.snapshot())
+            return
+
+        body = await _read_body(receive)
+        self.stats.inc(self.name, "requests")
+        if self.behaviour.throttled():
+            self.stats.inc(self.name, "throttled")
+            await _respond(send, 429, self.throttled_payload(), headers=[(b"retry-after", b"1")])
+            return
+
+        await self.behaviour.delay()
+        try:
+            status, payload = await self.handle(scope, body)
+        except Exception as ex:
+            logger.exception("%s - handle exception: %s", type(self).__name__, ex)
+            status, payload = 500, {"error": str(ex)}
+        self.stats.inc(self.name, "responses_%d" % status)
+        await _respond(send, status, payload)
+
+    def throttled_payload(self) -> Dict:
+        return {"error": "Too Many Requests"}
+
+    async def handle(self, scope: Dict, body: bytes) -> Tuple[int, Any]:
+        raise NotImplementedError
+
+
+class SMSGatewaySimulator(HTTPSimulator):
+    """
+    Fake SMS gateway speaking both the Belio and the Africa's Talking messaging APIs.
+
+    Belio requests (any POST path other than /version1/messaging) are accepted immediately and a
+    delivery report is POSTed to the request's callbackUrl after `dlr_delay_ms`, as Belio does.
+    """
+    name = "sms"
+
+    def __init__(
+            self, behaviour: SimulatorBehaviour, stats: SimulatorStats, dlr_delay_ms: float = 1000,
+            dlr_failure_rate: float = 0):
+        super().__init__(behaviour, stats)
+        self.dlr_delay_ms = dlr_delay_ms
+        self.dlr_failure_rate = dlr_failure_rate
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pending_reports: set = set()
+
+    async def handle(self, scope: Dict, body: bytes) -> Tuple[int, Any]:
+        if scope["path"].rstrip("/") == "/version1/messaging":
+            return self._handle_africas_talking(body)
+        return self._handle_belio(body)
+
+    def _handle_africas_talking(self, body: bytes) -> Tuple[int, Any]:
+        form = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        numbers = [number for number in form.get("to", "").split(",") if number]
+        if not numbers:
+            return 400, {"SMSMessageData": {"Message": "InvalidRequest", "Recipients": []}}
+
+        recipients = []
+        for number in numbers:
+            code, status = AT_FAILURE if self.behaviour.should_fail() else AT_SUCCESS
+            self.stats.inc(self.name, "messages_accepted" if code == AT_SUCCESS[0] else "messages_failed")
+            recipients.append({
+                "statusCode": code,
+                "number": number,
+                "status": status,
+                "cost": "KES 0.8000" if code == AT_SUCCESS[0] else "0",
+                "messageId": f"ATXid_{uuid.uuid4().hex}" if code == AT_SUCCESS[0] else "None",
+            })
+        accepted = sum(1 for recipient in recipients if recipient["statusCode"] == AT_SUCCESS[0])
+        return 201, {"SMSMessageData": {
+            "Message": f"Sent to {accepted}/{len(recipients)} Total Cost: KES {accepted * 0.8:.4f}",
+            "Recipients": recipients,
+        }}
+
+    def _handle_belio(self, body: bytes) -> Tuple[int, Any]:
+        data = json.loads(body or b"{}")
+        addresses = data.get("addresses") or []
+        if not addresses:
+            return 400, {"error": "addresses is required"}
+        if self.behaviour.should_fail():
+            self.stats.inc(self.name, "messages_failed", len(addresses))
+            return 500, {"error": "Internal gateway error"}
+
+        self.stats.inc(self.name, "messages_accepted", len(addresses))
+        report_request = data.get("deliveryReportRequest") or {}
+        if report_request.get("callbackUrl"):
+            task = asyncio.ensure_future(self._send_delivery_report(
+                report_request["callbackUrl"], report_request.get("correlator", ""), addresses))
+            self._pending_reports.add(task)
+            task.add_done_callback(self._pending_reports.discard)
+        return 200, {"status": "Accepted", "messageId": uuid.uuid4().hex, "addresses": addresses}
+
+    async def _send_delivery_report(self, callback_url: str, correlator: str, addresses) -> None:
+        await asyncio.sleep(self.dlr_delay_ms / 1000)
+        delivered = random.random() >= self.dlr_failure_rate
+        payload = {
+            "deliveryStatus": "DeliveredToTerminal" if delivered else "DeliveryImpossible",
+            "correlator": correlator,
+            "address": addresses[0] if len(addresses) == 1 else addresses,
+            "timestamp": datetime.now(dt_timezone.utc).isoformat(),
+        }
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10)
+        try:
+            response = await self._client.post(callback_url, json=payload)
+            response.raise_for_status()
+            self.stats.inc(self.name, "dlr_delivered" if delivered else "dlr_failed")
+        except Exception as ex:
+            self.stats.inc(self.name, "dlr_errors")
+            logger.warning("SMSGatewaySimulator - delivery report to %s failed: %s", callback_url, ex)
+
+
+class FCMSimulator(HTTPSimulator):
+    """
+    Fake FCM HTTP v1 API and OAuth2 token endpoint.
+
+    Tokens starting with "invalid" always come back UNREGISTERED; other tokens are reported
+    UNREGISTERED at `invalid_token_rate`.
+    """
+    name = "fcm"
+
+    def __init__(self, behaviour: SimulatorBehaviour, stats: SimulatorStats, invalid_token_rate: float = 0):
+        super().__init__(behaviour, stats)
+        self.invalid_token_rate = invalid_token_rate
+
+    @staticmethod
+    def _error(code: int, status: str, message: str, error_code: Optional[str] = None) -> Dict:
+        error = {"code": code, "message": message, "status": status}
+        if error_code:
+            error["details"] = [{"@type": "type.googleapis.com/google.firebase.fcm.v1.FcmError", "errorCode": error_code}]
+        return {"error": error}
+
+    def throttled_payload(self) -> Dict:
+        return self._error(429, "RESOURCE_EXHAUSTED", "Quota exceeded.", "QUOTA_EXCEEDED")
+
+    async def handle(self, scope: Dict, body: bytes) -> Tuple[int, Any]:
+        path = scope["path"]
+        if path.rstrip("/") == "/token":
+            self.stats.inc(self.name, "tokens_issued")
+            return 200, {"access_token": f"sim-{uuid.uuid4().hex}", "expires_in": 3600, "token_type": "Bearer"}
+        if not path.endswith("/messages:send"):
+            return 404, self._error(404, "NOT_FOUND", f"Unknown path {path}")
+
+        message = json.loads(body or b"{}").get("message", {})
+        token = message.get("token", "")
+        if not token:
+            return 400, self._error(400, "INVALID_ARGUMENT", "Message must have a token.", "INVALID_ARGUMENT")
+        if token.startswith("invalid") or random.random() < self.invalid_token_rate:
+            self.stats.inc(self.name, "messages_unregistered")
+            return 404, self._error(404, "NOT_FOUND", "Requested entity was not found.", "UNREGISTERED")
+        if self.behaviour.should_fail():
+            self.stats.inc(self.name, "messages_failed")
+            return 503, self._error(503, "UNAVAILABLE", "The service is currently unavailable.", "UNAVAILABLE")
+
+        self.stats.inc(self.name, "messages_accepted")
+        project = path.split("/projects/", 1)[-1].split("/", 1)[0] if "/projects/" in path else "simulator"
+        return 200, {"name": f"projects/{project}/messages/{uuid.uuid4().int >> 64}"}
+
+
+class SMTPSink:
+    """
+    Minimal SMTP server that accepts and discards mail, with optional STARTTLS and AUTH.
+
+    When `credentials` is None any AUTH PLAIN/LOGIN is accepted. Injected errors reject the
+    message with 451 after DATA; throttled sessions are refused with 421.
+    """
+    name = "smtp"
+
+    def __init__(
+            self, behaviour: SimulatorBehaviour, stats: SimulatorStats, ssl_context: Optional[ssl.SSLContext] = None,
+            credentials: Optional[Tuple[str, str]] = None):
+        self.behaviour = behaviour
+        self.stats = stats
+        self.ssl_context = ssl_context
+        self.credentials = credentials
+
+    async def start(self, host: str, port: int) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._session, host, port)
+
+    def _check_credentials(self, username: str, password: str) -> bool:
+        return self.credentials is None or (username, password) == self.credentials
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async def reply(line: str) -> None:
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        async def read_line() -> str:
+            return (await reader.readline()).decode(errors="replace").rstrip("\r\n")
+
+        self.stats.inc(self.name, "connections")
+        tls_active, authenticated, recipients = False, False, 0
+        try:
+            if self.behaviour.throttled():
+                self.stats.inc(self.name, "throttled")
+                await reply("421 4.7.0 Too many connections, try again later")
+                return
+            await reply("220 localhost ESMTP notify simulator")
+
+            while True:
+                line = await read_line()
+                if not line and reader.at_eof():
+                    return
+                command, _, argument = line.partition(" ")
+                command = command.upper()
+
+                if command in ("EHLO", "HELO"):
+                    if command == "HELO":
+                        await reply("250 localhost")
+                        continue
+                    extensions = ["PIPELINING", "8BITMIME", "AUTH PLAIN LOGIN"]
+                    if self.ssl_context and not tls_active:
+                        extensions.append("STARTTLS")
+                    await reply("250-localhost")
+                    for extension in extensions[:-1]:
+                        await reply(f"250-{extension}")
+                    await reply(f"250 {extensions[-1]}")
+                elif command == "STARTTLS" and self.ssl_context and not tls_active:
+                    await reply("220 2.0.0 Ready to start TLS")
+                    await writer.start_tls(self.ssl_context)
+                    tls_active, authenticated = True, False
+                elif command == "AUTH":
+                    authenticated = await self._authenticate(argument, reply, read_line)
+                    if authenticated:
+                        await reply("235 2.7.0 Authentication successful")
+                    else:
+                        self.stats.inc(self.name, "auth_failures")
+                        await reply("535 5.7.8 Authentication credentials invalid")
+                elif command == "MAIL":
+                    if self.credentials is not None and not authenticated:
+                        await reply("530 5.7.0 Authentication required")
+                        continue
+                    recipients = 0
+                    await reply("250 2.1.0 OK")
+                elif command == "RCPT":
+                    recipients += 1
+                    await reply("250 2.1.5 OK")
+                elif command == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    size = 0
+                    while True:
+                        data_line = await reader.readline()
+                        if not data_line or data_line in (b".\r\n", b".\n"):
+                            break
+                        size += len(data_line)
+                    self.stats.inc(self.name, "requests")
+                    await self.behaviour.delay()
+                    if self.behaviour.should_fail():
+                        self.stats.inc(self.name, "messages_failed", recipients)
+                        await reply("451 4.3.0 Simulated temporary failure")
+                    else:
+                        self.stats.inc(self.name, "messages_accepted", recipients)
+                        self.stats.inc(self.name, "bytes_received", size)
+                        await reply(f"250 2.0.0 OK queued as {uuid.uuid4().hex[:12]}")
+                elif command in ("RSET", "NOOP"):
+                    recipients = 0 if command == "RSET" else recipients
+                    await reply("250 2.0.0 OK")
+                elif command == "QUIT":
+                    await reply("221 2.0.0 Bye")
+                    return
+                else:
+                    await reply("502 5.5.2 Command not implemented")
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError) as ex:
+            logger.debug("SMTPSink - session ended: %s", ex)
+        finally:
+            writer.close()
+
+    async def _authenticate(self, argument: str, reply, read_line) -> bool:
+        mechanism, _, initial = argument.partition(" ")
+        try:
+            if mechanism.upper() == "PLAIN":
+                if not initial:
+                    await reply("334 ")
+                    initial = await read_line()
+                _, username, password = base64.b64decode(initial).decode().split("\0")
+            elif mechanism.upper() == "LOGIN":
+                if initial:
+                    username = base64.b64decode(initial).decode()
+                else:
+                    await reply("334 VXNlcm5hbWU6")
+                    username = base64.b64decode(await read_line()).decode()
+                await reply("334 UGFzc3dvcmQ6")
+                password = base64.b64decode(await read_line()).decode()
+            else:
+                return False
+        except ValueError:
+            return False
+        return self._check_credentials(username, password)
+
+
+def generate_self_signed_certificate(directory: str, hostname: str = "localhost") -> Tuple[str, str]:
+    """
+    Writes a self-signed certificate and key for the SMTP sink's STARTTLS.
+
+    :param directory: Directory to write cert.pem and key.pem to.
+    :param hostname: Common name of the certificate.
+    :return: Tuple of (certificate path, key path).
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)])
+    now = datetime.now(dt_timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=365))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName(hostname)]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    os.makedirs(directory, exist_ok=True)
+    cert_path, key_path = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as fil:
+        fil.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as fil:
+        fil.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+def generate_fcm_provider_config(base_url: str, project_id: str = "notify-simulator") -> Dict[str, Any]:
+    """
+    Builds a FirebasePushProvider config whose OAuth2 token and send requests go to the FCM simulator.
+
+    A throwaway RSA key is generated because firebase_admin refuses credentials without a valid private key.
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    base_url = base_url.rstrip("/")
+    return {
+        "type": "service_account",
+        "project_id": project_id,
+        "private_key_id": uuid.uuid4().hex,
+        "private_key": key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()).decode(),
+        "client_email": f"simulator@{project_id}.iam.gserviceaccount.com",
+        "client_id": "0",
+        "auth_uri": f"{base_url}/auth",
+        "token_uri": f"{base_url}/token",
+        "auth_provider_x509_cert_url": f"{base_url}/certs",
+        "client_x509_cert_url": f"{base_url}/certs",
+        "fcm_url": f"{base_url}/v1/projects/{project_id}/messages:send",
+    }
@@ -1,13 +1,27 @@
 import logging
-from typing import Dict, List
+from typing import Dict, List, Any, Tuple
 
 import africastalking
+import requests
+from asgiref.sync import sync_to_async
 
-from core.backend.providers.base_provider import BaseProvider
-from core.models import State
+from core.backend.providers.base_provider import BaseProvider, get_async_http_client
+from core.models import State, Suppression
 
 logger = logging.getLogger(__name__)
 
+PRODUCTION_BASE_URL = "https://api.africastalking.com"
+SANDBOX_BASE_URL = "https://api.sandbox.africastalking.com"
+
+# Africa's Talking per-recipient status codes that mean the message was accepted
+SUCCESS_STATUS_CODES = {100, 101, 102}
+
+# Per-recipient statuses that will not change on a retry, and the suppression reason they map to
+PERMANENT_FAILURE_STATUSES = {
+    "UserInBlacklist": Suppression.REASON_OPT_OUT,
+    "InvalidPhoneNumber": Suppression.REASON_HARD_BOUNCE,
+}
+
 
 class AfricasTalkingSMSProvider(BaseProvider):
     def validate_config(self) -> bool:
@@ -21,21 +35,112 @@ class AfricasTalkingSMSProvider(BaseProvider):
             return False
         return True
 
+    def warm_up(self) -> None:
+        """
+        Initialises the Africa's Talking SDK, unless sends go to the HTTP API directly.
+        """
+        if not self.config.get("base_url"):
+            africastalking.initialize(self.config.get("username"), self.config.get("api_key"))
+
+    def _record_recipient_statuses(self, response: Dict[str, Any]) -> int:
+        """
+        Records the per-recipient result from an Africa's Talking messaging response.
+
+        :param response: Decoded JSON response body.
+        :return: Number of recipients the message was accepted for.
+        """
+        accepted = 0
+        for result in response.get("SMSMessageData", {}).get("Recipients", []):
+            number = result.get("number", "").replace("+", "")
+            if result.get("statusCode") in SUCCESS_STATUS_CODES:
+                accepted += 1
+                self.recipient_statuses[number] = {"status": "sent", "message_id": result.get("messageId")}
+            else:
+                self.recipient_statuses[number] = {"status": "failed", "error": result.get("status")}
+                if result.get("status") in PERMANENT_FAILURE_STATUSES:
+                    self.recipient_statuses[number]["suppress"] = PERMANENT_FAILURE_STATUSES[result["status"]]
+        return accepted
+
+    def _build_request(self, recipients: List[str], content: Dict[str, str]) -> Tuple[str, Dict, Dict]:
+        """
+        Builds the messaging API request used when talking to the HTTP API directly.
+
+        :param recipients: List of phone number(s).
+        :param content: Dict with 'body' key containing the message.
+        :return: Tuple of (url, headers, form data).
+        """
+        username = self.config.get("username")
+        default_base_url = SANDBOX_BASE_URL if username == "sandbox" else PRODUCTION_BASE_URL
+        url = self.config.get("base_url", default_base_url).rstrip("/") + "/version1/messaging"
+
+        headers = {
+            "Accept": "application/json",
+            "apiKey": self.config.get("api_key"),
+        }
+        data = {
+            "username": username,
+            "to": ",".join(
+                recipient if recipient.startswith("+") else f"+{recipient}" for recipient in recipients),
+            "message": content.get("body", ""),
+            "bulkSMSMode": 1,
+        }
+        if content.get("sender_id"):
+            data["from"] = content["sender_id"]
+
+        return url, headers, data
+
     def send(self, recipients: List[str], content: Dict[str, str]) -> State:
         """
         Sends an SMS to one or more recipients.
 
+        Uses the Africa's Talking SDK, or the HTTP API directly when a 'base_url' is configured
+        (e.g. to point at a local gateway simulator).
+
         :param recipients: List of phone number(s).
         :param content: Dict with 'body' key containing the message.
-        :return: Sent state if sms is sent successfully else Failed state.
+        :return: Sent state if sms is accepted for at least one recipient else Failed state.
         """
         try:
+            if self.config.get("base_url"):
+                url, headers, data = self._build_request(recipients, content)
+                response = requests.post(url, headers=headers, data=data, timeout=30)
+                response.raise_for_status()
+                logger.info("Africa's Talking response: %s", response.text)
+                if self._record_recipient_statuses(response.json()) == 0:
+                    raise Exception("SMS not accepted for any recipient")
+                return State.sent()
+
             message = content.get("body", "")
             sender_id = content.get("sender_id", None)
             africastalking.initialize(self.config.get("username"), self.config.get("api_key"))
             response = africastalking.SMS.send(message, recipients, sender_id=sender_id if sender_id else None)
             logger.info("Africa's Talking response: %s", response)
+            if self._record_recipient_statuses(response) == 0:
+                raise Exception("SMS not accepted for any recipient")
             return State.sent()
         except Exception as ex:
             logger.exception("Africa'sTalkingSMSProvider - send exception: %s", ex)
             return State.failed()
+
+    async def send_async(self, recipients: List[str], content: Dict[str, str]) -> State:
+        """
+        Sends an SMS to one or more recipients over the Africa's Talking HTTP API without blocking the event loop.
+
+        :param recipients: List of phone number(s).
+        :param content: Dict with 'body' key containing the message.
+        :return: Sent state if sms is accepted for at least one recipient else Failed state.
+        """
+        try:
+            url, headers, data = self._build_request(recipients, content)
+
+            response = await get_async_http_client().post(url, headers=headers, data=data)
+            response.raise_for_status()
+            logger.info("Africa's Talking response: %s", response.text)
+
+            if self._record_recipient_statuses(response.json()) == 0:
+                raise Exception("SMS not accepted for any recipient")
+
+            return await sync_to_async(State.sent)()
+        except Exception as ex:
+            logger.exception("Africa'sTalkingSMSProvider - send_async exception: %s", ex)
+            return await sync_to_async(State.failed)()
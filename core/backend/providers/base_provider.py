@@ -1,8 +1,31 @@
+import asyncio
+import weakref
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from typing import Dict, List, Any
+
+import httpx
 
 from core.models import State
 
+# One pooled async HTTP client per event loop, shared by all providers running on that loop
+_async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = \
+    weakref.WeakKeyDictionary()
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the pooled httpx client bound to the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+        )
+        _async_http_clients[loop] = client
+    return client
+
 
 class BaseProvider(ABC):
     """
@@ -12,6 +35,10 @@ class BaseProvider(ABC):
     def __init__(self, provider_config: dict):
         # Store configuration dictionary (e.g., API keys, host, port)
         self.config = provider_config
+        # Per-recipient outcome of the last send, for providers that report one (e.g. FCM multicast).
+        # A "suppress" key (a Suppression reason) marks a recipient the provider rejected for good, and an
+        # "invalid_token" key a device token it reported dead
+        self.recipient_statuses: Dict[str, Dict[str, Any]] = {}
 
     @abstractmethod
     def validate_config(self) -> bool:
@@ -21,6 +48,13 @@ class BaseProvider(ABC):
         """
         pass
 
+    def warm_up(self) -> None:
+        """
+        Prepares long-lived resources (SDK clients, credentials, connections) ahead of the first send.
+        Called once per worker process during warm-up; the default does nothing.
+        """
+        pass
+
     @abstractmethod
     def send(self, recipients: List[str], content: Dict[str, str]) -> State:
         """
@@ -29,3 +63,11 @@ class BaseProvider(ABC):
         """
         pass
 
+    async def send_async(self, recipients: List[str], content: Dict[str, str]) -> State:
+        """
+        Asynchronous counterpart of send, used by the asyncio delivery worker.
+
+        Providers with a non-blocking client override this. The default runs the synchronous
+        send in a worker thread so every provider can be used from an event loop.
+        """
+        return await asyncio.to_thread(self.send, recipients, content)
@@ -1,9 +1,10 @@
 import logging
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 import requests
+from asgiref.sync import sync_to_async
 
-from core.backend.providers.base_provider import BaseProvider
+from core.backend.providers.base_provider import BaseProvider, get_async_http_client
 from core.models import State
 
 logger = logging.getLogger(__name__)
@@ -21,6 +22,32 @@ class BelioSMSProvider(BaseProvider):
             return False
         return True
 
+    def _build_request(self, recipients: List[str], content: Dict[str, str]) -> Tuple[str, Dict, Dict]:
+        """
+        Builds the Belio send request shared by the sync and async send paths.
+
+        :param recipients: List of phone number(s).
+        :param content: Dict with 'body' key containing the message.
+        :return: Tuple of (url, headers, json body).
+        """
+        headers = {
+            "Authorization": self.config.get("api_key"),
+            "Cookie": self.config.get("cookie"),
+            "Content-Type": "application/json"
+        }
+
+        data = {
+            "smsServiceId": content.get("sms_service_id", self.config.get("default_sms_service_id")),
+            "message": content.get("body", ""),
+            "addresses": recipients,
+            "deliveryReportRequest": {
+                "correlator": content.get("unique_identifier", ""),
+                "callbackUrl": self.config.get("callback_url")
+            }
+        }
+
+        return self.config.get("url"), headers, data
+
     def send(self, recipients: List[str], content: Dict[str, str]) -> State:
         """
         Sends an SMS to one or more recipients.
@@ -30,25 +57,7 @@ class BelioSMSProvider(BaseProvider):
         :return: ConfirmationPending state if sms is queued successfully else Failed state.
         """
         try:
-            message = content.get("body", "")
-            unique_identifier = content.get("unique_identifier", "")
-
-            url = self.config.get("url")
-            headers = {
-                "Authorization": self.config.get("api_key"),
-                "Cookie": self.config.get("cookie"),
-                "Content-Type": "application/json"
-            }
-
-            data = {
-                "smsServiceId": content.get("sms_service_id", self.config.get("default_sms_service_id")),
-                "message": message,
-                "addresses": recipients,
-                "deliveryReportRequest": {
-                    "correlator": unique_identifier,
-                    "callbackUrl": self.config.get("callback_url")
-                }
-            }
+            url, headers, data = self._build_request(recipients, content)
 
             response = requests.post(url, headers=headers, json=data)
             response.raise_for_status()
@@ -57,3 +66,22 @@ class BelioSMSProvider(BaseProvider):
         except Exception as ex:
             logger.exception("BelioSMSProvider - send exception: %s", ex)
             return State.failed()
+
+    async def send_async(self, recipients: List[str], content: Dict[str, str]) -> State:
+        """
+        Sends an SMS to one or more recipients without blocking the event loop.
+
+        :param recipients: List of phone number(s).
+        :param content: Dict with 'body' key containing the message.
+        :return: ConfirmationPending state if sms is queued successfully else Failed state.
+        """
+        try:
+            url, headers, data = self._build_request(recipients, content)
+
+            response = await get_async_http_client().post(url, headers=headers, json=data)
+            response.raise_for_status()
+
+            return await sync_to_async(State.confirmation_pending)()
+        except Exception as ex:
+            logger.exception("BelioSMSProvider - send_async exception: %s", ex)
+            return await sync_to_async(State.failed)()
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, List
+
+from asgiref.sync import sync_to_async
+
+from core.backend.providers.base_provider import BaseProvider
+from core.models import State
+
+logger = logging.getLogger(__name__)
+
+
+class FakeProvider(BaseProvider):
+    """
+    Stand-in provider that performs no I/O, for benchmarks and load tests.
+
+    Config keys (all optional):
+        latency_ms: Mean simulated request time (default: 0).
+        jitter_ms: Maximum random deviation added to or subtracted from the latency (default: 0).
+        error_rate: Fraction of sends, between 0 and 1, that fail (default: 0).
+        result: "sent" or "confirmation_pending" for successful sends (default: "sent").
+    """
+
+    def validate_config(self) -> bool:
+        """
+        Checks that the simulation values are usable.
+        """
+        try:
+            error_rate = float(self.config.get("error_rate", 0))
+            float(self.config.get("latency_ms", 0))
+            float(self.config.get("jitter_ms", 0))
+        except (TypeError, ValueError):
+            logger.error("FakeProvider - latency_ms, jitter_ms and error_rate must be numbers")
+            return False
+        if not 0 <= error_rate <= 1:
+            logger.error("FakeProvider - error_rate must be between 0 and 1")
+            return False
+        return True
+
+    def _delay(self) -> float:
+        latency = float(self.config.get("latency_ms", 0))
+        jitter = float(self.config.get("jitter_ms", 0))
+        return max(latency + random.uniform(-jitter, jitter), 0) / 1000
+
+    def _outcome(self, recipients: List[str]) -> State:
+        if random.random() < float(self.config.get("error_rate", 0)):
+            return State.failed()
+        self.recipient_statuses = {
+            recipient: {"status": "sent", "message_id": f"fake-{random.getrandbits(48):012x}"}
+            for recipient in recipients
+        }
+        if self.config.get("result") == "confirmation_pending":
+            return State.confirmation_pending()
+        return State.sent()
+
+    def send(self, recipients: List[str], content: Dict[str, str]) -> State:
+        """
+        Simulates a provider request.
+
+        :param recipients: List of recipients.
+        :param content: Rendered notification content (ignored).
+        :return: Sent (or ConfirmationPending) state, or Failed state for injected errors.
+        """
+        time.sleep(self._delay())
+        return self._outcome(recipients)
+
+    async def send_async(self, recipients: List[str], content: Dict[str, str]) -> State:
+        """
+        Simulates a provider request without blocking the event loop.
+
+        :param recipients: List of recipients.
+        :param content: Rendered notification content (ignored).
+        :return: Sent (or ConfirmationPending) state, or Failed state for injected errors.
+        """
+        await asyncio.sleep(self._delay())
+        return await sync_to_async(self._outcome, thread_sensitive=False)(recipients)
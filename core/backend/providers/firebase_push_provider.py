@@ -1,13 +1,39 @@
+import asyncio
+import hashlib
+import json
 import logging
-from typing import Dict, List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
 
-from firebase_admin import messaging
+import firebase_admin
+from asgiref.sync import sync_to_async
+from firebase_admin import credentials, exceptions, messaging
+from google.auth.transport.requests import Request
 
-from core.backend.providers.base_provider import BaseProvider
+from core.backend.metrics import CACHE_REQUESTS
+from core.backend.providers.base_provider import BaseProvider, get_async_http_client
+from core.backend.services import DeviceTokenService
 from core.models import State
 
 logger = logging.getLogger(__name__)
 
+# FCM rejects multicast messages with more than 500 tokens
+FCM_MULTICAST_LIMIT = 500
+
+FCM_SEND_URL = "https://fcm.googleapis.com/v1/projects/{project_id}/messages:send"
+
+# FCM error codes that mean a token will never be deliverable again
+DEAD_TOKEN_ERRORS = {"UNREGISTERED"}
+
+# INVALID_ARGUMENT is also returned for a malformed or oversize message, so it only marks a token dead when
+# the error's field violations name the token
+INVALID_TOKEN_FIELD = "message.token"
+
+# Named firebase_admin apps, one per distinct provider config, cached for the lifetime of the worker process
+_firebase_apps: Dict[str, firebase_admin.App] = {}
+_firebase_apps_lock = threading.Lock()
+
 
 class FirebasePushProvider(BaseProvider):
     def validate_config(self) -> bool:
@@ -17,7 +43,7 @@ class FirebasePushProvider(BaseProvider):
         required_keys = [
             "type", "project_id", "private_key_id", "private_key",
             "client_email", "client_id", "auth_uri", "token_uri",
-            "auth_providepr_x509_cert_url", "client_x509_cert_url"
+            "auth_provider_x509_cert_url", "client_x509_cert_url"
         ]
         missing_keys = [key for key in required_keys if key not in self.config]
         if missing_keys:
@@ -25,36 +51,174 @@ class FirebasePushProvider(BaseProvider):
             return False
         return True
 
+    def get_app(self) -> firebase_admin.App:
+        """
+        Returns the firebase_admin app for this provider's config, initialising it on first use.
+
+        Apps are named after a hash of the config so that several Firebase projects can be served
+        from the same worker without re-reading credentials on every send.
+
+        :return: The initialised firebase_admin App.
+        """
+        config_hash = hashlib.sha256(json.dumps(self.config, sort_keys=True).encode()).hexdigest()
+        app = _firebase_apps.get(config_hash)
+        CACHE_REQUESTS.inc(cache="firebase_app", result="miss" if app is None else "hit")
+        if app is not None:
+            return app
+
+        with _firebase_apps_lock:
+            app = _firebase_apps.get(config_hash)
+            if app is None:
+                app = firebase_admin.initialize_app(
+                    credentials.Certificate(self.config),
+                    name=f"notify-{self.config.get('project_id', 'app')}-{config_hash[:12]}"
+                )
+                if self.config.get("fcm_url"):
+                    # firebase_admin has no endpoint option; point its messaging service at e.g. a local simulator.
+                    # This relies on a private attribute of the firebase_admin version pinned in requirements.txt,
+                    # so fail loudly rather than send to the real FCM if a release renames it
+                    service = messaging._get_messaging_service(app)
+                    if not hasattr(service, "_fcm_url"):
+                        firebase_admin.delete_app(app)
+                        raise RuntimeError(
+                            f"firebase_admin {firebase_admin.__version__} does not support the fcm_url override")
+                    service._fcm_url = self.config["fcm_url"]
+                _firebase_apps[config_hash] = app
+        return app
+
+    def warm_up(self) -> None:
+        """
+        Initialises the firebase_admin app and its messaging client, and fetches an access token so the
+        first send does not pay for the OAuth round trip.
+        """
+        app = self.get_app()
+        messaging._get_messaging_service(app)
+        app.credential.get_access_token()
+
+    @staticmethod
+    def _failure(error_code: str, details: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Builds the result of a token FCM rejected, flagging it as dead when the token itself is at fault.
+
+        :param error_code: FCM error code, e.g. UNREGISTERED or INVALID_ARGUMENT.
+        :param details: The 'details' of FCM's error response.
+        :return: The per-token result dictionary.
+        """
+        result = {"status": "failed", "error": error_code}
+        if error_code in DEAD_TOKEN_ERRORS or error_code == "INVALID_ARGUMENT" and any(
+                violation.get("field") == INVALID_TOKEN_FIELD
+                for detail in details if isinstance(detail, dict)
+                for violation in detail.get("fieldViolations", [])):
+            result["invalid_token"] = True
+        return result
+
+    @staticmethod
+    def _error_details(response) -> List[Dict[str, Any]]:
+        """
+        Reads the 'details' of an FCM error response, or none if the body is not an FCM error.
+        """
+        try:
+            error = response.json().get("error", {})
+            return error.get("details", []) if isinstance(error, dict) else []
+        except Exception:
+            return []
+
+    def _exception_result(self, ex: Exception) -> Dict[str, Any]:
+        """
+        Maps a per-token FCM exception to its result, with its error code (e.g. UNREGISTERED, INVALID_ARGUMENT).
+        """
+        if isinstance(ex, messaging.UnregisteredError):
+            return self._failure("UNREGISTERED", [])
+        if isinstance(ex, exceptions.FirebaseError):
+            details = self._error_details(ex.http_response) if ex.http_response is not None else []
+            return self._failure(ex.code, details)
+        return self._failure("UNKNOWN", [])
+
+    def _send_chunk(self, app: firebase_admin.App, tokens: List[str], content: Dict[str, Any]) -> Dict[str, Dict]:
+        """
+        Sends one multicast message of at most FCM_MULTICAST_LIMIT tokens.
+
+        :param app: The firebase_admin app to send through.
+        :param tokens: Device tokens for this chunk.
+        :param content: Dictionary with 'title', 'body', and optional 'data'.
+        :return: Per-token result dictionaries keyed by token.
+        """
+        message_payload = messaging.MulticastMessage(
+            tokens=tokens,
+            notification=messaging.Notification(
+                title=content.get('title', 'Notification'),
+                body=content.get('body', '')
+            ),
+            data=content.get('data', {})  # Optional payload
+        )
+
+        try:
+            response = messaging.send_each_for_multicast(message_payload, app=app)
+        except Exception as ex:
+            logger.exception("FirebasePushProvider - _send_chunk exception: %s", ex)
+            # A batch-level error says nothing about the individual tokens, so it must not prune them
+            return {token: {"status": "failed", "error": "BATCH_FAILED"} for token in tokens}
+
+        results = {}
+        for token, token_response in zip(tokens, response.responses):
+            if token_response.success:
+                results[token] = {"status": "sent", "message_id": token_response.message_id}
+            else:
+                results[token] = self._exception_result(token_response.exception)
+        return results
+
+    def _prune_dead_tokens(self) -> None:
+        """
+        Marks tokens that FCM reported as unregistered or invalid so they are filtered out of future sends.
+        """
+        dead_tokens = {
+            token: result["error"] for token, result in self.recipient_statuses.items()
+            if result.get("invalid_token")
+        }
+        if not dead_tokens:
+            return
+        try:
+            DeviceTokenService().mark_invalid(dead_tokens)
+            logger.info("FirebasePushProvider - Marked %d device tokens as invalid", len(dead_tokens))
+        except Exception as ex:
+            logger.exception("FirebasePushProvider - _prune_dead_tokens exception: %s", ex)
+
     def send(self, recipients: List[str], content: Dict[str, str]) -> State:
         """
         Send push notification to a device or list of devices.
 
+        Tokens are split into chunks of FCM_MULTICAST_LIMIT and the chunks are sent concurrently.
+        The per-token outcome is recorded in `recipient_statuses`.
+
         :param recipients: List of Device token(s),
         :param content: Dictionary with 'title', 'body', and optional 'data'.
-        :return: Sent state if notification is sent successfully else Failed state.
+        :return: Sent state if the notification reached at least one device else Failed state.
         """
         try:
             if not recipients:
                 raise ValueError("No valid device tokens provided")
 
-            message_payload = messaging.MulticastMessage(
-                tokens=recipients,
-                notification=messaging.Notification(
-                    title=content.get('title', 'Notification'),
-                    body=content.get('body', '')
-                ),
-                data=content.get('data', {})  # Optional payload
-            )
+            app = self.get_app()
+            chunks = [
+                recipients[i:i + FCM_MULTICAST_LIMIT] for i in range(0, len(recipients), FCM_MULTICAST_LIMIT)]
 
-            response = messaging.send_each_for_multicast(message_payload)
+            max_workers = min(len(chunks), int(self.config.get("max_concurrent_batches", 4)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for chunk_results in executor.map(lambda chunk: self._send_chunk(app, chunk, content), chunks):
+                    self.recipient_statuses.update(chunk_results)
+
+            self._prune_dead_tokens()
+
+            success_count = sum(1 for result in self.recipient_statuses.values() if result["status"] == "sent")
             logger.info(
-                "FirebasePushProvider - Sent push to %d tokens. Success: %d, Failure: %d",
+                "FirebasePushProvider - Sent push to %d tokens in %d batches. Success: %d, Failure: %d",
                 len(recipients),
-                response.success_count,
-                response.failure_count
+                len(chunks),
+                success_count,
+                len(recipients) - success_count
             )
 
-            if response.success_count == 0:
+            if success_count == 0:
                 raise Exception("Push notification not sent")
 
             return State.sent()
@@ -62,3 +226,100 @@ class FirebasePushProvider(BaseProvider):
         except Exception as ex:
             logger.exception("FirebasePushProvider - send exception: %s", ex)
             return State.failed()
+
+    async def _get_access_token(self) -> str:
+        """
+        Returns an OAuth2 access token for the FCM HTTP v1 API, refreshing it off the event loop when expired.
+        """
+        credential = self.get_app().credential.get_credential()
+        if not credential.valid:
+            await asyncio.to_thread(credential.refresh, Request())
+        return credential.token
+
+    async def _send_token_async(
+            self, url: str, headers: Dict[str, str], token: str, content: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Sends the push message to a single device token through the FCM HTTP v1 API.
+
+        :return: The per-token result dictionary.
+        """
+        payload = {
+            "message": {
+                "token": token,
+                "notification": {
+                    "title": content.get('title', 'Notification'),
+                    "body": content.get('body', ''),
+                },
+                "data": content.get('data', {}),
+            }
+        }
+        try:
+            response = await get_async_http_client().post(url, headers=headers, json=payload)
+        except Exception as ex:
+            logger.warning("FirebasePushProvider - _send_token_async request failed: %s", ex)
+            return {"status": "failed", "error": "BATCH_FAILED"}
+
+        try:
+            body = response.json() if response.content else {}
+        except ValueError:
+            # e.g. an HTML error page from a proxy in front of FCM
+            logger.warning(
+                "FirebasePushProvider - non-JSON response %d: %s", response.status_code, response.text[:200])
+            body = {}
+        if not isinstance(body, dict):
+            body = {}
+
+        if response.status_code == 200:
+            return {"status": "sent", "message_id": body.get("name")}
+
+        error = body.get("error") if isinstance(body.get("error"), dict) else {}
+        error_code = error.get("status") or f"HTTP_{response.status_code}"
+        details = error.get("details", [])
+        for detail in details:
+            if detail.get("errorCode"):
+                error_code = detail["errorCode"]
+        return self._failure(error_code, details)
+
+    async def send_async(self, recipients: List[str], content: Dict[str, str]) -> State:
+        """
+        Send push notification to a device or list of devices without blocking the event loop.
+
+        Each token is sent as its own FCM HTTP v1 request, with at most `max_concurrent_requests` in flight.
+
+        :param recipients: List of Device token(s),
+        :param content: Dictionary with 'title', 'body', and optional 'data'.
+        :return: Sent state if the notification reached at least one device else Failed state.
+        """
+        try:
+            if not recipients:
+                raise ValueError("No valid device tokens provided")
+
+            url = self.config.get("fcm_url") or FCM_SEND_URL.format(project_id=self.config.get("project_id"))
+            headers = {"Authorization": f"Bearer {await self._get_access_token()}"}
+            semaphore = asyncio.Semaphore(int(self.config.get("max_concurrent_requests", 100)))
+
+            async def send_token(token: str) -> Dict[str, Any]:
+                async with semaphore:
+                    return await self._send_token_async(url, headers, token, content)
+
+            results = await asyncio.gather(*(send_token(token) for token in recipients))
+            self.recipient_statuses.update(zip(recipients, results))
+
+            await sync_to_async(self._prune_dead_tokens)()
+
+            success_count = sum(1 for result in results if result["status"] == "sent")
+            logger.info(
+                "FirebasePushProvider - Sent push to %d tokens. Success: %d, Failure: %d",
+                len(recipients),
+                success_count,
+                len(recipients) - success_count
+            )
+
+            if success_count == 0:
+                raise Exception("Push notification not sent")
+
+            return await sync_to_async(State.sent)()
+
+        except Exception as ex:
+            logger.exception("FirebasePushProvider - send_async exception: %s", ex)
+            return await sync_to_async(State.failed)()
@@ -1,15 +1,18 @@
+import asyncio
 import logging
 import re
 import smtplib
-from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.utils import formatdate
-from typing import Dict, List, Union
-from os.path import basename
+from typing import Dict, List, Union, Tuple
 
+import aiosmtplib
+from asgiref.sync import sync_to_async
+
+from core.backend.attachments import build_attachment_parts
 from core.backend.providers.base_provider import BaseProvider
-from core.models import State
+from core.models import State, Suppression
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +20,9 @@ class GmailSMTPServer(BaseProvider):
     def validate_config(self) -> bool:
         """
         Checks if the required SMTP config values are provided.
+
+        Optional keys: 'starttls' (default True) and 'validate_certs' (default True), which local
+        SMTP sinks with self-signed certificates or no TLS at all need to turn off.
         """
         required_keys = ['host', 'port', 'sender', 'password']
         missing_keys = [key for key in required_keys if key not in self.config]
@@ -25,6 +31,74 @@ class GmailSMTPServer(BaseProvider):
             return False
         return True
 
+    @staticmethod
+    def _build_message(
+            recipients: List[str], content: Dict[str, Union[str, List[str], List[str]]]
+    ) -> Tuple[MIMEMultipart, str, List[str]]:
+        """
+        Composes the email shared by the sync and async send paths.
+
+        :param recipients: List of email addresses.
+        :param content: Dictionary containing subject, message, cc, bcc, attachments, etc.
+        :return: Tuple of (message, from address, all envelope recipients including cc and bcc).
+        """
+        msg = MIMEMultipart()
+
+        # Set sender details
+        from_address = content.get('from_address', '')
+        msg['From'] = from_address
+        msg['Reply-To'] = content.get('reply_to', '')
+
+        # Format recipient field
+        msg['To'] = ",".join(recipients)
+        msg['Date'] = formatdate(localtime=True)
+        msg['Subject'] = content.get('subject', '')
+
+        # Process CC addresses
+        cc = content.get('cc')
+        if isinstance(cc, str):
+            cc = [email.strip() for email in cc.split(",")]
+        elif not cc:
+            cc = []
+
+        # Process BCC addresses
+        bcc = content.get('bcc')
+        if isinstance(bcc, str):
+            bcc = [email.strip() for email in bcc.split(",")]
+        elif not bcc:
+            bcc = []
+
+        if cc:
+            msg['Cc'] = ",".join(cc)
+
+        # Determine if message is HTML or plain text
+        message = content.get('message', '')
+        if re.search(r'<[^>]+>', message):  # Simple check for HTML content
+            msg.attach(MIMEText(message, 'html'))
+        else:
+            msg.attach(MIMEText(message, 'plain'))
+
+        # add cc and bcc to list of recipients
+        toaddrs = recipients + cc + bcc
+
+        # Handle file attachments, reusing cached encodings of previously sent content
+        for part in build_attachment_parts(content.get('attachments')):
+            msg.attach(part)
+
+        return msg, from_address, toaddrs
+
+    def _record_refused(self, refused: Dict[str, int]) -> None:
+        """
+        Records recipients the SMTP server refused; a 5xx reply is a hard bounce, so they are flagged for
+        suppression.
+
+        :param refused: Reply code per refused address.
+        """
+        for address, code in refused.items():
+            self.recipient_statuses[address] = {"status": "failed", "error": f"SMTP {code}"}
+            if 500 <= code < 600:
+                self.recipient_statuses[address]["suppress"] = Suppression.REASON_HARD_BOUNCE
+
     def send(self, recipients: List[str], content: Dict[str, Union[str, List[str], List[str]]]) -> State:
         """
         Composes and sends an email using SMTP.
@@ -34,67 +108,58 @@ class GmailSMTPServer(BaseProvider):
         :return: Sent state if email is sent successfully else Failed state.
         """
         try:
-            msg = MIMEMultipart()
-
-            # Set sender details
-            from_address = content.get('from_address', '')
-            msg['From'] = from_address
-            msg['Reply-To'] = content.get('reply_to', '')
-
-            # Format recipient field
-            msg['To'] = ",".join(recipients)
-            msg['Date'] = formatdate(localtime=True)
-            msg['Subject'] = content.get('subject', '')
-
-            # Process CC addresses
-            cc = content.get('cc')
-            if isinstance(cc, str):
-                cc = [email.strip() for email in cc.split(",")]
-            elif not cc:
-                cc = []
-
-            # Process BCC addresses
-            bcc = content.get('bcc')
-            if isinstance(bcc, str):
-                bcc = [email.strip() for email in bcc.split(",")]
-            elif not bcc:
-                bcc = []
-
-            if cc:
-                msg['Cc'] = ",".join(cc)
-
-            # Determine if message is HTML or plain text
-            message = content.get('message', '')
-            if re.search(r'<[^>]+>', message):  # Simple check for HTML content
-                msg.attach(MIMEText(message, 'html'))
-            else:
-                msg.attach(MIMEText(message, 'plain'))
-
-            # add cc and bcc to list of recipients
-            toaddrs = recipients + cc + bcc
-
-            # Handle file attachments
-            attachments = content.get('attachment', [])
-            for f in attachments:
-                with open(f, "rb") as fil:
-                    part = MIMEApplication(fil.read(), Name=basename(f))
-                part['Content-Disposition'] = f'attachment; filename="{basename(f)}"'
-                msg.attach(part)
+            msg, from_address, toaddrs = self._build_message(recipients, content)
 
             # Send the composed email
             server = smtplib.SMTP(f"{self.config['host']}:{self.config['port']}")
             server.ehlo()
-            server.starttls()
-            server.ehlo()
+            if self.config.get('starttls', True):
+                server.starttls()
+                server.ehlo()
             server.set_debuglevel(0)  # Turn off debug output
             server.login(self.config['sender'], self.config['password'])
-            server.sendmail(from_addr=from_address, to_addrs=toaddrs, msg=msg.as_string())
+            refused = server.sendmail(from_addr=from_address, to_addrs=toaddrs, msg=msg.as_string())
             server.close()
+            self._record_refused({address: code for address, (code, _) in refused.items()})
 
             return State.sent()
 
+        except smtplib.SMTPRecipientsRefused as ex:
+            logger.warning("GmailSMTPServer - all recipients refused: %s", ex.recipients)
+            self._record_refused({address: code for address, (code, _) in ex.recipients.items()})
+            return State.failed()
+
         except Exception as ex:
             logger.exception("GmailSMTPServer - send exception: %s", ex)
             return State.failed()
 
+    async def send_async(self, recipients: List[str], content: Dict[str, Union[str, List[str], List[str]]]) -> State:
+        """
+        Composes and sends an email using a non-blocking SMTP client.
+
+        :param recipients: List of email addresses.
+        :param content: Dictionary containing subject, message, cc, bcc, attachments, etc.
+        :return: Sent state if email is sent successfully else Failed state.
+        """
+        try:
+            # Attachments may need to be read from disk, so the message is built off the event loop
+            msg, from_address, toaddrs = await asyncio.to_thread(self._build_message, recipients, content)
+
+            server = aiosmtplib.SMTP(
+                hostname=self.config['host'], port=int(self.config['port']),
+                start_tls=self.config.get('starttls', True), validate_certs=self.config.get('validate_certs', True))
+            async with server:
+                await server.login(self.config['sender'], self.config['password'])
+                refused, _ = await server.sendmail(from_address, toaddrs, msg.as_string())
+            self._record_refused({address: response.code for address, response in refused.items()})
 
+            return await sync_to_async(State.sent)()
+
+        except aiosmtplib.SMTPRecipientsRefused as ex:
+            logger.warning("GmailSMTPServer - all recipients refused: %s", ex)
+            self._record_refused({error.recipient: error.code for error in ex.recipients})
+            return await sync_to_async(State.failed)()
+
+        except Exception as ex:
+            logger.exception("GmailSMTPServer - send_async exception: %s", ex)
+            return await sync_to_async(State.failed)()
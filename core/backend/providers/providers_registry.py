@@ -1,11 +1,42 @@
-from core.backend.providers.africas_talking_sms_provider import AfricasTalkingSMSProvider
-from core.backend.providers.firebase_push_provider import FirebasePushProvider
-from core.backend.providers.gmail_smtp_server import GmailSMTPServer
-from core.backend.providers.belio_sms_provider import BelioSMSProvider
+from functools import lru_cache
+from typing import Type, TYPE_CHECKING
 
+from django.utils.module_loading import import_string
+
+if TYPE_CHECKING:
+    from core.backend.providers.base_provider import BaseProvider
+
+# Provider classes by name, resolved on first use so that processes which never send (the web tier,
+# most management commands) do not import the provider SDKs
 PROVIDER_CLASSES = {
-    "GmailSMTPServer": GmailSMTPServer,
-    "FirebasePushProvider": FirebasePushProvider,
-    "AfricasTalkingSMSProvider": AfricasTalkingSMSProvider,
-    "BelioSMSProvider": BelioSMSProvider
-}
\ No newline at end of file
+    "GmailSMTPServer": "core.backend.providers.gmail_smtp_server.GmailSMTPServer",
+    "FirebasePushProvider": "core.backend.providers.firebase_push_provider.FirebasePushProvider",
+    "AfricasTalkingSMSProvider": "core.backend.providers.africas_talking_sms_provider.AfricasTalkingSMSProvider",
+    "BelioSMSProvider": "core.backend.providers.belio_sms_provider.BelioSMSProvider",
+    "FakeProvider": "core.backend.providers.fake_provider.FakeProvider",
+}
+
+
+@lru_cache(maxsize=None)
+def get_provider_class(class_name: str) -> Type["BaseProvider"]:
+    """
+    Resolves a provider's class_name to its class, importing the provider module on first use.
+
+    :param class_name: A name registered in PROVIDER_CLASSES, or a dotted path to a BaseProvider subclass.
+    :raises ValueError: If the class cannot be imported or is not a BaseProvider subclass.
+    :return: The provider class.
+    """
+    from core.backend.providers.base_provider import BaseProvider
+
+    dotted_path = PROVIDER_CLASSES.get(class_name)
+    if dotted_path is None and "." in class_name:
+        dotted_path = class_name
+    if dotted_path is None:
+        raise ValueError(f"Unknown provider class: {class_name}")
+    try:
+        provider_class = import_string(dotted_path)
+    except ImportError as ex:
+        raise ValueError(f"Cannot import provider class {class_name}: {ex}")
+    if not isinstance(provider_class, type) or not issubclass(provider_class, BaseProvider):
+        raise ValueError(f"Provider class {class_name} is not a BaseProvider subclass")
+    return provider_class
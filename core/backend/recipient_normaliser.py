@@ -0,0 +1,118 @@
+import re
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Union
+
+from django.conf import settings
+
+# Reasons reported for recipients that are dropped
+INVALID_PHONE_NUMBER = "invalid_phone_number"
+INVALID_EMAIL_ADDRESS = "invalid_email_address"
+
+# Separators people type inside phone numbers, removed in one pass with str.translate
+_PHONE_SEPARATORS = str.maketrans("", "", " \t\r\n-.()/")
+# An international ('+' or 00) or local (0) prefix, then digits not starting with 0: E.164 allows at most 15
+_PHONE_NUMBER = re.compile(r"(?:tel:)?(\+|00|0)?([1-9]\d{6,14})")
+_EMAIL_ADDRESS = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+
+
+class NormalisedRecipients(NamedTuple):
+    """
+    Outcome of normalising a recipient list.
+
+    :param valid: Normalised recipients without duplicates, in the order they were given.
+    :param rejected: Mapping of each dropped recipient, as given, to the reason it was dropped.
+    """
+    valid: List[str]
+    rejected: Dict[str, str]
+
+
+def _split(recipients: Union[Iterable, str]) -> Iterable:
+    return recipients.split(",") if isinstance(recipients, str) else recipients
+
+
+def normalise_phone_numbers(
+        recipients: Union[Iterable, str], default_country_code: Optional[str] = None) -> NormalisedRecipients:
+    """
+    Normalises phone numbers to E.164 digits without the leading '+', e.g. "+254 712-345 678",
+    "00254712345678" and the local "0712345678" all become "254712345678".
+
+    Numbers starting with a single 0 are local and take the default country code; numbers without a
+    '+', 00 or 0 are taken to include their country code.
+
+    :param recipients: Phone numbers as a list or a comma-separated string.
+    :param default_country_code: Country code of local numbers; settings.SMS_DEFAULT_COUNTRY_CODE by default.
+    :return: The valid numbers and the rejected ones.
+    """
+    country_code = default_country_code or settings.SMS_DEFAULT_COUNTRY_CODE
+    fullmatch = _PHONE_NUMBER.fullmatch
+    valid: Dict[str, None] = {}
+    rejected: Dict[str, str] = {}
+    for recipient in _split(recipients):
+        if recipient.__class__ is not str:
+            recipient = str(recipient)
+        # Separators are only removed from numbers that do not match as given, which most do
+        match = fullmatch(recipient)
+        if match is None:
+            cleaned = recipient.translate(_PHONE_SEPARATORS)
+            if not cleaned:
+                continue
+            match = fullmatch(cleaned)
+        if match is not None:
+            prefix, number = match.groups()
+            if prefix == "0":
+                number = country_code + number
+            if len(number) <= 15:
+                valid[number] = None
+                continue
+        rejected[recipient.strip()] = INVALID_PHONE_NUMBER
+    return NormalisedRecipients(list(valid), rejected)
+
+
+def normalise_email_addresses(recipients: Union[Iterable, str]) -> NormalisedRecipients:
+    """
+    Normalises email addresses by trimming them and lowercasing their domain; the local part is kept as given.
+
+    :param recipients: Email addresses as a list or a comma-separated string.
+    :return: The valid addresses and the rejected ones.
+    """
+    fullmatch = _EMAIL_ADDRESS.fullmatch
+    valid: Dict[str, None] = {}
+    rejected: Dict[str, str] = {}
+    for recipient in _split(recipients):
+        address = (recipient if recipient.__class__ is str else str(recipient)).strip()
+        if not address:
+            continue
+        if fullmatch(address):
+            local, _, domain = address.rpartition("@")
+            valid[f"{local}@{domain.lower()}"] = None
+        else:
+            rejected[address] = INVALID_EMAIL_ADDRESS
+    return NormalisedRecipients(list(valid), rejected)
+
+
+def normalise_tokens(recipients: Union[Iterable, str]) -> NormalisedRecipients:
+    """
+    Trims opaque recipients such as device tokens and drops empty ones and duplicates.
+
+    :param recipients: Recipients as a list or a comma-separated string.
+    :return: The recipients; none are rejected.
+    """
+    valid = dict.fromkeys(recipient for recipient in (str(item).strip() for item in _split(recipients)) if recipient)
+    return NormalisedRecipients(list(valid), {})
+
+
+NORMALISERS: Dict[str, Callable[..., NormalisedRecipients]] = {
+    "sms": normalise_phone_numbers,
+    "email": normalise_email_addresses,
+}
+
+
+def normalise_recipients(notification_type: str, recipients: Union[Iterable, str]) -> NormalisedRecipients:
+    """
+    Normalises a batch of recipients for a notification type, dropping the invalid ones instead of failing
+    the whole batch.
+
+    :param notification_type: The type of notification (e.g. 'sms', 'email').
+    :param recipients: Recipients as a list or a comma-separated string.
+    :return: The valid recipients and the rejected ones.
+    """
+    return NORMALISERS.get(notification_type, normalise_tokens)(recipients)
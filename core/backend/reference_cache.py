@@ -0,0 +1,152 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+from core.backend.metrics import CACHE_REQUESTS
+from core.backend.sms_router import SMSRouter
+from core.models import NotificationType, Organisation, Provider, SMSRoute, System, Template
+
+
+class ReferenceCache:
+    """
+    Process-local cache of the reference data read for every notification: systems, organisations,
+    notification types, templates, active providers and the SMS routing table.
+
+    Each kind is loaded with a single query the first time it is needed and reloaded once it is older
+    than settings.REFERENCE_CACHE_TTL seconds, so edits made by other processes (e.g. in the admin) are
+    picked up within the TTL. Edits saved through this process clear the cache straight away.
+    A TTL of 0 disables the cache and every lookup goes to the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, Dict]] = {}
+        self._loaders: Dict[str, Callable[[], Dict]] = {
+            "system": lambda: self._by_name(System.objects.all()),
+            "organisation": lambda: self._by_name(Organisation.objects.select_related("system")),
+            "notification_type": lambda: self._by_name(NotificationType.objects.all()),
+            "template": lambda: self._by_name(Template.objects.select_related("notification_type")),
+            "active_providers": self._active_providers,
+            "sms_routes": self._sms_router,
+        }
+
+    @staticmethod
+    def _by_name(queryset) -> Dict[str, object]:
+        return {row.name: row for row in queryset}
+
+    @staticmethod
+    def _active_providers() -> Dict[object, List[Provider]]:
+        providers: Dict[object, List[Provider]] = {}
+        for provider in Provider.objects.filter(is_active=True).select_related("notification_type").order_by(
+                "priority"):
+            providers.setdefault(provider.notification_type_id, []).append(provider)
+        return providers
+
+    @staticmethod
+    def _sms_router() -> SMSRouter:
+        return SMSRouter(SMSRoute.objects.filter(
+            is_active=True, provider__is_active=True, provider__notification_type__name="sms").select_related(
+            "provider").order_by("priority"))
+
+    @staticmethod
+    def ttl() -> float:
+        return getattr(settings, "REFERENCE_CACHE_TTL", 60)
+
+    def _get(self, kind: str) -> Dict:
+        entry = self._entries.get(kind)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl():
+            CACHE_REQUESTS.inc(cache="reference", result="hit")
+            return entry[1]
+        CACHE_REQUESTS.inc(cache="reference", result="miss")
+        with self._lock:
+            entry = self._entries.get(kind)
+            if entry is None or time.monotonic() - entry[0] >= self.ttl():
+                entry = (time.monotonic(), self._loaders[kind]())
+                self._entries[kind] = entry
+        return entry[1]
+
+    def load(self, kinds: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Loads (or reloads) the given kinds of reference data, all of them by default.
+
+        :param kinds: Kinds to load, from "system", "organisation", "notification_type", "template",
+            "active_providers" and "sms_routes".
+        :return: Number of entries loaded per kind.
+        """
+        loaded = {}
+        for kind in kinds or self._loaders:
+            data = self._loaders[kind]()
+            with self._lock:
+                self._entries[kind] = (time.monotonic(), data)
+            loaded[kind] = len(data)
+        return loaded
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, kind: str, name: Optional[str], model) -> Optional[object]:
+        if not name:
+            return None
+        if self.ttl() <= 0:
+            return model.objects.filter(name=name).first()
+        return self._get(kind).get(name)
+
+    def system(self, name: Optional[str]) -> Optional[System]:
+        return self._lookup("system", name, System)
+
+    def organisation(self, name: Optional[str]) -> Optional[Organisation]:
+        return self._lookup("organisation", name, Organisation)
+
+    def notification_type(self, name: Optional[str]) -> Optional[NotificationType]:
+        return self._lookup("notification_type", name, NotificationType)
+
+    def template(self, name: Optional[str]) -> Optional[Template]:
+        return self._lookup("template", name, Template)
+
+    def templates(self) -> List[Template]:
+        """
+        Returns all cached templates, e.g. to pre-compile them.
+        """
+        return list(self._get("template").values())
+
+    def active_providers(self, notification_type: NotificationType) -> List[Provider]:
+        """
+        Returns the active providers for a notification type in priority order.
+
+        :param notification_type: The notification type.
+        :return: List of Provider objects.
+        """
+        if self.ttl() <= 0:
+            return list(Provider.objects.filter(
+                notification_type=notification_type, is_active=True).order_by("priority"))
+        return list(self._get("active_providers").get(notification_type.id, []))
+
+    def all_active_providers(self) -> List[Provider]:
+        """
+        Returns every active provider, e.g. to warm their clients up.
+        """
+        return [provider for providers in self._get("active_providers").values() for provider in providers]
+
+    def sms_router(self) -> SMSRouter:
+        """
+        Returns the SMS routing table, compiled into a prefix trie.
+        """
+        if self.ttl() <= 0:
+            return self._sms_router()
+        return self._get("sms_routes")
+
+
+reference_cache = ReferenceCache()
+
+
+def _clear_reference_cache(sender, **kwargs):
+    reference_cache.clear()
+
+
+for _model in (System, Organisation, NotificationType, Template, Provider, SMSRoute):
+    post_save.connect(_clear_reference_cache, sender=_model, dispatch_uid=f"reference_cache_{_model.__name__}")
+    post_delete.connect(_clear_reference_cache, sender=_model, dispatch_uid=f"reference_cache_del_{_model.__name__}")
@@ -0,0 +1,103 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import Notification, State
+from notify.celery import app
+
+logger = logging.getLogger(__name__)
+
+
+def _claim_due_batch(horizon: datetime, redispatch_before: datetime, now: datetime,
+                     batch_size: int) -> List[Tuple[UUID, datetime, Optional[str]]]:
+    """
+    Claims the next batch of scheduled notifications due before `horizon` by stamping their dispatched_at.
+
+    Rows are read through the partial due-time index in send_at order and locked with
+    SKIP LOCKED, so concurrent dispatchers each claim a different batch instead of waiting on each other.
+
+    :return: (id, send_at, coalesce_key) of the claimed notifications.
+    """
+    with transaction.atomic():
+        due = list(
+            Notification.objects.select_for_update(skip_locked=True).filter(
+                send_at__isnull=False, processing_started_at__isnull=True, send_at__lt=horizon,
+                status=State.pending(), paced=False).filter(
+                Q(dispatched_at__isnull=True) | Q(dispatched_at__lt=redispatch_before)).order_by(
+                "send_at").values_list("id", "send_at", "coalesce_key")[:batch_size])
+        if due:
+            Notification.objects.filter(pk__in=[notification_id for notification_id, _, _ in due]).update(
+                dispatched_at=now, date_modified=now)
+    return due
+
+
+def _publish(due: List[Tuple[UUID, datetime, Optional[str]]], spread_seconds: float) -> None:
+    from core.tasks import deliver_notification
+
+    # One notification per coalescing window is enough: the first claimed sends the digest of them all. The
+    # others stay dispatched, so they are dispatched again on their own if that message is lost
+    windows = set()
+    publish = []
+    for notification_id, send_at, coalesce_key in due:
+        if coalesce_key is not None:
+            if (coalesce_key, send_at) in windows:
+                continue
+            windows.add((coalesce_key, send_at))
+        publish.append((notification_id, send_at))
+
+    # Notifications due at the same instant (e.g. on the minute) are spaced out over the spread window
+    step = spread_seconds / len(publish)
+    with app.producer_or_acquire() as producer:
+        for index, (notification_id, send_at) in enumerate(publish):
+            eta = send_at + timedelta(seconds=index * step)
+            deliver_notification.apply_async((str(notification_id),), eta=eta, producer=producer)
+
+
+def dispatch_due_notifications(now: Optional[datetime] = None) -> Dict:
+    """
+    Hands scheduled notifications due within the next SCHEDULED_DISPATCH_INTERVAL seconds to delivery.
+
+    Runs on every beat tick. Due notifications are claimed in batches of SCHEDULED_DISPATCH_BATCH_SIZE
+    (at most SCHEDULED_DISPATCH_MAX_PER_RUN per run) and published as delivery tasks whose ETA is
+    their send_at plus their slot's offset in the SCHEDULED_SPREAD_SECONDS window. A notification
+    that was dispatched but not picked up within SCHEDULED_REDISPATCH_AFTER seconds (e.g. its message
+    was lost) is dispatched again; the delivery claim ensures it is only sent once. Coalesced
+    notifications are due at the end of their window, and only one per window is published. Paced
+    notifications are left to the send pacer, which releases them once they are due.
+
+    :param now: Time of the run; the current time by default.
+    :return: Counts and timings of the run.
+    """
+    started = time.perf_counter()
+    now = now or timezone.now()
+    horizon = now + timedelta(seconds=settings.SCHEDULED_DISPATCH_INTERVAL)
+    redispatch_before = now - timedelta(seconds=settings.SCHEDULED_REDISPATCH_AFTER)
+    batch_size = settings.SCHEDULED_DISPATCH_BATCH_SIZE
+    max_per_run = settings.SCHEDULED_DISPATCH_MAX_PER_RUN
+
+    due: List[Tuple[UUID, datetime, Optional[str]]] = []
+    while len(due) < max_per_run:
+        batch = _claim_due_batch(horizon, redispatch_before, now, min(batch_size, max_per_run - len(due)))
+        due.extend(batch)
+        if len(batch) < batch_size:
+            break
+
+    if due:
+        _publish(due, settings.SCHEDULED_SPREAD_SECONDS)
+
+    report = {
+        "dispatched": len(due),
+        "overdue": sum(1 for _, send_at, _ in due if send_at < now),
+        "capped": len(due) >= max_per_run,
+        "ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    if due:
+        logger.info("ScheduledDispatcher - dispatched %s", report)
+    return report
@@ -0,0 +1,209 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import chain, zip_longest
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, QuerySet, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.models import Campaign, Notification, Organisation, State, System
+from notify.celery import app
+
+logger = logging.getLogger(__name__)
+
+
+class Budget:
+    """
+    Send-rate budget of one system, organisation or campaign, kept as the time of its next free slot.
+
+    Each released notification takes the next slot of every budget it falls under, so the slowest
+    budget sets the pace; slots are 1 / rate seconds apart.
+
+    :param rate: Notifications per second; None for no limit.
+    :param paced_until: Next free slot saved by the previous run.
+    :param now: Epoch seconds of this run.
+    """
+
+    def __init__(self, rate: Optional[float], paced_until: Optional[datetime], now: float):
+        self.rate = rate
+        self.next_slot = max(paced_until.timestamp(), now) if paced_until else now
+        self.used = False
+
+    def take(self, slot: float) -> None:
+        self.next_slot = slot + 1 / self.rate
+        self.used = True
+
+    @property
+    def paced_until(self) -> datetime:
+        return datetime.fromtimestamp(self.next_slot, tz=dt_timezone.utc)
+
+
+def effective_rate(*rates: Optional[float]) -> Optional[float]:
+    """
+    Returns the lowest of the given send rates, or None when none of them is limited.
+    """
+    limited = [rate for rate in rates if rate]
+    return min(limited) if limited else None
+
+
+def backlog_queryset(now: Optional[datetime] = None) -> QuerySet:
+    """
+    Paced notifications that are due and not yet picked up by a worker.
+    """
+    return Notification.objects.filter(
+        paced=True, processing_started_at__isnull=True, status=State.pending()).filter(
+        Q(send_at__isnull=True) | Q(send_at__lte=now or timezone.now()))
+
+
+def backlog_subquery(field: str) -> Coalesce:
+    """
+    Builds an annotation counting the paced backlog of each row of an outer System, Organisation or
+    Campaign queryset, e.g. for the admin changelists.
+
+    :param field: Notification field that refers to the outer row: "system", "organisation" or "campaign".
+    """
+    backlog = backlog_queryset().filter(**{field: OuterRef("pk")}).order_by().values(field).annotate(
+        count=Count("id")).values("count")
+    return Coalesce(Subquery(backlog, output_field=IntegerField()), Value(0))
+
+
+def _releasable(horizon: datetime, redispatch_before: datetime) -> QuerySet:
+    return Notification.objects.filter(
+        paced=True, processing_started_at__isnull=True, status=State.pending()).filter(
+        Q(send_at__isnull=True) | Q(send_at__lt=horizon)).filter(
+        Q(dispatched_at__isnull=True) | Q(dispatched_at__lt=redispatch_before))
+
+
+def _group_capacity(budgets: List[Budget], horizon: float, max_release: int) -> int:
+    limited = [budget for budget in budgets if budget.rate]
+    if not limited:
+        return max_release
+    start = max(budget.next_slot for budget in limited)
+    rate = min(budget.rate for budget in limited)
+    return max(0, min(max_release, int((horizon - start) * rate) + 1))
+
+
+def _release_system(
+        system_id: UUID, groups: List[Tuple[Optional[UUID], Optional[UUID]]], now: datetime, horizon: datetime,
+        redispatch_before: datetime) -> List[Tuple[UUID, datetime]]:
+    """
+    Releases as much of one system's backlog as its budgets allow before `horizon`.
+
+    The system row is locked for the run, so concurrent pacers never spend the same budget twice; a
+    system another pacer is working on is skipped. Backlogs of the system's organisation/campaign groups
+    are interleaved so one large group cannot starve the others.
+
+    :return: (id, release time) of the released notifications.
+    """
+    now_ts, horizon_ts = now.timestamp(), horizon.timestamp()
+    max_release = settings.SEND_PACING_MAX_RELEASE
+
+    with transaction.atomic():
+        system = System.objects.select_for_update(skip_locked=True).filter(pk=system_id).values(
+            "max_send_rate", "paced_until").first()
+        if system is None:
+            return []
+        system_budget = Budget(system["max_send_rate"], system["paced_until"], now_ts)
+        organisation_budgets = {
+            pk: Budget(rate, paced_until, now_ts) for pk, rate, paced_until in Organisation.objects.filter(
+                pk__in={organisation_id for organisation_id, _ in groups if organisation_id}).values_list(
+                "id", "max_send_rate", "paced_until")}
+        campaign_budgets, paused = {}, set()
+        for pk, rate, paced_until, status in Campaign.objects.filter(
+                pk__in={campaign_id for _, campaign_id in groups if campaign_id}).values_list(
+                "id", "send_rate", "paced_until", "status"):
+            campaign_budgets[pk] = Budget(rate or settings.CAMPAIGN_DEFAULT_SEND_RATE, paced_until, now_ts)
+            if status == Campaign.STATUS_PAUSED:
+                paused.add(pk)
+
+        backlogs = []
+        for organisation_id, campaign_id in groups:
+            if campaign_id in paused:
+                continue
+            budgets = [system_budget, organisation_budgets.get(organisation_id), campaign_budgets.get(campaign_id)]
+            budgets = [budget for budget in budgets if budget is not None and budget.rate]
+            capacity = _group_capacity(budgets, horizon_ts, max_release)
+            if not capacity:
+                continue
+            rows = _releasable(horizon, redispatch_before).select_for_update(skip_locked=True).filter(
+                system_id=system_id, organisation_id=organisation_id, campaign_id=campaign_id).order_by(
+                "date_created").values_list("id", "send_at")[:capacity]
+            backlogs.append([(notification_id, send_at, budgets) for notification_id, send_at in rows])
+
+        released = []
+        for notification_id, send_at, budgets in chain.from_iterable(
+                zip_longest(*backlogs, fillvalue=(None, None, None))):
+            if notification_id is None:
+                continue
+            slot = max([now_ts, send_at.timestamp() if send_at else now_ts] + [b.next_slot for b in budgets])
+            if slot >= horizon_ts:
+                continue
+            for budget in budgets:
+                budget.take(slot)
+            released.append((notification_id, datetime.fromtimestamp(slot, tz=dt_timezone.utc)))
+
+        if released:
+            Notification.objects.filter(pk__in=[notification_id for notification_id, _ in released]).update(
+                dispatched_at=now, date_modified=now)
+        # Saved with update() rather than save(), which would clear every process's reference cache
+        if system_budget.used:
+            System.objects.filter(pk=system_id).update(paced_until=system_budget.paced_until)
+        for model, budgets_by_pk in ((Organisation, organisation_budgets), (Campaign, campaign_budgets)):
+            for pk, budget in budgets_by_pk.items():
+                if budget.used:
+                    model.objects.filter(pk=pk).update(paced_until=budget.paced_until)
+    return released
+
+
+def _publish(released: List[Tuple[UUID, datetime]]) -> None:
+    from core.tasks import deliver_notification
+
+    with app.producer_or_acquire() as producer:
+        for notification_id, eta in released:
+            deliver_notification.apply_async((str(notification_id),), eta=eta, producer=producer)
+
+
+def release_paced_notifications(now: Optional[datetime] = None) -> Dict:
+    """
+    Releases the paced backlog to delivery at each system's, organisation's and campaign's send rate.
+
+    Runs on every beat tick (SEND_PACING_TICK_SECONDS) and releases the notifications whose slots fall
+    within the next two ticks, as delivery tasks whose ETA is their slot. Work waits in the database
+    rather than in the broker, so a large batch from one system neither exceeds its rate nor holds
+    up other systems' notifications. Released notifications no worker picked up within
+    SCHEDULED_REDISPATCH_AFTER seconds are released again; the delivery claim sends them only once.
+
+    :param now: Time of the run; the current time by default.
+    :return: Counts and timings of the run.
+    """
+    started = time.perf_counter()
+    now = now or timezone.now()
+    horizon = now + timedelta(seconds=2 * settings.SEND_PACING_TICK_SECONDS)
+    redispatch_before = now - timedelta(seconds=settings.SCHEDULED_REDISPATCH_AFTER)
+
+    groups: Dict[UUID, List[Tuple[Optional[UUID], Optional[UUID]]]] = {}
+    for system_id, organisation_id, campaign_id in _releasable(horizon, redispatch_before).order_by().values_list(
+            "system_id", "organisation_id", "campaign_id").distinct():
+        groups.setdefault(system_id, []).append((organisation_id, campaign_id))
+
+    released = 0
+    for system_id, system_groups in groups.items():
+        try:
+            notifications = _release_system(system_id, system_groups, now, horizon, redispatch_before)
+        except Exception as ex:
+            logger.exception("SendPacer - release_paced_notifications exception: %s", ex)
+            continue
+        if notifications:
+            _publish(notifications)
+            released += len(notifications)
+
+    report = {
+        "systems": len(groups), "released": released, "ms": round((time.perf_counter() - started) * 1000, 1)}
+    if released:
+        logger.info("SendPacer - released %s", report)
+    return report
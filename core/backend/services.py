@@ -1,5 +1,18 @@
+import logging
+from typing import Dict, Iterable, List, Set, Optional
+
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.lookups import GreaterThan, LessThan
+from django.utils import timezone
+
 from utils.service_base import ServiceBase
-from core.models import State, NotificationType, System, Template, Provider, Notification, Organisation
+from core.models import State, NotificationType, System, Template, Provider, Notification, Organisation, DeviceToken, \
+    Campaign, Suppression, NotificationRecipient
+
+logger = logging.getLogger(__name__)
 
 
 class StateService(ServiceBase):
@@ -21,4 +34,221 @@ class ProviderService(ServiceBase):
     manager = Provider.objects
 
 class NotificationService(ServiceBase):
-    manager = Notification.objects
\ No newline at end of file
+    manager = Notification.objects
+
+    def get_for_processing(self, pk) -> Optional[Notification]:
+        """
+        Loads a notification together with everything the send and callback paths read from it, in one query.
+
+        :param pk: Notification primary key.
+        :return: The notification, or None if it does not exist.
+        """
+        try:
+            return self.manager.select_related(
+                'system', 'organisation', 'notification_type', 'template', 'status', 'provider').get(pk=pk)
+        except Exception as e:
+            logger.exception('Notification Service get_for_processing exception: %s' % e)
+            return None
+
+    def update_fields(self, pk, **kwargs) -> int:
+        """
+        Writes the given fields with a single UPDATE, without loading the row first.
+
+        :param pk: Notification primary key.
+        :param kwargs: Field values or expressions (e.g. F('attempt_count') + 1).
+        :return: Number of rows updated.
+        """
+        try:
+            return self.manager.filter(pk=pk).update(date_modified=timezone.now(), **kwargs)
+        except Exception as e:
+            logger.exception('Notification Service update_fields exception: %s' % e)
+            return 0
+
+    def claim_for_delivery(self, pk) -> bool:
+        """
+        Marks a stored pending notification as being processed, unless another worker already has.
+
+        Task messages can be delivered more than once; only the worker whose UPDATE matches sends.
+
+        :param pk: Notification primary key.
+        :return: True if this caller claimed the notification.
+        """
+        try:
+            now = timezone.now()
+            return self.manager.filter(
+                pk=pk, status=State.pending(), processing_started_at__isnull=True).update(
+                processing_started_at=now, date_modified=now) == 1
+        except Exception as e:
+            logger.exception('Notification Service claim_for_delivery exception: %s' % e)
+            return False
+
+    def claim_coalesced(self, notification: Notification) -> List[Dict]:
+        """
+        Claims the notifications waiting in the same coalescing window as a claimed notification, to be sent
+        in its digest, and marks them as coalesced into it.
+
+        :param notification: The claimed notification, which sends the digest.
+        :return: id, unique_identifier, context and date_created of each notification claimed, oldest first.
+        """
+        try:
+            now = timezone.now()
+            with transaction.atomic():
+                if not self.manager.filter(
+                        coalesce_key=notification.coalesce_key, send_at=notification.send_at,
+                        status=State.pending(), processing_started_at__isnull=True).update(
+                        processing_started_at=now, coalesced_into=notification, status=State.coalesced(),
+                        date_modified=now):
+                    return []
+                return list(self.manager.filter(coalesced_into=notification).order_by('date_created').values(
+                    'id', 'unique_identifier', 'context', 'date_created'))
+        except Exception as e:
+            logger.exception('Notification Service claim_coalesced exception: %s' % e)
+            return []
+
+    def add_delivery_counts(self, pk, sent: int, failed: int, reported_at: datetime) -> int:
+        """
+        Adds delivery report outcomes to a notification's counters and settles its status, in a single UPDATE.
+
+        The status is left as it is while recipients are still awaiting confirmation. Once every recipient
+        is settled it becomes Sent if any recipient was delivered to, and Failed otherwise.
+
+        :param pk: Notification primary key.
+        :param sent: Recipients newly confirmed delivered.
+        :param failed: Recipients newly reported failed.
+        :param reported_at: When the report says the outcome happened.
+        :return: Number of rows updated.
+        """
+        sent_count = F('sent_count') + sent
+        fields = {
+            'sent_count': sent_count,
+            'failed_count': F('failed_count') + failed,
+            'status': Case(
+                When(LessThan(sent_count + F('failed_count') + failed, F('recipient_count')), then=F('status')),
+                When(GreaterThan(sent_count, 0), then=Value(State.sent().pk)),
+                default=Value(State.failed().pk)),
+        }
+        if sent:
+            fields.update(sent_time=reported_at, delivered_at=reported_at)
+        return self.update_fields(pk, **fields)
+
+class NotificationRecipientService(ServiceBase):
+    manager = NotificationRecipient.objects
+
+    def record_send(self, deliveries: List[NotificationRecipient]) -> None:
+        """
+        Writes the outcome of a send for each recipient in one bulk upsert, so a notification sent again
+        overwrites its earlier rows.
+
+        :param deliveries: Unsaved rows, one per recipient.
+        """
+        self.manager.bulk_create(
+            deliveries,
+            batch_size=5000,
+            update_conflicts=True,
+            unique_fields=['notification', 'recipient'],
+            update_fields=['provider_message_id', 'status', 'error', 'delivered_at', 'date_modified'],
+        )
+
+    def record_delivery(
+            self, notification_id, recipients: Optional[List[str]], delivered: bool, error: str,
+            reported_at: datetime) -> int:
+        """
+        Applies a delivery report to the recipients still awaiting confirmation, in a single UPDATE.
+
+        :param notification_id: Notification the report is for.
+        :param recipients: Recipients the report is for; every unconfirmed recipient if None.
+        :param delivered: Whether the report confirms delivery.
+        :param error: The provider's status, recorded for failed deliveries.
+        :param reported_at: When the report says the outcome happened.
+        :return: Number of recipients whose status changed.
+        """
+        deliveries = self.manager.filter(
+            notification_id=notification_id, status=NotificationRecipient.STATUS_CONFIRMATION_PENDING)
+        if recipients is not None:
+            deliveries = deliveries.filter(recipient__in=recipients)
+        if delivered:
+            return deliveries.update(
+                status=NotificationRecipient.STATUS_SENT, delivered_at=reported_at, date_modified=timezone.now())
+        return deliveries.update(
+            status=NotificationRecipient.STATUS_FAILED, error=error[:100], date_modified=timezone.now())
+
+class CampaignService(ServiceBase):
+    manager = Campaign.objects
+
+class DeviceTokenService(ServiceBase):
+    manager = DeviceToken.objects
+
+    def invalid_tokens(self, tokens: Iterable[str]) -> Set[str]:
+        """
+        Returns the subset of the given tokens that are known to be dead.
+
+        :param tokens: Device tokens to check.
+        :return: Set of tokens that have been marked invalid.
+        """
+        hashes = {DeviceToken.hash_token(token): token for token in tokens}
+        if not hashes:
+            return set()
+        invalid_hashes = self.manager.filter(
+            token_hash__in=list(hashes), is_valid=False).values_list('token_hash', flat=True)
+        return {hashes[token_hash] for token_hash in invalid_hashes}
+
+    def mark_invalid(self, token_reasons: Dict[str, str]) -> None:
+        """
+        Records the given tokens as invalid in a single bulk upsert.
+
+        :param token_reasons: Mapping of device token to the FCM error code that invalidated it.
+        """
+        now = timezone.now()
+        self.manager.bulk_create(
+            [
+                DeviceToken(
+                    token=token,
+                    token_hash=DeviceToken.hash_token(token),
+                    is_valid=False,
+                    invalid_reason=reason,
+                    invalidated_at=now,
+                )
+                for token, reason in token_reasons.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['token_hash'],
+            update_fields=['is_valid', 'invalid_reason', 'invalidated_at', 'date_modified'],
+        )
+
+class SuppressionService(ServiceBase):
+    manager = Suppression.objects
+
+    def suppressed(self, system: Optional[System], recipients: Iterable[str]) -> Set[str]:
+        """
+        Returns the recipients suppressed for a system, either on its own list or on the global one.
+
+        :param system: The sending system.
+        :param recipients: Normalised recipients to check.
+        :return: Set of the given recipients that are suppressed.
+        """
+        recipients = list(recipients)
+        if not recipients:
+            return set()
+        scope = Q(system__isnull=True)
+        if system is not None:
+            scope |= Q(system=system)
+        return set(self.manager.filter(scope, recipient__in=recipients).values_list('recipient', flat=True))
+
+    def add(self, system: Optional[System], recipients: Iterable[str], reason: str) -> int:
+        """
+        Suppresses recipients with bulk inserts; recipients already suppressed are left as they are.
+
+        :param system: System whose list the recipients join, or None for the global list.
+        :param recipients: Phone numbers (local or international) or email addresses, in any format; they
+            are stored in the form they are sent to.
+        :param reason: One of Suppression.REASONS.
+        :return: Number of recipients submitted.
+        """
+        entries: List[Suppression] = []
+        for recipient in {Suppression.normalise_recipient(recipient) for recipient in recipients}:
+            if recipient:
+                entries.append(Suppression(
+                    system=system, recipient=recipient, recipient_hash=Suppression.hash_recipient(recipient),
+                    reason=reason))
+        self.manager.bulk_create(entries, batch_size=5000, ignore_conflicts=True)
+        return len(entries)
@@ -0,0 +1,70 @@
+import re
+from typing import NamedTuple
+
+GSM_7 = "GSM-7"
+UCS_2 = "UCS-2"
+
+# GSM 03.38 default alphabet (without the escape character) and its extension table; an extension
+# character is sent as the escape character plus one septet, so it counts twice
+_GSM_BASIC = (
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà")
+_GSM_EXTENSION = "\f^{}\\[~]|€"
+_NON_GSM_CHARACTER = re.compile("[^%s]" % re.escape(_GSM_BASIC + _GSM_EXTENSION))
+_GSM_EXTENSION_CHARACTER = re.compile("[%s]" % re.escape(_GSM_EXTENSION))
+
+# Capacity of a single message, and of each part of a concatenated one after its 6-byte UDH
+_GSM_SINGLE, _GSM_PART = 160, 153
+_UCS_SINGLE, _UCS_PART = 70, 67
+
+
+class SMSSegments(NamedTuple):
+    """
+    How an SMS body is encoded and billed.
+
+    :param encoding: GSM-7 or UCS-2.
+    :param segments: Number of messages the body is sent as.
+    :param units: Length in septets (GSM-7) or UTF-16 code units (UCS-2).
+    """
+    encoding: str
+    segments: int
+    units: int
+
+
+def _split_count(body: str, part: int, double_width) -> int:
+    # Characters taking two units (escaped GSM-7 characters, UTF-16 surrogate pairs) are never split across parts
+    segments, used = 1, 0
+    for character in body:
+        width = 2 if double_width(character) else 1
+        if used + width > part:
+            segments, used = segments + 1, 0
+        used += width
+    return segments
+
+
+def segment_sms(body: str) -> SMSSegments:
+    """
+    Detects the encoding of an SMS body and counts the segments it is sent as.
+
+    A body made only of GSM-7 characters takes 160 septets in a single message and 153 per part when
+    concatenated; a single other character switches the whole body to UCS-2, with 70 and 67 code units.
+    Bodies that fit one message, or have no double-width characters, are counted without walking them.
+
+    :param body: Rendered SMS body.
+    :return: Its encoding, segment count and length in units.
+    """
+    if _NON_GSM_CHARACTER.search(body) is None:
+        extended = len(_GSM_EXTENSION_CHARACTER.findall(body))
+        units = len(body) + extended
+        if units <= _GSM_SINGLE:
+            return SMSSegments(GSM_7, 1, units)
+        if not extended:
+            return SMSSegments(GSM_7, -(-units // _GSM_PART), units)
+        return SMSSegments(GSM_7, _split_count(body, _GSM_PART, _GSM_EXTENSION.__contains__), units)
+
+    units = len(body.encode("utf-16-le")) // 2
+    if units <= _UCS_SINGLE:
+        return SMSSegments(UCS_2, 1, units)
+    if units == len(body):
+        return SMSSegments(UCS_2, -(-units // _UCS_PART), units)
+    return SMSSegments(UCS_2, _split_count(body, _UCS_PART, lambda character: character > "￿"), units)
@@ -0,0 +1,101 @@
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.models import Provider, SMSRoute
+
+# Key of a trie node's providers; every other key is a digit
+_PROVIDERS = None
+
+
+def _cost_order(cost: Optional[Decimal]) -> Tuple[bool, Decimal]:
+    # Priced providers first, cheapest first; unpriced ones keep their priority order after them
+    return cost is None, cost or Decimal(0)
+
+
+def by_cost(providers: List[Provider]) -> List[Provider]:
+    """
+    Orders providers by their price per SMS segment, keeping the given (priority) order between equal prices.
+
+    Every provider bills a message as the same number of segments, so the cheapest per segment is also
+    the cheapest for the whole message.
+
+    :param providers: Providers in priority order.
+    :return: The providers, cheapest first.
+    """
+    return sorted(providers, key=lambda provider: _cost_order(provider.cost_per_segment))
+
+
+class SMSRouter:
+    """
+    SMS routing table compiled into a prefix trie of digits.
+
+    Looking a number up walks one node per digit and keeps the providers of the deepest node that has
+    any, so the longest matching prefix wins in O(length of the number), however many routes there are.
+    Each prefix's providers are ordered once, when the trie is built, by the route's price per segment
+    (or else the provider's), then by route priority.
+
+    :param routes: Active routes in priority order.
+    """
+
+    def __init__(self, routes: Iterable[SMSRoute]):
+        self._root: Dict = {}
+        self._routes = 0
+        priced: Dict[str, List[Tuple[Optional[Decimal], Provider]]] = {}
+        for route in routes:
+            cost = route.cost_per_segment if route.cost_per_segment is not None else route.provider.cost_per_segment
+            priced.setdefault(route.prefix.strip().lstrip("+"), []).append((cost, route.provider))
+            self._routes += 1
+        for prefix, providers in priced.items():
+            node = self._root
+            for digit in prefix:
+                node = node.setdefault(digit, {})
+            node[_PROVIDERS] = [provider for _, provider in sorted(providers, key=lambda item: _cost_order(item[0]))]
+
+    def __len__(self) -> int:
+        return self._routes
+
+    def lookup(self, number: str) -> Tuple[str, List[Provider]]:
+        """
+        Finds the route of a number.
+
+        :param number: Phone number in international format, with or without a leading '+'.
+        :return: Tuple of (matched prefix, its providers cheapest per segment first, then by route priority);
+            ("", []) if no route matches.
+        """
+        node, matched, providers = self._root, "", []
+        for position, digit in enumerate(number.lstrip("+")):
+            node = node.get(digit)
+            if node is None:
+                break
+            if _PROVIDERS in node:
+                matched, providers = number.lstrip("+")[:position + 1], node[_PROVIDERS]
+        return matched, providers
+
+    def split(
+            self, recipients: List[str],
+            default_providers: List[Provider]) -> List[Tuple[List[str], List[Provider]]]:
+        """
+        Groups recipients by route.
+
+        Each group is sent through its routed providers first, then through the remaining default
+        providers as a fallback, cheapest per segment first. Recipients whose routes resolve to the same
+        providers share a group, and recipients that match no route form one group sent through the defaults.
+
+        :param recipients: Phone numbers.
+        :param default_providers: Active SMS providers in priority order.
+        :return: A list of (recipients, providers) tuples, in the order the recipients first appear.
+        """
+        default_providers = by_cost(default_providers)
+        if not self._routes:
+            return [(recipients, default_providers)]
+
+        groups: Dict[Tuple, Tuple[List[str], List[Provider]]] = {}
+        for recipient in recipients:
+            _, routed = self.lookup(recipient)
+            key = tuple(provider.id for provider in routed)
+            group: Optional[Tuple[List[str], List[Provider]]] = groups.get(key)
+            if group is None:
+                group = groups[key] = (
+                    [], routed + [provider for provider in default_providers if provider.id not in key])
+            group[0].append(recipient)
+        return list(groups.values())
@@ -0,0 +1,202 @@
+import bisect
+import heapq
+import logging
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+from core.backend.metrics import CACHE_REQUESTS
+from core.backend.services import SuppressionService
+from core.models import Suppression, System
+
+logger = logging.getLogger(__name__)
+
+# Types whose recipients are phone numbers or email addresses; push tokens have their own invalidation
+SUPPRESSIBLE_NOTIFICATION_TYPES = ("sms", "email")
+
+# Entries created this long before the last one loaded are read again, for transactions that committed late
+_REFRESH_OVERLAP = timedelta(seconds=5)
+
+# Up to this many new hashes are inserted in place; more are merged into a new array in one pass
+_INSERT_LIMIT = 32
+
+
+class SuppressionList:
+    """
+    Process-local index of suppressed recipients, to check every recipient without a query each.
+
+    Holds the 64-bit hash of every suppressed recipient in one sorted array per system (and one for the
+    global list), about 8 bytes per entry, and finds them with a binary search. A hash hit is only a
+    candidate: it is confirmed against the database before the recipient is dropped, so hash collisions
+    and entries deleted since the last load never suppress anyone.
+
+    Entries added by other processes are read every SUPPRESSION_CACHE_TTL seconds; the whole list is
+    reloaded every SUPPRESSION_FULL_RELOAD_SECONDS. A TTL of 0 disables the index and every check
+    goes to the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hashes: Dict[Optional[UUID], array] = {}
+        self._refreshed_at = 0.0
+        self._reloaded_at = 0.0
+        self._newest: Optional[datetime] = None
+
+    @staticmethod
+    def ttl() -> float:
+        return getattr(settings, "SUPPRESSION_CACHE_TTL", 30)
+
+    def _full_load(self) -> None:
+        hashes: Dict[Optional[UUID], List[int]] = {}
+        newest = None
+        for system_id, recipient_hash, date_created in Suppression.objects.order_by().values_list(
+                "system_id", "recipient_hash", "date_created").iterator(chunk_size=20000):
+            hashes.setdefault(system_id, []).append(recipient_hash)
+            if newest is None or date_created > newest:
+                newest = date_created
+        self._hashes = {system_id: array("q", sorted(values)) for system_id, values in hashes.items()}
+        self._newest = newest
+        self._reloaded_at = time.monotonic()
+
+    def _add_hashes(self, system_id: Optional[UUID], new_hashes: Iterable[int]) -> None:
+        hashes = self._hashes.setdefault(system_id, array("q"))
+        added = []
+        for recipient_hash in sorted(set(new_hashes)):
+            position = bisect.bisect_left(hashes, recipient_hash)
+            if position == len(hashes) or hashes[position] != recipient_hash:
+                added.append(recipient_hash)
+        if len(added) <= _INSERT_LIMIT:
+            # Each insert shifts the tail of the array, which is cheap for a handful of entries
+            for recipient_hash in added:
+                hashes.insert(bisect.bisect_left(hashes, recipient_hash), recipient_hash)
+        else:
+            self._hashes[system_id] = array("q", heapq.merge(hashes, added))
+
+    def _load_new(self) -> None:
+        rows = Suppression.objects.order_by().values_list("system_id", "recipient_hash", "date_created")
+        if self._newest is not None:
+            rows = rows.filter(date_created__gte=self._newest - _REFRESH_OVERLAP)
+        added: Dict[Optional[UUID], List[int]] = {}
+        for system_id, recipient_hash, date_created in rows.iterator(chunk_size=20000):
+            added.setdefault(system_id, []).append(recipient_hash)
+            if self._newest is None or date_created > self._newest:
+                self._newest = date_created
+        for system_id, new_hashes in added.items():
+            self._add_hashes(system_id, new_hashes)
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._refreshed_at < self.ttl():
+            return
+        with self._lock:
+            if now - self._refreshed_at < self.ttl():
+                return
+            if not self._reloaded_at or now - self._reloaded_at >= getattr(
+                    settings, "SUPPRESSION_FULL_RELOAD_SECONDS", 3600):
+                self._full_load()
+            else:
+                self._load_new()
+            self._refreshed_at = time.monotonic()
+
+    def load(self) -> Dict[str, int]:
+        """
+        Loads the whole list, e.g. when a worker warms up.
+
+        :return: Number of suppressed recipients loaded.
+        """
+        with self._lock:
+            self._full_load()
+            self._refreshed_at = time.monotonic()
+        return {"suppressions": sum(len(hashes) for hashes in self._hashes.values())}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hashes = {}
+            self._refreshed_at = self._reloaded_at = 0.0
+            self._newest = None
+
+    def add(self, suppression: Suppression) -> None:
+        """
+        Adds an entry saved by this process straight away, without waiting for the next refresh.
+        """
+        with self._lock:
+            if self._reloaded_at:
+                self._add_hashes(suppression.system_id, [suppression.recipient_hash])
+
+    def _candidates(self, system: Optional[System], recipients: Dict[str, str]) -> List[str]:
+        lists = [self._hashes.get(None)]
+        if system is not None:
+            lists.append(self._hashes.get(system.id))
+        lists = [hashes for hashes in lists if hashes]
+        candidates = []
+        for normalised in recipients.values():
+            recipient_hash = Suppression.hash_recipient(normalised)
+            for hashes in lists:
+                position = bisect.bisect_left(hashes, recipient_hash)
+                if position < len(hashes) and hashes[position] == recipient_hash:
+                    candidates.append(normalised)
+                    break
+        return candidates
+
+    def split(self, system: Optional[System], recipients: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        Separates the recipients a system may send to from the suppressed ones.
+
+        :param system: The sending system.
+        :param recipients: Recipients as they will be sent to.
+        :return: Tuple of (allowed recipients, suppressed recipients), each in the given order.
+        """
+        normalised = {recipient: Suppression.normalise_recipient(recipient) for recipient in recipients}
+        if self.ttl() <= 0:
+            candidates = list(normalised.values())
+        else:
+            self._refresh()
+            candidates = self._candidates(system, normalised)
+            CACHE_REQUESTS.inc(cache="suppression", result="miss" if candidates else "hit")
+        if not candidates:
+            return recipients, []
+
+        suppressed = SuppressionService().suppressed(system, candidates)
+        allowed = [recipient for recipient in recipients if normalised[recipient] not in suppressed]
+        return allowed, [recipient for recipient in recipients if normalised[recipient] in suppressed]
+
+    def suppress(self, system: Optional[System], recipients: Iterable[str], reason: str) -> None:
+        """
+        Suppresses recipients for a system and adds them to this process's index.
+
+        :param system: System whose list the recipients join, or None for the global list.
+        :param recipients: Phone numbers or email addresses, in any format.
+        :param reason: One of Suppression.REASONS.
+        """
+        recipients = [recipient for recipient in recipients if recipient]
+        if not recipients:
+            return
+        SuppressionService().add(system, recipients, reason)
+        logger.info("SuppressionList - suppressed %d recipients (%s)", len(recipients), reason)
+        with self._lock:
+            if self._reloaded_at:
+                self._add_hashes(system.id if system else None, [
+                    Suppression.hash_recipient(Suppression.normalise_recipient(recipient))
+                    for recipient in recipients])
+
+
+suppression_list = SuppressionList()
+
+
+def _add_suppression(sender, instance=None, **kwargs):
+    suppression_list.add(instance)
+
+
+def _reload_suppressions(sender, **kwargs):
+    # Removing a hash would be unsafe if another entry shares it; the next check reloads the whole list
+    suppression_list.clear()
+
+
+post_save.connect(_add_suppression, sender=Suppression, dispatch_uid="suppression_list_add")
+post_delete.connect(_reload_suppressions, sender=Suppression, dispatch_uid="suppression_list_reload")
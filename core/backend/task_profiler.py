@@ -0,0 +1,133 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+
+from celery.signals import task_prerun, task_postrun
+from django.conf import settings
+from django.db import connection
+
+from core.backend.metrics import record_stages
+
+logger = logging.getLogger(__name__)
+
+_profiles = threading.local()
+
+
+class TaskProfile:
+    """
+    Instrumentation of one sampled task run: wall time, cProfile, per-stage timings and the SQL it issued.
+    """
+
+    def __init__(self, task_name: str, task_id: str, max_sql: int):
+        self.task_name = task_name
+        self.task_id = task_id
+        self.max_sql = max_sql
+        self.sql: List[Dict] = []
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.profiler = cProfile.Profile()
+        self._stack = ExitStack()
+        self._stages = None
+        self._started = 0.0
+
+    def _record_sql(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.sql_count += 1
+            self.sql_seconds += duration
+            if len(self.sql) < self.max_sql:
+                self.sql.append({"sql": sql, "ms": round(duration * 1000, 2)})
+
+    def start(self) -> None:
+        self._stages = self._stack.enter_context(record_stages())
+        self._stack.enter_context(connection.execute_wrapper(self._record_sql))
+        self._started = time.perf_counter()
+        self.profiler.enable()
+
+    def stop(self) -> float:
+        self.profiler.disable()
+        duration = time.perf_counter() - self._started
+        self._stack.close()
+        return duration
+
+    def stage_breakdown(self) -> Dict[str, float]:
+        breakdown: Dict[str, float] = {}
+        for stage, seconds in self._stages or ():
+            breakdown[stage] = round(breakdown.get(stage, 0.0) + seconds * 1000, 2)
+        return breakdown
+
+    def top_functions(self, limit: int = 15) -> List[str]:
+        output = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=output)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        return [line for line in output.getvalue().splitlines() if line.strip()][-limit:]
+
+    def dump(self, directory: str) -> Optional[str]:
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{self.task_name}-{self.task_id}-{int(time.time())}.prof")
+            self.profiler.dump_stats(path)
+            return path
+        except OSError as ex:
+            logger.exception("TaskProfile - dump exception: %s", ex)
+            return None
+
+
+def _should_sample(task_name: str) -> bool:
+    rate = getattr(settings, "TASK_PROFILE_SAMPLE_RATE", 0.0)
+    if not rate or random.random() >= rate:
+        return False
+    tasks = getattr(settings, "TASK_PROFILE_TASKS", None)
+    return not tasks or task_name in tasks
+
+
+@task_prerun.connect
+def start_task_profile(task_id=None, task=None, **kwargs):
+    """ start instrumenting a sampled fraction of tasks """
+    if getattr(_profiles, "current", None) is not None or task is None or not _should_sample(task.name):
+        return
+    try:
+        profile = TaskProfile(task.name, task_id, getattr(settings, "TASK_PROFILE_MAX_SQL", 100))
+        profile.start()
+        _profiles.current = profile
+    except Exception as ex:
+        # Another profiler (e.g. a debugger) may already be active on this thread
+        logger.warning("TaskProfiler - could not start profiling %s: %s", task.name, ex)
+
+
+@task_postrun.connect
+def finish_task_profile(task_id=None, task=None, state=None, **kwargs):
+    """ report sampled tasks that ran longer than the slow threshold """
+    profile = getattr(_profiles, "current", None)
+    if profile is None or profile.task_id != task_id:
+        return
+    _profiles.current = None
+    duration = profile.stop()
+    if duration < getattr(settings, "TASK_PROFILE_SLOW_SECONDS", 10):
+        return
+
+    report = {
+        "event": "slow_task",
+        "task": profile.task_name,
+        "task_id": task_id,
+        "state": state,
+        "duration_ms": round(duration * 1000, 2),
+        "stages_ms": profile.stage_breakdown(),
+        "sql_count": profile.sql_count,
+        "sql_ms": round(profile.sql_seconds * 1000, 2),
+        "sql": profile.sql,
+        "profile": profile.dump(getattr(settings, "TASK_PROFILE_DIR", "/tmp/notify-profiles")),
+        "top_functions": profile.top_functions(),
+    }
+    logger.warning("TaskProfiler - slow task: %s", json.dumps(report, default=str))
@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from celery.signals import worker_init, worker_process_init, worker_ready, worker_shutdown
+from django.conf import settings
+from django.db import close_old_connections, connection, connections
+
+from core.backend.db_connections import close_connection_pools
+from core.backend.notification_types.base_notification import compile_template
+from core.backend.reference_cache import reference_cache
+from core.backend.suppression_list import suppression_list
+from core.models import State
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_database() -> Dict:
+    close_old_connections()
+    connection.ensure_connection()
+    return {"vendor": connection.vendor}
+
+
+def _warm_states() -> Dict:
+    State.clear_cache()
+    State.pending()
+    return {"states": len(State._cache)}
+
+
+def _warm_reference_data() -> Dict:
+    return reference_cache.load()
+
+
+def _warm_suppressions() -> Dict:
+    return suppression_list.load()
+
+
+def _warm_templates() -> Dict:
+    compiled, failed = 0, 0
+    for template in reference_cache.templates():
+        if not template.is_active:
+            continue
+        for source in (template.subject, template.body):
+            if not source:
+                continue
+            try:
+                compile_template(source)
+                compiled += 1
+            except Exception as ex:
+                failed += 1
+                logger.warning("WorkerWarmup - template %s does not compile: %s", template.name, ex)
+    return {"compiled": compiled, "failed": failed}
+
+
+def _warm_provider_classes() -> Dict:
+    # Imported here so that the manager and the SDKs of the active providers load before the first task
+    from core.backend.notification_manager import NotificationManager  # noqa: F401
+    from core.backend.providers.providers_registry import get_provider_class
+
+    loaded, failed = set(), set()
+    for provider in reference_cache.all_active_providers():
+        try:
+            get_provider_class(provider.class_name)
+            loaded.add(provider.class_name)
+        except ValueError as ex:
+            failed.add(provider.class_name)
+            logger.warning("WorkerWarmup - provider %s class not loaded: %s", provider.name, ex)
+    return {"loaded": sorted(loaded), "failed": sorted(failed)}
+
+
+def _warm_provider_clients() -> Dict:
+    from core.backend.notification_manager import NotificationManager
+
+    ready, failed = [], []
+    for provider in reference_cache.all_active_providers():
+        try:
+            provider_instance = NotificationManager._get_provider_class_instance(provider)
+            if provider_instance.validate_config():
+                provider_instance.warm_up()
+            ready.append(provider.name)
+        except Exception as ex:
+            failed.append(provider.name)
+            logger.warning("WorkerWarmup - provider %s warm-up failed: %s", provider.name, ex)
+    return {"ready": ready, "failed": failed}
+
+
+# Process-wide data, safe to load once in a prefork parent and share with its children
+DATA_STEPS: List[Tuple[str, Callable[[], Dict]]] = [
+    ("states", _warm_states),
+    ("reference_data", _warm_reference_data),
+    ("suppressions", _warm_suppressions),
+    ("templates", _warm_templates),
+    ("provider_classes", _warm_provider_classes),
+]
+
+# Sockets and clients, which must be opened by the process that uses them
+CONNECTION_STEPS: List[Tuple[str, Callable[[], Dict]]] = [
+    ("database", _warm_database),
+    ("provider_clients", _warm_provider_clients),
+]
+
+ALL_STEPS = CONNECTION_STEPS[:1] + DATA_STEPS + CONNECTION_STEPS[1:]
+
+# Steps that call out to providers, which can hang (e.g. an OAuth token fetch). They run in a thread that is
+# abandoned when the timeout runs out. Database steps run in the calling thread, whose connections they warm,
+# and are bounded by the database timeouts; a thread left holding a cache lock would also deadlock forked children
+THREADED_STEPS = {"provider_clients"}
+
+# Set in a prefork parent once DATA_STEPS have run, and inherited by its children
+_data_preloaded = False
+# Warm-up report of the main process, logged again once logging is configured
+_main_process_report: Optional[Dict] = None
+
+
+def _run_in_thread(name: str, step: Callable[[], Dict], timeout: float) -> Dict:
+    """
+    Runs a step in a daemon thread and waits for it at most `timeout` seconds.
+
+    :raises TimeoutError: If the step is still running; it is left to finish in the background.
+    """
+    outcome: Dict = {}
+
+    def run():
+        try:
+            outcome["result"] = step()
+        except Exception as ex:
+            outcome["error"] = ex
+        finally:
+            # Connections are per thread; close any the step opened
+            connections.close_all()
+
+    thread = threading.Thread(target=run, name=f"warmup-{name}", daemon=True)
+    thread.start()
+    thread.join(max(timeout, 0))
+    if thread.is_alive():
+        raise TimeoutError(f"{name} still running after {timeout:.1f}s")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def warm_up_worker(steps: Optional[List[Tuple[str, Callable[[], Dict]]]] = None) -> Dict:
+    """
+    Runs warm-up steps in order so a new worker process serves its first task with a database
+    connection, cached reference data, compiled templates and initialised provider clients.
+
+    A failing step is logged and skipped; steps still pending when settings.WORKER_WARMUP_TIMEOUT
+    runs out are skipped, and THREADED_STEPS are abandoned when it runs out while they are running,
+    so warm-up can slow a worker's start but never stop it.
+
+    :param steps: The (name, callable) steps to run; all of them by default.
+    :return: Per-step timings and results, also logged as one JSON line.
+    """
+    started = time.perf_counter()
+    timeout = getattr(settings, "WORKER_WARMUP_TIMEOUT", 20)
+    report: Dict = {"event": "worker_warmup", "pid": os.getpid(), "steps": {}}
+
+    for name, step in steps if steps is not None else ALL_STEPS:
+        if time.perf_counter() - started > timeout:
+            report["steps"][name] = {"skipped": "timeout"}
+            continue
+        step_started = time.perf_counter()
+        try:
+            if name in THREADED_STEPS:
+                result = _run_in_thread(name, step, timeout - (step_started - started))
+            else:
+                result = step()
+        except TimeoutError as ex:
+            logger.warning("WorkerWarmup - %s abandoned: %s", name, ex)
+            result = {"error": "timeout"}
+        except Exception as ex:
+            logger.exception("WorkerWarmup - %s exception: %s", name, ex)
+            result = {"error": str(ex)}
+        result["ms"] = round((time.perf_counter() - step_started) * 1000, 1)
+        report["steps"][name] = result
+
+    report["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("WorkerWarmup - %s", json.dumps(report, default=str))
+    return report
+
+
+def warmup_enabled() -> bool:
+    return getattr(settings, "WORKER_WARMUP", True)
+
+
+@worker_init.connect
+def warm_up_worker_main_process(sender=None, **kwargs):
+    """
+    warm up the main process before it starts consuming. With a prefork pool only the shared data
+    is loaded here, before the pool forks; each child then opens its own connections
+    """
+    global _data_preloaded, _main_process_report
+    if not warmup_enabled() or sender is None:
+        return
+    from celery.concurrency import get_implementation
+    pool_module = get_implementation(sender.pool_cls).__module__
+    if pool_module == "celery.concurrency.prefork":
+        _main_process_report = warm_up_worker(DATA_STEPS)
+        # Children must not inherit an open connection or pool
+        connections.close_all()
+        close_connection_pools()
+        _data_preloaded = True
+    elif pool_module != "celery.concurrency.solo":
+        # threads, gevent and eventlet pools run tasks in this process
+        _main_process_report = warm_up_worker()
+
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    """ warm up each pool process (or the solo pool's process) before it is handed tasks """
+    global _main_process_report
+    if not warmup_enabled():
+        return
+    if _data_preloaded:
+        warm_up_worker(CONNECTION_STEPS)
+    else:
+        _main_process_report = warm_up_worker()
+
+
+def _ready_file() -> Optional[str]:
+    return getattr(settings, "WORKER_READY_FILE", None)
+
+
+@worker_ready.connect
+def report_worker_ready(**kwargs):
+    """
+    signal readiness (e.g. to a Kubernetes readiness probe) once the main process is warm and consuming.
+    Prefork children are only handed tasks once their own warm-up has finished
+    """
+    path = _ready_file()
+    if path:
+        try:
+            with open(path, "w") as fil:
+                fil.write(str(os.getpid()))
+        except OSError as ex:
+            logger.exception("WorkerWarmup - report_worker_ready exception: %s", ex)
+    logger.info(
+        "WorkerWarmup - worker ready, main process warm-up: %s", json.dumps(_main_process_report, default=str))
+
+
+@worker_shutdown.connect
+def clear_worker_ready(**kwargs):
+    path = _ready_file()
+    if path and os.path.exists(path):
+        os.remove(path)
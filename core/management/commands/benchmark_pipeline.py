@@ -0,0 +1,288 @@
+import json
+import logging
+import platform
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.backend.metrics import record_stages, percentile
+from core.models import State, NotificationType, System, Template, Provider, Notification
+from core.views import NotifyAPIsManager
+from notify.celery import app
+
+RECIPIENT_FORMATS = {
+    "sms": "2547%08d",
+    "email": "user%d@example.com",
+    "push": "benchmark-device-token-%d",
+}
+
+TEMPLATE_BODIES = {
+    "sms": "Hello {{ name }}, your code is {{ code }}.",
+    "email": "<p>Hello {{ name }},</p><p>Your verification code is <b>{{ code }}</b>.</p>",
+    "push": "Your code is {{ code }}",
+}
+
+# Metrics where a higher value is an improvement; everything else regresses when it grows
+HIGHER_IS_BETTER = {"throughput_per_sec"}
+
+
+class _CallbackHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the pipeline end to end (ingestion, persistence, rendering, provider send and callback) "
+        "against a throwaway test database, eager Celery and fake providers, and compares the results "
+        "with a stored baseline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--notifications", type=int, default=1000, help="Number of notifications to send (default: 1000).")
+        parser.add_argument("--warmup", type=int, default=50, help="Unmeasured notifications sent first (default: 50).")
+        parser.add_argument(
+            "--notification-types", default="sms,email,push",
+            help="Comma-separated notification types to mix (default: sms,email,push).")
+        parser.add_argument(
+            "--bulk-size", type=int, default=0,
+            help="Ingest through the bulk endpoint in batches of this size (default: 0, one request per notification).")
+        parser.add_argument("--latency-ms", type=float, default=0, help="Fake provider latency (default: 0).")
+        parser.add_argument("--jitter-ms", type=float, default=0, help="Fake provider latency jitter (default: 0).")
+        parser.add_argument(
+            "--error-rate", type=float, default=0, help="Fraction of fake provider sends that fail (default: 0).")
+        parser.add_argument(
+            "--callback-latency-ms", type=float, default=0, help="Latency of the local webhook stub (default: 0).")
+        parser.add_argument("--output", help="Write the results as JSON to this path.")
+        parser.add_argument("--baseline", help="Compare the results with a JSON file written by a previous run.")
+        parser.add_argument(
+            "--tolerance", type=float, default=10,
+            help="Allowed regression against the baseline, in percent (default: 10).")
+        parser.add_argument(
+            "--fail-on-regression", action="store_true",
+            help="Exit with an error if any metric regressed beyond the tolerance.")
+        parser.add_argument(
+            "--keepdb", action="store_true", help="Reuse the test database between runs instead of recreating it.")
+
+    def handle(self, *args, **options):
+        types = [name.strip().lower() for name in options["notification_types"].split(",") if name.strip()]
+        unknown = set(types) - set(RECIPIENT_FORMATS)
+        if unknown:
+            raise CommandError(f"Unsupported notification types: {', '.join(sorted(unknown))}")
+        if options["notifications"] <= 0:
+            raise CommandError("--notifications must be positive")
+
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as fil:
+                baseline = json.load(fil)
+
+        _CallbackHandler.latency = options["callback_latency_ms"] / 1000
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _CallbackHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        old_database_name = connection.settings_dict["NAME"]
+        always_eager = app.conf.task_always_eager
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options["keepdb"])
+        State.clear_cache()
+        app.conf.task_always_eager = True
+        if options["verbosity"] < 2:
+            # Injected provider errors would otherwise log a traceback per failed notification
+            logging.disable(logging.ERROR)
+        try:
+            self._create_fixtures(types, f"http://127.0.0.1:{server.server_port}/callback", options)
+            results = self._run(types, options)
+        finally:
+            logging.disable(logging.NOTSET)
+            app.conf.task_always_eager = always_eager
+            connection.creation.destroy_test_db(old_database_name, verbosity=0, keepdb=options["keepdb"])
+            State.clear_cache()
+            server.shutdown()
+
+        self._print_results(results)
+
+        if options["output"]:
+            with open(options["output"], "w") as fil:
+                json.dump(results, fil, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = self._compare(results, baseline, options["tolerance"])
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"{len(regressions)} metrics regressed beyond {options['tolerance']:g}%")
+
+    @staticmethod
+    def _create_fixtures(types: List[str], callback_url: str, options: Dict) -> None:
+        for name in ("Pending", "Sent", "Failed", "Confirmation Pending"):
+            State.objects.get_or_create(name=name)
+        Notification.objects.all().delete()
+        System.objects.update_or_create(
+            name="benchmark", defaults={
+                "default_from_email": "benchmark@example.com",
+                "callback_type": "webhook",
+                "webhook_url": callback_url,
+            })
+        for type_name in types:
+            notification_type, _ = NotificationType.objects.get_or_create(name=type_name)
+            Template.objects.update_or_create(
+                name=f"benchmark_{type_name}", defaults={
+                    "notification_type": notification_type,
+                    "subject": "Your verification code" if type_name == "email" else "",
+                    "body": TEMPLATE_BODIES[type_name],
+                })
+            Provider.objects.filter(notification_type=notification_type).exclude(
+                name=f"benchmark_{type_name}").update(is_active=False)
+            Provider.objects.update_or_create(
+                name=f"benchmark_{type_name}", defaults={
+                    "notification_type": notification_type,
+                    "priority": 1,
+                    "class_name": "FakeProvider",
+                    "is_active": True,
+                    "config": {
+                        "latency_ms": options["latency_ms"],
+                        "jitter_ms": options["jitter_ms"],
+                        "error_rate": options["error_rate"],
+                    },
+                })
+
+    @staticmethod
+    def _payload(types: List[str], index: int) -> Dict:
+        type_name = types[index % len(types)]
+        return {
+            "system": "benchmark",
+            "notification_type": type_name,
+            "template": f"benchmark_{type_name}",
+            "recipients": [RECIPIENT_FORMATS[type_name] % index],
+            "context": {"name": f"User {index}", "code": f"{index % 1000000:06d}"},
+            "unique_identifier": f"benchmark-{index}",
+        }
+
+    def _ingest(self, types: List[str], start: int, count: int, bulk_size: int) -> None:
+        factory = RequestFactory()
+        if not bulk_size:
+            for index in range(start, start + count):
+                request = factory.post(
+                    "/core/send-notification/", data=json.dumps(self._payload(types, index)),
+                    content_type="application/json")
+                NotifyAPIsManager.queue_send_notification(request)
+            return
+
+        for batch_start in range(start, start + count, bulk_size):
+            batch_end = min(batch_start + bulk_size, start + count)
+            body = {"notifications": [self._payload(types, index) for index in range(batch_start, batch_end)]}
+            request = factory.post(
+                "/core/send-bulk-notifications/", data=json.dumps(body), content_type="application/json")
+            NotifyAPIsManager.queue_send_bulk_notifications(request)
+
+    def _run(self, types: List[str], options: Dict) -> Dict:
+        total = options["notifications"]
+        self._ingest(types, 0, options["warmup"], options["bulk_size"])
+        Notification.objects.all().delete()
+
+        with record_stages() as recorded, CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            self._ingest(types, options["warmup"], total, options["bulk_size"])
+            duration = time.perf_counter() - started
+
+        samples = defaultdict(list)
+        for stage, seconds in recorded:
+            samples[stage].append(seconds)
+
+        statuses = defaultdict(int)
+        for status_name in Notification.objects.values_list("status__name", flat=True):
+            statuses[status_name] += 1
+
+        stages = {}
+        for stage, values in sorted(samples.items()):
+            values.sort()
+            stages[stage] = {
+                "count": len(values),
+                "mean_ms": round(sum(values) / len(values) * 1000, 3),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+            }
+
+        return {
+            "meta": {
+                "timestamp": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "database": connection.vendor,
+                "notifications": total,
+                "notification_types": types,
+                "bulk_size": options["bulk_size"],
+                "latency_ms": options["latency_ms"],
+                "jitter_ms": options["jitter_ms"],
+                "error_rate": options["error_rate"],
+                "callback_latency_ms": options["callback_latency_ms"],
+            },
+            "duration_s": round(duration, 3),
+            "throughput_per_sec": round(total / duration, 2),
+            "queries_per_notification": round(len(queries.captured_queries) / total, 2),
+            "statuses": dict(statuses),
+            "stages": stages,
+        }
+
+    def _print_results(self, results: Dict) -> None:
+        self.stdout.write(
+            f"{results['meta']['notifications']} notifications in {results['duration_s']}s: "
+            f"{results['throughput_per_sec']} msg/s, {results['queries_per_notification']} queries per notification")
+        self.stdout.write("Statuses: " + ", ".join(f"{k}={v}" for k, v in sorted(results["statuses"].items())))
+        self.stdout.write(f"{'stage':<18}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage, stats in results["stages"].items():
+            self.stdout.write(
+                f"{stage:<18}{stats['count']:>8}{stats['mean_ms']:>10.3f}{stats['p50_ms']:>10.3f}"
+                f"{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}")
+
+    @staticmethod
+    def _flatten(results: Dict) -> Dict[str, float]:
+        flat = {
+            "throughput_per_sec": results.get("throughput_per_sec"),
+            "queries_per_notification": results.get("queries_per_notification"),
+        }
+        for stage, stats in results.get("stages", {}).items():
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                flat[f"{stage}.{key}"] = stats.get(key)
+        return flat
+
+    def _compare(self, results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+        """
+        Prints the change of every metric against the baseline and returns the ones that regressed.
+        """
+        current, previous = self._flatten(results), self._flatten(baseline)
+        regressions = []
+        self.stdout.write(f"Comparison with baseline from {baseline.get('meta', {}).get('timestamp', 'unknown')}:")
+        for metric, value in current.items():
+            reference = previous.get(metric)
+            if value is None or not reference:
+                continue
+            change = (value - reference) / reference * 100
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            line = f"  {metric:<32}{reference:>12}{value:>12}{change:>+9.1f}%"
+            if worse > tolerance:
+                regressions.append(metric)
+                self.stdout.write(self.style.ERROR(line + "  REGRESSION"))
+            else:
+                self.stdout.write(line)
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f"No regressions beyond {tolerance:g}%"))
+        return regressions
@@ -0,0 +1,121 @@
+import json
+import random
+import re
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.backend.recipient_normaliser import normalise_recipients
+
+# How recipients arrive in requests, including the local and punctuated forms the normaliser accepts
+RECIPIENT_FORMATS = {
+    "sms": ("2547%08d", "+2547%08d", "07%08d", "+254 7%02d %03d %03d", "002547%08d"),
+    "email": ("user%d@example.com", "User.%d@Example.COM", " user%d@example.org "),
+}
+INVALID_RECIPIENTS = {
+    "sms": ("12345", "07%08dx", "not a number"),
+    "email": ("user%d@", "user%d.example.com", "user %d@example.com"),
+}
+
+# Validation as it was before the normaliser: a strip and a re.match per recipient, failing on the first bad one
+LEGACY_PATTERNS = {"sms": r'254\d{9}', "email": r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'}
+
+
+def _legacy_validate(notification_type: str, recipients: List[str]) -> List[str]:
+    cleaned_recipients = set()
+    for recipient in recipients:
+        recipient = recipient.strip()
+        if notification_type == "sms":
+            recipient = recipient.replace("+", "")
+        cleaned_recipients.add(recipient)
+    for recipient in cleaned_recipients:
+        if not re.match(LEGACY_PATTERNS[notification_type], recipient):
+            return []
+    return list(cleaned_recipients)
+
+
+def _fill(recipient_format: str, index: int) -> str:
+    count = recipient_format.count("%")
+    if count == 3:
+        return recipient_format % (index // 1000000 % 100, index // 1000 % 1000, index % 1000)
+    return recipient_format % index if count else recipient_format
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmarks recipient normalisation: the time to normalise and validate recipient lists of "
+        "different sizes, with a share of invalid recipients, against the per-recipient regex validation it "
+        "replaced (timed on the valid recipients, since it failed at the first invalid one).")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", default="1,10,500,10000,100000",
+            help="Comma-separated recipient list sizes (default: 1,10,500,10000,100000).")
+        parser.add_argument(
+            "--notification-types", default="sms,email", help="Comma-separated notification types (default: sms,email).")
+        parser.add_argument(
+            "--invalid-rate", type=float, default=0.01,
+            help="Fraction of invalid recipients in each list (default: 0.01).")
+        parser.add_argument("--repeat", type=int, default=7, help="Timed runs per list (default: 7).")
+        parser.add_argument("--output", help="Write the results as JSON to this path.")
+
+    @staticmethod
+    def _recipients(notification_type: str, size: int, invalid_rate: float) -> List[str]:
+        generator = random.Random(size)
+        formats, invalid = RECIPIENT_FORMATS[notification_type], INVALID_RECIPIENTS[notification_type]
+        return [
+            _fill(generator.choice(invalid if generator.random() < invalid_rate else formats), index)
+            for index in range(size)]
+
+    @staticmethod
+    def _time(function: Callable[[], object], repeat: int, size: int) -> float:
+        # Small lists are looped so each timing covers enough work to measure
+        loops = max(1, 20000 // size)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(loops):
+                function()
+            timings.append((time.perf_counter() - started) / loops)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        notification_types = [name.strip() for name in options["notification_types"].split(",") if name.strip()]
+        unknown = set(notification_types) - set(RECIPIENT_FORMATS)
+        if unknown:
+            raise CommandError(f"Unknown notification types: {', '.join(sorted(unknown))}")
+        sizes = [int(size) for size in options["sizes"].split(",") if size.strip()]
+
+        results: Dict[str, List[Dict]] = {}
+        self.stdout.write(
+            f"{'type':<7}{'recipients':>11}{'valid':>9}{'rejected':>10}{'us/recipient':>14}{'recipients/s':>14}"
+            f"{'legacy us/recipient':>21}")
+        for notification_type in notification_types:
+            results[notification_type] = []
+            for size in sizes:
+                recipients = self._recipients(notification_type, size, options["invalid_rate"])
+                normalised = normalise_recipients(notification_type, recipients)
+                seconds = self._time(lambda: normalise_recipients(notification_type, recipients), options["repeat"], size)
+                # The old validation stops at the first invalid recipient, so it is timed on the valid ones only
+                legacy_seconds = self._time(
+                    lambda: _legacy_validate(notification_type, normalised.valid), options["repeat"], size)
+                result = {
+                    "recipients": size,
+                    "valid": len(normalised.valid),
+                    "rejected": len(normalised.rejected),
+                    "us_per_recipient": round(seconds / size * 1e6, 3),
+                    "recipients_per_sec": round(size / seconds),
+                    "legacy_us_per_recipient": round(legacy_seconds / max(1, len(normalised.valid)) * 1e6, 3),
+                }
+                results[notification_type].append(result)
+                self.stdout.write(
+                    f"{notification_type:<7}{size:>11}{result['valid']:>9}{result['rejected']:>10}"
+                    f"{result['us_per_recipient']:>14}{result['recipients_per_sec']:>14}"
+                    f"{result['legacy_us_per_recipient']:>21}")
+
+        if options["output"]:
+            with open(options["output"], "w") as fil:
+                json.dump(results, fil, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,117 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand, CommandError
+
+# What each kind of process imports before it can do its job
+PROCESS_TYPES = {
+    "management": "",
+    "web": (
+        "from django.core.wsgi import get_wsgi_application\n"
+        "get_wsgi_application()\n"
+        "from django.urls import resolve\n"
+        "resolve('/core/send-notification/')\n"
+    ),
+    "celery_worker": (
+        "from notify.celery import app\n"
+        "app.loader.import_default_modules()\n"
+    ),
+    "celery_worker_loaded": (
+        "from notify.celery import app\n"
+        "app.loader.import_default_modules()\n"
+        "from core.backend.notification_manager import NotificationManager\n"
+        "from core.backend.providers.providers_registry import PROVIDER_CLASSES, get_provider_class\n"
+        "for name in PROVIDER_CLASSES:\n"
+        "    get_provider_class(name)\n"
+    ),
+    "delivery_worker": (
+        "from core.backend.async_delivery_worker import AsyncDeliveryWorker\n"
+    ),
+}
+
+# Modules whose presence shows that a process loaded part of the delivery stack
+WATCHED_MODULES = (
+    "core.backend.notification_manager", "firebase_admin", "africastalking", "aiosmtplib", "smtplib",
+    "aio_pika", "httpx",
+)
+
+PROBE = """
+import json, os, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+{snippet}
+elapsed = time.perf_counter() - start
+rss_kb = None
+try:
+    with open("/proc/self/status") as fil:
+        for line in fil:
+            if line.startswith("VmRSS:"):
+                rss_kb = int(line.split()[1])
+except OSError:
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "rss_mb": rss_kb / 1024 if rss_kb else None,
+    "modules": len(sys.modules),
+    "loaded": [name for name in {watched!r} if name in sys.modules],
+}}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures start-up import time and resident memory of each process type (web, Celery worker, "
+        "delivery worker, management command) in fresh interpreters.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per process type (default: 5).")
+        parser.add_argument(
+            "--process-types", default=",".join(PROCESS_TYPES),
+            help=f"Comma-separated process types (default: {','.join(PROCESS_TYPES)}).")
+        parser.add_argument("--output", help="Write the results as JSON to this path.")
+
+    def _probe(self, process_type: str) -> Dict:
+        code = PROBE.format(snippet=PROCESS_TYPES[process_type], watched=WATCHED_MODULES)
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, env=os.environ.copy(), check=False)
+        if completed.returncode != 0:
+            raise CommandError(f"{process_type} probe failed:\n{completed.stderr}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        result["process_ms"] = (time.perf_counter() - started) * 1000
+        return result
+
+    def handle(self, *args, **options):
+        process_types = [name.strip() for name in options["process_types"].split(",") if name.strip()]
+        unknown = set(process_types) - set(PROCESS_TYPES)
+        if unknown:
+            raise CommandError(f"Unknown process types: {', '.join(sorted(unknown))}")
+
+        results = {}
+        for process_type in process_types:
+            runs: List[Dict] = [self._probe(process_type) for _ in range(options["repeat"])]
+            results[process_type] = {
+                "import_ms": round(statistics.median(run["import_ms"] for run in runs), 1),
+                "process_ms": round(statistics.median(run["process_ms"] for run in runs), 1),
+                "rss_mb": round(statistics.median(run["rss_mb"] for run in runs), 1),
+                "modules": runs[-1]["modules"],
+                "loaded": runs[-1]["loaded"],
+            }
+
+        self.stdout.write(
+            f"{'process type':<22}{'import ms':>11}{'process ms':>12}{'RSS MB':>9}{'modules':>9}  delivery stack")
+        for process_type, result in results.items():
+            self.stdout.write(
+                f"{process_type:<22}{result['import_ms']:>11}{result['process_ms']:>12}{result['rss_mb']:>9}"
+                f"{result['modules']:>9}  {', '.join(result['loaded']) or '-'}")
+
+        if options["output"]:
+            with open(options["output"], "w") as fil:
+                json.dump(results, fil, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,111 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.backend.metrics import percentile
+from core.models import Notification
+
+WINDOWS = {
+    "all": None,
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+METRICS = ("queue_lag_ms", "provider_request_ms", "time_to_send_ms", "time_to_deliver_ms")
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports latency percentiles (queue lag, provider request time, time to send and to deliver) "
+        "per system, provider and time window from notification lifecycle timestamps.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since", help="Start of the period, as an ISO datetime or a number of hours ago (default: 24).",
+            default="24")
+        parser.add_argument("--until", help="End of the period as an ISO datetime (default: now).")
+        parser.add_argument("--window", choices=WINDOWS.keys(), default="all", help="Time bucket size (default: all).")
+        parser.add_argument("--system", help="Only report on this system.")
+        parser.add_argument(
+            "--percentiles", default="50,95,99", help="Comma-separated percentiles (default: 50,95,99).")
+
+    @staticmethod
+    def _parse_moment(value: str):
+        if value.replace(".", "", 1).isdigit():
+            return timezone.now() - timedelta(hours=float(value))
+        moment = parse_datetime(value)
+        if moment is None:
+            raise CommandError(f"Invalid datetime: {value}")
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+    @staticmethod
+    def _bucket(moment, window: Optional[timedelta]) -> str:
+        if window is None:
+            return "all"
+        epoch = moment.timestamp()
+        start = epoch - epoch % window.total_seconds()
+        return datetime.fromtimestamp(start, tz=timezone.get_current_timezone()).strftime("%Y-%m-%d %H:%M")
+
+    @staticmethod
+    def _ms(start, end) -> Optional[float]:
+        if start is None or end is None:
+            return None
+        return (end - start).total_seconds() * 1000
+
+    def handle(self, *args, **options):
+        since = self._parse_moment(options["since"])
+        until = self._parse_moment(options["until"]) if options["until"] else timezone.now()
+        window = WINDOWS[options["window"]]
+        try:
+            percentiles = [float(p) for p in options["percentiles"].split(",")]
+        except ValueError:
+            raise CommandError("--percentiles must be a comma-separated list of numbers")
+
+        queryset = Notification.objects.filter(date_created__gte=since, date_created__lt=until)
+        if options["system"]:
+            queryset = queryset.filter(system__name=options["system"].lower())
+
+        samples: Dict[Tuple[str, str, str], Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        rows = queryset.order_by().values_list(
+            "date_created", "system__name", "provider__name", "queued_at", "processing_started_at",
+            "provider_request_ms", "sent_time", "delivered_at", "send_at")
+        for date_created, system, provider, queued_at, started_at, provider_ms, sent_time, delivered_at, send_at in \
+                rows.iterator(chunk_size=5000):
+            group = samples[(self._bucket(date_created, window), system, provider or "-")]
+            # Scheduled notifications are measured from the time they were due, not from ingestion
+            if send_at and (queued_at is None or send_at > queued_at):
+                queued_at = send_at
+            values = {
+                "queue_lag_ms": self._ms(queued_at, started_at),
+                "provider_request_ms": provider_ms,
+                "time_to_send_ms": self._ms(queued_at or started_at, sent_time),
+                "time_to_deliver_ms": self._ms(queued_at or started_at, delivered_at),
+            }
+            for metric, value in values.items():
+                if value is not None:
+                    group[metric].append(value)
+
+        if not samples:
+            self.stdout.write("No notifications in the selected period")
+            return
+
+        header = ["window", "system", "provider", "metric", "count"] + [f"p{p:g}" for p in percentiles]
+        table = [header]
+        for (bucket, system, provider), group in sorted(samples.items()):
+            for metric in METRICS:
+                values = sorted(group.get(metric, []))
+                if not values:
+                    continue
+                table.append(
+                    [bucket, system, provider, metric, str(len(values))] +
+                    [f"{percentile(values, p):.0f}" for p in percentiles])
+
+        widths = [max(len(row[i]) for row in table) for i in range(len(header))]
+        for row in table:
+            self.stdout.write("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
@@ -0,0 +1,323 @@
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+from core.backend.metrics import percentile
+from core.models import System, Template, Notification
+
+TEMPLATE_VARIABLE = re.compile(r"{{\s*([a-zA-Z_][a-zA-Z0-9_]*)")
+
+RECIPIENT_FORMATS = {
+    "sms": lambda n: "2547%08d" % n,
+    "email": lambda n: "tenant%d@example.com" % n,
+    "push": lambda n: "loadgen-device-token-%d" % n,
+}
+
+SAMPLE_VALUES = {
+    "name": lambda: random.choice(["Amina", "Brian", "Chebet", "David", "Esther", "Felix", "Grace", "Hassan"]),
+    "amount": lambda: f"{random.randint(5, 120) * 500:,}",
+    "code": lambda: f"{random.randint(0, 999999):06d}",
+    "otp": lambda: f"{random.randint(0, 999999):06d}",
+    "due_date": lambda: f"{random.randint(1, 28)}/{random.randint(1, 12)}/2026",
+    "title": lambda: "Rent reminder",
+}
+
+TERMINAL_STATES = {"Sent", "Failed", "Confirmation Pending", "Coalesced"}
+
+
+def parse_weights(value: str, option: str) -> Dict[str, float]:
+    """
+    Parses 'a:3,b:1' (or 'a,b' for equal weights) into a weight per name.
+    """
+    weights = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, weight = item.partition(":")
+        try:
+            weights[name.lower()] = float(weight) if weight else 1.0
+        except ValueError:
+            raise CommandError(f"Invalid weight in {option}: {item}")
+    if not weights or not any(weights.values()):
+        raise CommandError(f"{option} must name at least one entry with a positive weight")
+    return weights
+
+
+class TrafficMix:
+    """
+    Generates notification payloads across systems, notification types, templates and recipient counts.
+    """
+
+    def __init__(
+            self, systems: Dict[str, float], types: Dict[str, float], templates: Dict[str, List[Template]],
+            multi_recipient_rate: float, max_recipients: int, recipient_pool: int):
+        self.systems = systems
+        self.types = {name: weight for name, weight in types.items() if templates.get(name)}
+        self.templates = templates
+        self.multi_recipient_rate = multi_recipient_rate
+        self.max_recipients = max_recipients
+        self.recipient_pool = recipient_pool
+        if not self.types:
+            raise CommandError("None of the requested notification types has an active template")
+
+    @staticmethod
+    def _choose(weights: Dict[str, float]) -> str:
+        return random.choices(list(weights), weights=list(weights.values()))[0]
+
+    def payload(self, unique_identifier: str) -> Tuple[str, Dict]:
+        system = self._choose(self.systems)
+        notification_type = self._choose(self.types)
+        template = random.choice(self.templates[notification_type])
+
+        count = 1
+        if self.max_recipients > 1 and random.random() < self.multi_recipient_rate:
+            count = random.randint(2, self.max_recipients)
+        recipients = [
+            RECIPIENT_FORMATS[notification_type](random.randrange(self.recipient_pool)) for _ in range(count)]
+
+        context = {}
+        for variable in TEMPLATE_VARIABLE.findall(f"{template.subject} {template.body}"):
+            context[variable] = SAMPLE_VALUES.get(variable, lambda: "sample")()
+
+        return system, {
+            "system": system,
+            "notification_type": notification_type,
+            "template": template.name,
+            "recipients": recipients,
+            "context": context,
+            "unique_identifier": unique_identifier,
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates mixed notification traffic against the ingestion API in open-loop (fixed rate) or closed-loop "
+        "(fixed concurrency) mode, then watches notification states to report end-to-end completion latency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", default="http://127.0.0.1:8000/core/send-notification/",
+            help="Ingestion endpoint (default: http://127.0.0.1:8000/core/send-notification/).")
+        parser.add_argument("--mode", choices=("open", "closed"), default="open", help="Load model (default: open).")
+        parser.add_argument("--rps", type=float, default=50, help="Open loop: requests per second (default: 50).")
+        parser.add_argument(
+            "--max-in-flight", type=int, default=1000,
+            help="Open loop: requests due while this many are outstanding are dropped and counted (default: 1000).")
+        parser.add_argument(
+            "--concurrency", type=int, default=20, help="Closed loop: concurrent clients (default: 20).")
+        parser.add_argument("--duration", type=float, default=60, help="Seconds to generate load for (default: 60).")
+        parser.add_argument("--requests", type=int, help="Stop after this many requests instead of --duration.")
+        parser.add_argument(
+            "--systems", help="Systems and weights, e.g. 'rentals:8,payroll:1' (default: every system, Zipf-skewed).")
+        parser.add_argument(
+            "--mix", default="sms:6,email:3,push:1", help="Notification types and weights (default: sms:6,email:3,push:1).")
+        parser.add_argument(
+            "--multi-recipient-rate", type=float, default=0.1,
+            help="Fraction of notifications with several recipients (default: 0.1).")
+        parser.add_argument("--max-recipients", type=int, default=5, help="Maximum recipients (default: 5).")
+        parser.add_argument(
+            "--recipient-pool", type=int, default=100000, help="Number of distinct recipients (default: 100000).")
+        parser.add_argument("--timeout", type=float, default=10, help="HTTP request timeout (default: 10).")
+        parser.add_argument(
+            "--completion-timeout", type=float, default=120,
+            help="Seconds to keep watching for notifications to leave Pending, 0 to skip (default: 120).")
+        parser.add_argument("--poll-interval", type=float, default=2, help="State polling interval (default: 2).")
+        parser.add_argument("--output", help="Write the results as JSON to this path.")
+
+    def _traffic_mix(self, options) -> TrafficMix:
+        if options["systems"]:
+            systems = parse_weights(options["systems"], "--systems")
+            unknown = set(systems) - set(System.objects.filter(name__in=systems).values_list("name", flat=True))
+            if unknown:
+                raise CommandError(f"Unknown systems: {', '.join(sorted(unknown))}")
+        else:
+            names = list(System.objects.order_by("date_created").values_list("name", flat=True))
+            if not names:
+                raise CommandError("No systems configured")
+            # A few systems usually produce most of the traffic
+            systems = {name: 1 / rank for rank, name in enumerate(names, start=1)}
+
+        types = parse_weights(options["mix"], "--mix")
+        unknown = set(types) - set(RECIPIENT_FORMATS)
+        if unknown:
+            raise CommandError(f"Unsupported notification types: {', '.join(sorted(unknown))}")
+
+        templates = defaultdict(list)
+        for template in Template.objects.filter(
+                is_active=True, notification_type__name__in=types).select_related("notification_type"):
+            if template.notification_type.name != "email" or template.subject:
+                templates[template.notification_type.name].append(template)
+
+        return TrafficMix(
+            systems, types, templates, options["multi_recipient_rate"], options["max_recipients"],
+            options["recipient_pool"])
+
+    def handle(self, *args, **options):
+        mix = self._traffic_mix(options)
+        run_id = uuid.uuid4().hex[:8]
+        self.stdout.write(
+            f"Run {run_id}: {options['mode']} loop against {options['url']} "
+            f"({'%g rps' % options['rps'] if options['mode'] == 'open' else '%d clients' % options['concurrency']})")
+
+        load = asyncio.run(self._generate(mix, run_id, options))
+        completion = self._watch(run_id, load["accepted_at"], options)
+        results = self._summarise(run_id, load, completion, options)
+        self._print_results(results)
+
+        if options["output"]:
+            with open(options["output"], "w") as fil:
+                json.dump(results, fil, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    async def _generate(self, mix: TrafficMix, run_id: str, options) -> Dict:
+        state = {
+            "sent": 0, "accepted": 0, "rejected": 0, "http_errors": 0, "timeouts": 0, "dropped": 0,
+            "latencies": [], "accepted_at": {}, "by_system": defaultdict(lambda: defaultdict(int)),
+        }
+        deadline = time.monotonic() + options["duration"]
+        limit = options["requests"]
+        counter = iter(range(10 ** 12))
+
+        def more() -> bool:
+            return state["sent"] < limit if limit else time.monotonic() < deadline
+
+        client = httpx.AsyncClient(
+            timeout=options["timeout"],
+            limits=httpx.Limits(max_connections=max(options["concurrency"], 100), max_keepalive_connections=100))
+
+        async def send_one(index: int, scheduled: float) -> None:
+            unique_identifier = f"loadgen-{run_id}-{index}"
+            system, payload = mix.payload(unique_identifier)
+            state["sent"] += 1
+            state["by_system"][system]["sent"] += 1
+            wall_started = time.time()
+            try:
+                response = await client.post(options["url"], json=payload)
+                # Open-loop latency counts from when the request was due, so a stalled server is not hidden
+                state["latencies"].append(time.monotonic() - scheduled)
+                if response.status_code >= 400:
+                    state["http_errors"] += 1
+                elif response.json().get("code") == "100.000.000":
+                    state["accepted"] += 1
+                    state["by_system"][system]["accepted"] += 1
+                    state["accepted_at"][unique_identifier] = wall_started
+                else:
+                    state["rejected"] += 1
+            except httpx.TimeoutException:
+                state["timeouts"] += 1
+            except (httpx.HTTPError, ValueError):
+                state["http_errors"] += 1
+
+        started = time.monotonic()
+        try:
+            if options["mode"] == "open":
+                in_flight = set()
+                interval = 1 / options["rps"]
+                index = 0
+                while more():
+                    scheduled = started + index * interval
+                    index += 1
+                    delay = scheduled - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    if len(in_flight) >= options["max_in_flight"]:
+                        state["dropped"] += 1
+                        continue
+                    task = asyncio.create_task(send_one(next(counter), scheduled))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                await asyncio.gather(*in_flight)
+            else:
+                async def client_loop() -> None:
+                    while more():
+                        await send_one(next(counter), time.monotonic())
+
+                await asyncio.gather(*(client_loop() for _ in range(options["concurrency"])))
+        finally:
+            await client.aclose()
+
+        state["elapsed"] = time.monotonic() - started
+        return state
+
+    def _watch(self, run_id: str, accepted_at: Dict[str, float], options) -> Dict:
+        """
+        Polls notification states until every accepted notification has left Pending or the timeout expires.
+        """
+        completed: Dict[str, Tuple[str, float]] = {}
+        deadline = time.monotonic() + options["completion_timeout"]
+        prefix = f"loadgen-{run_id}-"
+        while options["completion_timeout"] and len(completed) < len(accepted_at):
+            rows = Notification.objects.filter(
+                unique_identifier__startswith=prefix, status__name__in=TERMINAL_STATES
+            ).values_list("unique_identifier", "status__name", "date_modified")
+            for unique_identifier, status, date_modified in rows.iterator(chunk_size=2000):
+                # The first observed terminal state counts; later updates (e.g. delivery reports) are ignored
+                if unique_identifier in accepted_at and unique_identifier not in completed:
+                    completed[unique_identifier] = (status, date_modified.timestamp() - accepted_at[unique_identifier])
+            if time.monotonic() >= deadline:
+                break
+            self.stdout.write(f"{len(completed)}/{len(accepted_at)} notifications completed")
+            time.sleep(options["poll_interval"])
+        return completed
+
+    @staticmethod
+    def _latency_summary(values: List[float]) -> Optional[Dict[str, float]]:
+        if not values:
+            return None
+        values = sorted(values)
+        return {
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1),
+        }
+
+    def _summarise(self, run_id: str, load: Dict, completion: Dict, options) -> Dict:
+        statuses = defaultdict(int)
+        for status, _ in completion.values():
+            statuses[status] += 1
+        errors = load["rejected"] + load["http_errors"] + load["timeouts"]
+        return {
+            "run_id": run_id,
+            "mode": options["mode"],
+            "target_rps": options["rps"] if options["mode"] == "open" else None,
+            "concurrency": options["concurrency"] if options["mode"] == "closed" else None,
+            "duration_s": round(load["elapsed"], 2),
+            "sent": load["sent"],
+            "accepted": load["accepted"],
+            "rejected": load["rejected"],
+            "http_errors": load["http_errors"],
+            "timeouts": load["timeouts"],
+            "dropped": load["dropped"],
+            "accepted_per_sec": round(load["accepted"] / load["elapsed"], 2) if load["elapsed"] else 0,
+            "error_rate": round(errors / load["sent"], 4) if load["sent"] else 0,
+            "ingestion_latency": self._latency_summary(load["latencies"]),
+            "completed": len(completion),
+            "incomplete": load["accepted"] - len(completion),
+            "completion_statuses": dict(statuses),
+            "completion_latency": self._latency_summary([max(latency, 0) for _, latency in completion.values()]),
+            "by_system": {system: dict(counts) for system, counts in sorted(load["by_system"].items())},
+        }
+
+    def _print_results(self, results: Dict) -> None:
+        self.stdout.write(
+            f"Sent {results['sent']} in {results['duration_s']}s: {results['accepted']} accepted "
+            f"({results['accepted_per_sec']}/s), {results['rejected']} rejected, {results['http_errors']} HTTP errors, "
+            f"{results['timeouts']} timeouts, {results['dropped']} dropped; error rate {results['error_rate']:.2%}")
+        for label, key in (("Ingestion latency", "ingestion_latency"), ("Completion latency", "completion_latency")):
+            summary = results[key]
+            if summary:
+                self.stdout.write(
+                    f"{label}: p50 {summary['p50_ms']}ms, p95 {summary['p95_ms']}ms, p99 {summary['p99_ms']}ms, "
+                    f"max {summary['max_ms']}ms")
+        self.stdout.write(
+            f"Completed {results['completed']} ({', '.join(f'{k}={v}' for k, v in results['completion_statuses'].items())}), "
+            f"{results['incomplete']} still pending")
+        for system, counts in results["by_system"].items():
+            self.stdout.write(f"  {system}: {counts.get('accepted', 0)}/{counts.get('sent', 0)} accepted")
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import DeviceToken
+
+
+class Command(BaseCommand):
+    help = "Deletes device tokens that were marked invalid by the push provider more than a given number of days ago."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days", type=int, default=90,
+            help="Only delete tokens invalidated at least this many days ago (default: 90).")
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Number of rows deleted per query (default: 5000).")
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report how many tokens would be deleted without deleting them.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["older_than_days"])
+        queryset = DeviceToken.objects.filter(is_valid=False, invalidated_at__lt=cutoff)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{queryset.count()} invalid device tokens would be deleted")
+            return
+
+        deleted = 0
+        while True:
+            batch = list(queryset.values_list("id", flat=True)[:options["batch_size"]])
+            if not batch:
+                break
+            count, _ = DeviceToken.objects.filter(id__in=batch).delete()
+            deleted += count
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} invalid device tokens"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.backend.async_delivery_worker import AsyncDeliveryWorker
+
+
+class Command(BaseCommand):
+    help = "Runs the asyncio delivery worker, which keeps many provider sends in flight in a single process."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", default=None, help="Queue to consume (default: the Celery default queue).")
+        parser.add_argument(
+            "--concurrency", type=int, default=500, help="Maximum in-flight notifications (default: 500).")
+        parser.add_argument(
+            "--provider-concurrency", type=int, default=50,
+            help="Maximum in-flight sends per provider unless its config sets max_concurrency (default: 50).")
+        parser.add_argument(
+            "--db-threads", type=int, default=20, help="Threads used for database work (default: 20).")
+
+    def handle(self, *args, **options):
+        AsyncDeliveryWorker(
+            queue_name=options["queue"],
+            concurrency=options["concurrency"],
+            provider_concurrency=options["provider_concurrency"],
+            db_threads=options["db_threads"],
+        ).run()
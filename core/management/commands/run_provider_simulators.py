@@ -0,0 +1,144 @@
+import asyncio
+import json
+import signal
+import ssl
+import tempfile
+
+import uvicorn
+from django.core.management.base import BaseCommand, CommandError
+
+from core.backend.provider_simulators import SimulatorBehaviour, SimulatorStats, SMTPSink, SMSGatewaySimulator, \
+    FCMSimulator, generate_self_signed_certificate, generate_fcm_provider_config
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs local stand-ins for the email, SMS and push gateways (an SMTP sink, a Belio/Africa's Talking "
+        "SMS gateway and the FCM HTTP v1 API) for load tests and benchmarks.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: 127.0.0.1).")
+        parser.add_argument("--smtp-port", type=int, default=2525, help="SMTP sink port, 0 to disable (default: 2525).")
+        parser.add_argument("--sms-port", type=int, default=8025, help="SMS gateway port, 0 to disable (default: 8025).")
+        parser.add_argument("--fcm-port", type=int, default=8026, help="FCM API port, 0 to disable (default: 8026).")
+        parser.add_argument("--latency-ms", type=float, default=50, help="Mean response latency (default: 50).")
+        parser.add_argument("--jitter-ms", type=float, default=20, help="Latency jitter (default: 20).")
+        parser.add_argument(
+            "--error-rate", type=float, default=0, help="Fraction of messages rejected with an error (default: 0).")
+        parser.add_argument(
+            "--max-rps", type=float, default=0,
+            help="Requests per second per simulator above which HTTP 429 / SMTP 421 is returned (default: unlimited).")
+        parser.add_argument(
+            "--dlr-delay-ms", type=float, default=1000, help="Delay before Belio delivery reports (default: 1000).")
+        parser.add_argument(
+            "--dlr-failure-rate", type=float, default=0,
+            help="Fraction of Belio delivery reports that are DeliveryImpossible (default: 0).")
+        parser.add_argument(
+            "--invalid-token-rate", type=float, default=0,
+            help="Fraction of push tokens reported UNREGISTERED (default: 0).")
+        parser.add_argument("--no-starttls", action="store_true", help="Do not offer STARTTLS on the SMTP sink.")
+        parser.add_argument(
+            "--tls-cert", help="Certificate for STARTTLS (default: a generated self-signed certificate).")
+        parser.add_argument("--tls-key", help="Key for --tls-cert.")
+        parser.add_argument(
+            "--smtp-auth", help="Require these credentials as user:password (default: accept any credentials).")
+        parser.add_argument(
+            "--stats-interval", type=float, default=10, help="Seconds between stats lines, 0 to disable (default: 10).")
+        parser.add_argument(
+            "--print-configs", action="store_true", help="Print provider configs pointing at the simulators.")
+
+    def _behaviour(self, options) -> SimulatorBehaviour:
+        return SimulatorBehaviour(
+            latency_ms=options["latency_ms"], jitter_ms=options["jitter_ms"], error_rate=options["error_rate"],
+            max_rps=options["max_rps"])
+
+    def _ssl_context(self, options):
+        if options["no_starttls"]:
+            return None
+        cert, key = options["tls_cert"], options["tls_key"]
+        if bool(cert) != bool(key):
+            raise CommandError("--tls-cert and --tls-key must be given together")
+        if not cert:
+            cert, key = generate_self_signed_certificate(tempfile.mkdtemp(prefix="notify-simulators-"))
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert, key)
+        return context
+
+    def _print_configs(self, options) -> None:
+        host = options["host"]
+        configs = {}
+        if options["smtp_port"]:
+            username, _, password = (options["smtp_auth"] or "simulator@example.com:simulator").partition(":")
+            configs["GmailSMTPServer"] = {
+                "host": host, "port": options["smtp_port"], "sender": username, "password": password,
+                "starttls": not options["no_starttls"], "validate_certs": False,
+            }
+        if options["sms_port"]:
+            base_url = f"http://{host}:{options['sms_port']}"
+            configs["BelioSMSProvider"] = {
+                "api_key": "simulator", "cookie": "simulator", "url": f"{base_url}/belio/sms",
+                "default_sms_service_id": "1", "callback_url": "http://127.0.0.1:8000/core/belio-sms-callback/",
+            }
+            configs["AfricasTalkingSMSProvider"] = {"username": "simulator", "api_key": "simulator", "base_url": base_url}
+        if options["fcm_port"]:
+            configs["FirebasePushProvider"] = generate_fcm_provider_config(f"http://{host}:{options['fcm_port']}")
+        self.stdout.write(json.dumps(configs, indent=2))
+
+    def handle(self, *args, **options):
+        if options["print_configs"]:
+            self._print_configs(options)
+        asyncio.run(self._serve(options))
+
+    async def _serve(self, options) -> None:
+        stats = SimulatorStats()
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopping.set)
+
+        servers, tasks = [], []
+        if options["smtp_port"]:
+            credentials = None
+            if options["smtp_auth"]:
+                username, _, password = options["smtp_auth"].partition(":")
+                credentials = (username, password)
+            sink = SMTPSink(self._behaviour(options), stats, self._ssl_context(options), credentials)
+            servers.append(await sink.start(options["host"], options["smtp_port"]))
+            self.stdout.write(f"SMTP sink listening on {options['host']}:{options['smtp_port']}")
+
+        apps = []
+        if options["sms_port"]:
+            apps.append((options["sms_port"], SMSGatewaySimulator(
+                self._behaviour(options), stats, dlr_delay_ms=options["dlr_delay_ms"],
+                dlr_failure_rate=options["dlr_failure_rate"])))
+        if options["fcm_port"]:
+            apps.append((options["fcm_port"], FCMSimulator(
+                self._behaviour(options), stats, invalid_token_rate=options["invalid_token_rate"])))
+
+        http_servers = []
+        for port, app in apps:
+            server = uvicorn.Server(uvicorn.Config(
+                app, host=options["host"], port=port, lifespan="off", log_level="warning", access_log=False))
+            # Signals are handled here so every simulator shuts down together
+            server.install_signal_handlers = lambda: None
+            http_servers.append(server)
+            tasks.append(asyncio.create_task(server.serve()))
+            self.stdout.write(f"{type(app).__name__} listening on http://{options['host']}:{port} (GET /stats)")
+
+        if options["stats_interval"]:
+            tasks.append(asyncio.create_task(self._report(stats, options["stats_interval"], stopping)))
+
+        await stopping.wait()
+        for server in http_servers:
+            server.should_exit = True
+        for server in servers:
+            server.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.stdout.write(json.dumps(stats.snapshot(), indent=2))
+
+    async def _report(self, stats: SimulatorStats, interval: float, stopping: asyncio.Event) -> None:
+        while not stopping.is_set():
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                self.stdout.write(json.dumps(stats.snapshot()))
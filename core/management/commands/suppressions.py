@@ -0,0 +1,107 @@
+import csv
+import sys
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.backend.services import SuppressionService
+from core.models import Suppression, System
+
+REASONS = [reason for reason, _ in Suppression.REASONS]
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports recipients into a suppression list, or exports a suppression list, as CSV. Import files are "
+        "read as a stream, either with a 'recipient' column (and optionally a 'reason' column) or with one "
+        "recipient per line.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=("import", "export"))
+        parser.add_argument("path", nargs="?", default="-", help="File to read or write; '-' for stdin/stdout.")
+        parser.add_argument(
+            "--system", help="System whose list to import into or export; the global list if omitted.")
+        parser.add_argument(
+            "--all", action="store_true", help="Export every list, with a 'system' column (export only).")
+        parser.add_argument(
+            "--reason", choices=REASONS, default=Suppression.REASON_MANUAL,
+            help="Reason recorded for imported rows without one (default: manual).")
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Number of rows inserted per query (default: 5000).")
+
+    @staticmethod
+    def _system(name: Optional[str]) -> Optional[System]:
+        if not name:
+            return None
+        system = System.objects.filter(name=name.lower()).first()
+        if system is None:
+            raise CommandError(f"Unknown system: {name}")
+        return system
+
+    @staticmethod
+    def _rows(fil, default_reason: str) -> Iterator[Tuple[str, str]]:
+        reader = csv.reader(fil)
+        first = next(reader, None)
+        if first is None:
+            return
+        header = [column.strip().lower() for column in first]
+        if "recipient" in header:
+            recipient_column = header.index("recipient")
+            reason_column = header.index("reason") if "reason" in header else None
+        else:
+            recipient_column, reason_column = 0, None
+            reader = chain([first], reader)
+        for row in reader:
+            if len(row) <= recipient_column or not row[recipient_column].strip():
+                continue
+            reason = row[reason_column].strip() if reason_column is not None and len(row) > reason_column else ""
+            yield row[recipient_column], reason if reason in REASONS else default_reason
+
+    def _import(self, fil, system: Optional[System], options) -> None:
+        service, imported = SuppressionService(), 0
+        batch: Dict[str, List[str]] = {}
+        for recipient, reason in self._rows(fil, options["reason"]):
+            batch.setdefault(reason, []).append(recipient)
+            if sum(len(recipients) for recipients in batch.values()) >= options["batch_size"]:
+                imported += sum(service.add(system, recipients, reason) for reason, recipients in batch.items())
+                batch = {}
+        imported += sum(service.add(system, recipients, reason) for reason, recipients in batch.items())
+        self.stderr.write(self.style.SUCCESS(
+            f"Imported {imported} recipients into the {system.name if system else 'global'} suppression list "
+            f"(recipients already on it are kept as they were)"))
+
+    def _export(self, fil, system: Optional[System], options) -> None:
+        queryset = Suppression.objects.order_by()
+        columns = ["recipient", "reason", "date_created"]
+        if options["all"]:
+            columns.insert(0, "system")
+            queryset = queryset.select_related("system")
+        else:
+            queryset = queryset.filter(system=system)
+
+        writer = csv.writer(fil)
+        writer.writerow(columns)
+        exported = 0
+        for suppression in queryset.iterator(chunk_size=5000):
+            row = [suppression.recipient, suppression.reason, suppression.date_created.isoformat()]
+            if options["all"]:
+                row.insert(0, suppression.system.name if suppression.system_id else "")
+            writer.writerow(row)
+            exported += 1
+        self.stderr.write(self.style.SUCCESS(f"Exported {exported} suppressed recipients"))
+
+    def handle(self, *args, **options):
+        system = self._system(options["system"])
+        action, path = options["action"], options["path"]
+        if action == "import":
+            if path == "-":
+                self._import(sys.stdin, system, options)
+            else:
+                with open(path, newline="", encoding="utf-8-sig") as fil:
+                    self._import(fil, system, options)
+        elif path == "-":
+            self._export(self.stdout, system, options)
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as fil:
+                self._export(fil, system, options)
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-19 05:29
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_system_callback_type_system_queue_name_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceToken',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('token', models.TextField()),
+                ('token_hash', models.CharField(editable=False, max_length=64, unique=True)),
+                ('is_valid', models.BooleanField(default=True)),
+                ('invalid_reason', models.CharField(blank=True, choices=[('UNREGISTERED', 'Unregistered'), ('INVALID_ARGUMENT', 'Invalid argument')], max_length=50)),
+                ('invalidated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ('-date_created',),
+                'indexes': [models.Index(fields=['is_valid', 'invalidated_at'], name='core_device_is_vali_e51fce_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-19 06:00
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_notification_lifecycle_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Campaign',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=255)),
+                ('context', models.JSONField(blank=True, default=dict, help_text='Context shared by every recipient')),
+                ('source', models.FileField(upload_to='campaigns/')),
+                ('source_format', models.CharField(choices=[('csv', 'CSV'), ('ndjson', 'NDJSON')], max_length=10)),
+                ('send_rate', models.PositiveIntegerField(blank=True, help_text='Notifications per second', null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('paused', 'Paused'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('run_token', models.UUIDField(blank=True, editable=False, null=True)),
+                ('source_offset', models.BigIntegerField(default=0)),
+                ('rows_read', models.PositiveIntegerField(default=0)),
+                ('rows_rejected', models.PositiveIntegerField(default=0)),
+                ('notifications_created', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('notification_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.notificationtype')),
+                ('organisation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.organisation')),
+                ('system', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.system')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='core.template')),
+            ],
+            options={
+                'ordering': ('-date_created',),
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='campaign',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.campaign'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-19 06:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_campaign'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, help_text='When the scheduler queued delivery', null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='send_at',
+            field=models.DateTimeField(blank=True, help_text='Deliver no earlier than this time', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('processing_started_at__isnull', True), ('send_at__isnull', False)), fields=['send_at'], name='notification_due_idx'),
+        ),
+    ]
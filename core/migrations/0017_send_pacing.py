@@ -0,0 +1,47 @@
+# Generated by Django 5.1.7 on 2026-10-19 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_notification_send_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='paced_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='paced',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='organisation',
+            name='max_send_rate',
+            field=models.PositiveIntegerField(blank=True, help_text='Maximum notifications sent per second; empty for no limit', null=True),
+        ),
+        migrations.AddField(
+            model_name='organisation',
+            name='paced_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='system',
+            name='max_send_rate',
+            field=models.PositiveIntegerField(blank=True, help_text='Maximum notifications sent per second; empty for no limit', null=True),
+        ),
+        migrations.AddField(
+            model_name='system',
+            name='paced_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('paced', True), ('processing_started_at__isnull', True)), fields=['system', 'date_created'], name='notification_backlog_idx'),
+        ),
+    ]
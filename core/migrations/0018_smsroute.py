@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-19 06:10
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_send_pacing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SMSRoute',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('prefix', models.CharField(help_text="Leading digits of the number, with country code and no '+'", max_length=15)),
+                ('priority', models.IntegerField(default=0)),
+                ('description', models.CharField(blank=True, max_length=100, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.provider')),
+            ],
+            options={
+                'ordering': ('prefix', 'priority'),
+                'unique_together': {('prefix', 'provider')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-19 06:12
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_smsroute'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Suppression',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('recipient', models.CharField(max_length=255)),
+                ('recipient_hash', models.BigIntegerField(editable=False)),
+                ('reason', models.CharField(choices=[('opt_out', 'Opted out'), ('hard_bounce', 'Hard bounce'), ('delivery_failure', 'Delivery failure'), ('manual', 'Added manually')], default='manual', max_length=30)),
+                ('system', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.system')),
+            ],
+            options={
+                'ordering': ('-date_created',),
+                'indexes': [models.Index(fields=['date_created'], name='core_suppre_date_cr_538eab_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('system__isnull', False)), fields=('system', 'recipient'), name='suppression_system_recipient_unique'), models.UniqueConstraint(condition=models.Q(('system__isnull', True)), fields=('recipient',), name='suppression_global_recipient_unique')],
+            },
+        ),
+    ]
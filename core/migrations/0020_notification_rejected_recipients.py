@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_suppression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='rejected_recipients',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
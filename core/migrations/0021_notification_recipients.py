@@ -0,0 +1,48 @@
+# Generated by Django 5.1.7 on 2026-10-19 06:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_notification_rejected_recipients'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='failed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='recipient_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='sent_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='NotificationRecipient',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('recipient', models.CharField(max_length=255)),
+                ('provider_message_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Confirmation Pending'), (2, 'Sent'), (3, 'Failed')])),
+                ('error', models.CharField(blank=True, max_length=100)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('notification', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='core.notification')),
+            ],
+            options={
+                'ordering': ('-date_created',),
+                'indexes': [models.Index(fields=['recipient', '-date_created'], name='notification_recipient_idx')],
+                'constraints': [models.UniqueConstraint(fields=('notification', 'recipient'), name='notification_recipient_unique')],
+            },
+        ),
+    ]
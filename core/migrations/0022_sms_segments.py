@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-19 06:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_notification_recipients'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='provider',
+            name='cost_per_segment',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text='Price of one SMS segment; cheaper providers are tried first', max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='smsroute',
+            name='cost_per_segment',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text="Price of one segment to numbers on this route; the provider's price if empty", max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='system',
+            name='max_sms_segments',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Most segments one SMS may be sent as; SMS_MAX_SEGMENTS if empty', null=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-19 06:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_sms_segments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='coalesce_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='coalesced_count',
+            field=models.PositiveIntegerField(default=0, help_text='Notifications merged into this digest'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='coalesced_into',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='coalesced', to='core.notification'),
+        ),
+        migrations.AddField(
+            model_name='system',
+            name='coalesce_window',
+            field=models.PositiveIntegerField(blank=True, help_text='Seconds over which notifications to the same recipient and template are merged into one digest; empty not to merge them', null=True),
+        ),
+        migrations.AddField(
+            model_name='template',
+            name='coalesce_window',
+            field=models.PositiveIntegerField(blank=True, help_text="Seconds over which notifications to the same recipient are merged into one digest; the system's window if empty, and 0 not to merge them", null=True),
+        ),
+        migrations.AddField(
+            model_name='template',
+            name='digest_body',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='template',
+            name='digest_subject',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('coalesce_key__isnull', False), ('processing_started_at__isnull', True)), fields=['coalesce_key', 'send_at'], name='notification_coalesce_idx'),
+        ),
+    ]
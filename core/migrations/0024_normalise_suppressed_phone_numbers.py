@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def normalise_phone_numbers(apps, schema_editor):
+    # Suppressed phone numbers were stored with only their non-digits removed, so local numbers never
+    # matched the E.164 numbers sent to; rewrite them in that form, dropping entries that become duplicates
+    from core.models import Suppression as CurrentSuppression
+
+    Suppression = apps.get_model('core', 'Suppression')
+    for suppression in Suppression.objects.exclude(recipient__contains='@').order_by().iterator():
+        recipient = CurrentSuppression.normalise_recipient(suppression.recipient)
+        if recipient == suppression.recipient:
+            continue
+        entries = Suppression.objects.filter(pk=suppression.pk)
+        if Suppression.objects.filter(system_id=suppression.system_id, recipient=recipient).exists():
+            entries.delete()
+        else:
+            entries.update(recipient=recipient, recipient_hash=CurrentSuppression.hash_recipient(recipient))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_coalescing'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalise_phone_numbers, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
+import hashlib
 import uuid
 
 from django.db import models
 
+from core.backend.recipient_normaliser import normalise_phone_numbers
+
 class BaseModel(models.Model):
     id = models.UUIDField(max_length=100, default=uuid.uuid4, unique=True, editable=False, primary_key=True)
     date_created = models.DateTimeField(auto_now_add=True)
@@ -19,6 +22,9 @@ class GenericBaseModel(BaseModel):
         abstract = True
 
 class State(GenericBaseModel):
+    # States are fixed reference rows, so each process looks every one up only once
+    _cache = {}
+
     def __str__(self):
         return self.name
 
@@ -26,19 +32,49 @@ class State(GenericBaseModel):
         ordering = ('-date_created',)
 
     @classmethod
-    def sent(cls):
-        state, created = cls.objects.get_or_create(name='Sent')
+    def get_cached(cls, name):
+        state = cls._cache.get(name)
+        if state is None:
+            # One query fills the cache with every state, so a cold process pays for a single lookup
+            cls._cache.update({state.name: state for state in cls.objects.all()})
+            state = cls._cache.get(name)
+        if state is None:
+            state, created = cls.objects.get_or_create(name=name)
+            cls._cache[name] = state
         return state
 
+    @classmethod
+    def clear_cache(cls):
+        cls._cache.clear()
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.clear_cache()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.clear_cache()
+        return result
+
+    @classmethod
+    def pending(cls):
+        return cls.get_cached('Pending')
+
+    @classmethod
+    def sent(cls):
+        return cls.get_cached('Sent')
+
     @classmethod
     def failed(cls):
-        state, created = cls.objects.get_or_create(name='Failed')
-        return state
+        return cls.get_cached('Failed')
 
     @classmethod
     def confirmation_pending(cls):
-        state, created = cls.objects.get_or_create(name='Confirmation Pending')
-        return state
+        return cls.get_cached('Confirmation Pending')
+
+    @classmethod
+    def coalesced(cls):
+        return cls.get_cached('Coalesced')
 
 class NotificationType(GenericBaseModel):
     def __str__(self):
@@ -65,6 +101,16 @@ class System(GenericBaseModel):
     webhook_url = models.URLField(blank=True, null=True)
     webhook_auth_token = models.CharField(max_length=255, blank=True, null=True)
     queue_name = models.CharField(max_length=255, blank=True, null=True)
+    max_send_rate = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Maximum notifications sent per second; empty for no limit")
+    # Earliest time the pacer may release this system's next notification
+    paced_until = models.DateTimeField(null=True, blank=True, editable=False)
+    max_sms_segments = models.PositiveSmallIntegerField(
+        null=True, blank=True, help_text="Most segments one SMS may be sent as; SMS_MAX_SEGMENTS if empty")
+    coalesce_window = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Seconds over which notifications to the same recipient and template are merged into one "
+                  "digest; empty not to merge them")
 
     def __str__(self):
         return self.name
@@ -74,6 +120,10 @@ class System(GenericBaseModel):
 
 class Organisation(GenericBaseModel):
     system = models.ForeignKey(System, on_delete=models.CASCADE)
+    max_send_rate = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Maximum notifications sent per second; empty for no limit")
+    # Earliest time the pacer may release this organisation's next notification
+    paced_until = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return "%s - %s" % (self.system.name, self.name)
@@ -86,6 +136,14 @@ class Template(GenericBaseModel):
     notification_type = models.ForeignKey(NotificationType, on_delete=models.CASCADE)
     subject = models.CharField(max_length=255, blank=True)
     body = models.TextField()
+    # Rendered instead of subject and body, with the merged notifications' contexts as a list, when
+    # notifications are coalesced into a digest; templates without a digest body are never coalesced
+    digest_subject = models.CharField(max_length=255, blank=True)
+    digest_body = models.TextField(blank=True)
+    coalesce_window = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Seconds over which notifications to the same recipient are merged into one digest; the "
+                  "system's window if empty, and 0 not to merge them")
     is_active = models.BooleanField(default=True)
 
     def __str__(self):
@@ -100,6 +158,9 @@ class Provider(GenericBaseModel):
     config = models.JSONField()
     is_active = models.BooleanField(default=True)
     class_name = models.CharField(max_length=100,  help_text="Callback class containing its config")
+    cost_per_segment = models.DecimalField(
+        max_digits=10, decimal_places=4, null=True, blank=True,
+        help_text="Price of one SMS segment; cheaper providers are tried first")
 
     def __str__(self):
         return self.name
@@ -107,21 +168,263 @@ class Provider(GenericBaseModel):
     class Meta:
         ordering = ('-date_created',)
 
+class SMSRoute(BaseModel):
+    """
+    Sends SMS to numbers starting with a prefix (a country code or an operator's range) through a provider.
+
+    Routes sharing a prefix are tried in priority order, and the longest prefix matching a number wins.
+    """
+    prefix = models.CharField(max_length=15, help_text="Leading digits of the number, with country code and no '+'")
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE)
+    priority = models.IntegerField(default=0)
+    cost_per_segment = models.DecimalField(
+        max_digits=10, decimal_places=4, null=True, blank=True,
+        help_text="Price of one segment to numbers on this route; the provider's price if empty")
+    description = models.CharField(max_length=100, null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return "%s -> %s" % (self.prefix, self.provider.name)
+
+    class Meta:
+        ordering = ('prefix', 'priority')
+        unique_together = ('prefix', 'provider')
+
+class Campaign(BaseModel):
+    """
+    One template sent to every recipient listed in an uploaded CSV or NDJSON file.
+    """
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_PAUSED = "paused"
+    STATUS_COMPLETED = "completed"
+    STATUS_CANCELLED = "cancelled"
+    STATUS_FAILED = "failed"
+    STATUSES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_PAUSED, "Paused"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_CANCELLED, "Cancelled"),
+        (STATUS_FAILED, "Failed"),
+    ]
+    SOURCE_FORMATS = [
+        ("csv", "CSV"),
+        ("ndjson", "NDJSON"),
+    ]
+
+    name = models.CharField(max_length=255)
+    system = models.ForeignKey(System, on_delete=models.CASCADE)
+    organisation = models.ForeignKey(Organisation, null=True, blank=True, on_delete=models.CASCADE)
+    notification_type = models.ForeignKey(NotificationType, on_delete=models.CASCADE)
+    template = models.ForeignKey(Template, on_delete=models.PROTECT)
+    context = models.JSONField(default=dict, blank=True, help_text="Context shared by every recipient")
+    source = models.FileField(upload_to="campaigns/")
+    source_format = models.CharField(max_length=10, choices=SOURCE_FORMATS)
+    send_rate = models.PositiveIntegerField(null=True, blank=True, help_text="Notifications per second")
+    status = models.CharField(max_length=20, choices=STATUSES, default=STATUS_PENDING)
+    # Identifies the current chain of processing ticks; resuming starts a new one and retires the old
+    run_token = models.UUIDField(null=True, blank=True, editable=False)
+    # Byte offset of the next unread row, so processing resumes where it stopped
+    source_offset = models.BigIntegerField(default=0)
+    rows_read = models.PositiveIntegerField(default=0)
+    rows_rejected = models.PositiveIntegerField(default=0)
+    notifications_created = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Earliest time the pacer may release this campaign's next notification
+    paced_until = models.DateTimeField(null=True, blank=True, editable=False)
+
+    def __str__(self):
+        return "%s campaign %s" % (self.system.name, self.name)
+
+    class Meta:
+        ordering = ('-date_created',)
+
+
 class Notification(BaseModel):
     unique_identifier = models.CharField(max_length=255, null=True, blank=True)
     system = models.ForeignKey(System, on_delete=models.CASCADE)
     organisation = models.ForeignKey(Organisation, null=True, blank=True, on_delete=models.CASCADE)
     notification_type = models.ForeignKey(NotificationType, on_delete=models.CASCADE)
     recipients = models.JSONField(default=list)
+    # Recipients dropped at ingestion as invalid, mapped to the reason; reported back in the callback
+    rejected_recipients = models.JSONField(default=dict, blank=True)
     template = models.ForeignKey(Template, null=True, on_delete=models.SET_NULL)
     provider = models.ForeignKey(Provider, null=True, on_delete=models.SET_NULL)
     context = models.JSONField()
     sent_time = models.DateTimeField(null=True)
     status = models.ForeignKey(State, on_delete=models.CASCADE)
+    queued_at = models.DateTimeField(null=True, blank=True)
+    processing_started_at = models.DateTimeField(null=True, blank=True)
+    provider_request_ms = models.PositiveIntegerField(null=True, blank=True)
+    attempt_count = models.PositiveSmallIntegerField(default=0)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    campaign = models.ForeignKey(Campaign, null=True, blank=True, on_delete=models.SET_NULL)
+    send_at = models.DateTimeField(null=True, blank=True, help_text="Deliver no earlier than this time")
+    dispatched_at = models.DateTimeField(null=True, blank=True, help_text="When the scheduler queued delivery")
+    # Held back and released by the send pacer at its system, organisation and campaign send rates
+    paced = models.BooleanField(default=False)
+    # Aggregate of the per-recipient deliveries, kept up to date as delivery reports arrive
+    recipient_count = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    # Notifications to the same recipient and template in the same coalescing window share a key and a send_at;
+    # the first one claimed for delivery sends a digest of all of them, and the others point to it
+    coalesce_key = models.CharField(max_length=64, null=True, blank=True)
+    coalesced_into = models.ForeignKey(
+        'self', null=True, blank=True, on_delete=models.SET_NULL, related_name='coalesced')
+    coalesced_count = models.PositiveIntegerField(default=0, help_text="Notifications merged into this digest")
 
     def __str__(self):
         return "%s %s notification to %s" %(self.system.name, self.notification_type.name, self.recipients)
 
     class Meta:
         ordering = ('-date_created',)
+        indexes = [
+            # Only scheduled notifications no worker has picked up yet, which is what the dispatcher scans
+            models.Index(
+                fields=['send_at'], name='notification_due_idx',
+                condition=models.Q(send_at__isnull=False, processing_started_at__isnull=True)),
+            # The paced backlog, which the pacer reads per system in arrival order
+            models.Index(
+                fields=['system', 'date_created'], name='notification_backlog_idx',
+                condition=models.Q(paced=True, processing_started_at__isnull=True)),
+            # Coalesced notifications still waiting for their window to close
+            models.Index(
+                fields=['coalesce_key', 'send_at'], name='notification_coalesce_idx',
+                condition=models.Q(coalesce_key__isnull=False, processing_started_at__isnull=True)),
+        ]
+
+
+class NotificationRecipient(models.Model):
+    """
+    Delivery of a notification to one of its recipients, with the provider's message id.
+
+    One row per recipient, so it is kept compact: an integer key and status codes rather than a UUID key
+    and a State foreign key, and no separate index on the notification (the unique constraint covers it).
+    """
+    STATUS_CONFIRMATION_PENDING = 1
+    STATUS_SENT = 2
+    STATUS_FAILED = 3
+    STATUSES = [
+        (STATUS_CONFIRMATION_PENDING, "Confirmation Pending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    notification = models.ForeignKey(
+        Notification, on_delete=models.CASCADE, related_name='deliveries', db_index=False)
+    recipient = models.CharField(max_length=255)
+    provider_message_id = models.CharField(max_length=100, null=True, blank=True)
+    status = models.PositiveSmallIntegerField(choices=STATUSES)
+    error = models.CharField(max_length=100, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "%s - %s" % (self.recipient, self.get_status_display())
+
+    class Meta:
+        ordering = ('-date_created',)
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'recipient'], name='notification_recipient_unique'),
+        ]
+        indexes = [
+            # A recipient's delivery history, newest first
+            models.Index(fields=['recipient', '-date_created'], name='notification_recipient_idx'),
+        ]
+
 
+class Suppression(BaseModel):
+    """
+    A recipient (phone number or email address) that must not be sent to, for one system or, without a
+    system, for every system.
+    """
+    REASON_OPT_OUT = "opt_out"
+    REASON_HARD_BOUNCE = "hard_bounce"
+    REASON_DELIVERY_FAILURE = "delivery_failure"
+    REASON_MANUAL = "manual"
+    REASONS = [
+        (REASON_OPT_OUT, "Opted out"),
+        (REASON_HARD_BOUNCE, "Hard bounce"),
+        (REASON_DELIVERY_FAILURE, "Delivery failure"),
+        (REASON_MANUAL, "Added manually"),
+    ]
+
+    system = models.ForeignKey(System, null=True, blank=True, on_delete=models.CASCADE)
+    recipient = models.CharField(max_length=255)
+    recipient_hash = models.BigIntegerField(editable=False)
+    reason = models.CharField(max_length=30, choices=REASONS, default=REASON_MANUAL)
+
+    def __str__(self):
+        return self.recipient
+
+    @staticmethod
+    def normalise_recipient(recipient):
+        # Phone numbers take the E.164 form recipients are sent to, so a list imported with local numbers
+        # matches; numbers that form rejects keep just their digits
+        recipient = str(recipient).strip()
+        if "@" in recipient:
+            return recipient.lower()
+        numbers = normalise_phone_numbers([recipient]).valid
+        if numbers:
+            return numbers[0]
+        return "".join(character for character in recipient.removeprefix("tel:") if character.isdigit())
+
+    @staticmethod
+    def hash_recipient(recipient):
+        # Signed 64-bit hash of the normalised recipient, kept in memory to check recipients cheaply
+        return int.from_bytes(hashlib.blake2b(recipient.encode(), digest_size=8).digest(), "big", signed=True)
+
+    def save(self, *args, **kwargs):
+        self.recipient = self.normalise_recipient(self.recipient)
+        self.recipient_hash = self.hash_recipient(self.recipient)
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ('-date_created',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['system', 'recipient'], condition=models.Q(system__isnull=False),
+                name='suppression_system_recipient_unique'),
+            models.UniqueConstraint(
+                fields=['recipient'], condition=models.Q(system__isnull=True), name='suppression_global_recipient_unique'),
+        ]
+        indexes = [
+            # Processes pick up entries added elsewhere by reading those created since their last load
+            models.Index(fields=['date_created']),
+        ]
+
+
+class DeviceToken(BaseModel):
+    INVALID_REASONS = [
+        ("UNREGISTERED", "Unregistered"),
+        ("INVALID_ARGUMENT", "Invalid argument"),
+    ]
+
+    token = models.TextField()
+    token_hash = models.CharField(max_length=64, unique=True, editable=False)
+    is_valid = models.BooleanField(default=True)
+    invalid_reason = models.CharField(max_length=50, choices=INVALID_REASONS, blank=True)
+    invalidated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.token
+
+    @staticmethod
+    def hash_token(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def save(self, *args, **kwargs):
+        self.token_hash = self.hash_token(self.token)
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ('-date_created',)
+        indexes = [
+            models.Index(fields=['is_valid', 'invalidated_at']),
+        ]
@@ -1,9 +1,13 @@
 import logging
+import time
+from datetime import datetime, timezone as dt_timezone
 from typing import Dict
 
 from celery import shared_task
 
-from core.backend.notification_manager import NotificationManager
+from core.backend import task_profiler  # noqa: F401 - connects the slow task profiling signal handlers
+from core.backend import worker_warmup  # noqa: F401 - connects the worker warm-up signal handlers
+from core.backend.metrics import QUEUE_WAIT, timed_stage
 from notify.celery import app
 
 logger = logging.getLogger(__name__)
@@ -20,11 +24,108 @@ def send_notification(self, notification_data: Dict) -> str:
     :param notification_data: Dictionary containing notification information.
     :return: "success" if task completes without raising an exception.
     """
+    queued_at = None
+    enqueued_at = getattr(self.request, "enqueued_at", None)
+    if enqueued_at:
+        QUEUE_WAIT.observe(max(time.time() - enqueued_at, 0.0), task=self.name)
+        queued_at = datetime.fromtimestamp(enqueued_at, tz=dt_timezone.utc)
+
+    # Imported here so that publishers (the web tier) can import the task without the delivery stack
+    from core.backend.notification_manager import NotificationManager
+
     try:
-        notification = NotificationManager().save_notification(notification_data)
-        if notification:
-            NotificationManager().send_notification(notification)
+        with timed_stage("task"):
+            notification = NotificationManager().save_notification(notification_data, queued_at=queued_at)
+            # Scheduled and paced notifications are sent later by the dispatcher and the send pacer
+            if notification and not (notification.send_at or notification.paced):
+                NotificationManager().send_notification(notification)
         return "success"
     except Exception as ex:
         logger.exception("CeleryTasks - send_notification exception: %s" % ex)
         raise self.retry(exc=ex)
+
+
+@shared_task(name='notify.deliver_notification', bind=True, max_retries=3, default_retry_delay=30)
+def deliver_notification(self, notification_id: str) -> str:
+    """
+    Celery task to send a notification that is already stored, e.g. one materialised by a campaign.
+
+    Only the notification id travels through the broker; the row is claimed before sending so a
+    redelivered message does not send it twice.
+
+    :param self: Reference to the Celery task instance (for retries).
+    :param notification_id: Primary key of the stored notification.
+    :return: "success" if task completes without raising an exception.
+    """
+    from core.backend.notification_manager import NotificationManager
+
+    try:
+        with timed_stage("task"):
+            NotificationManager().deliver_notification(notification_id)
+        return "success"
+    except Exception as ex:
+        logger.exception("CeleryTasks - deliver_notification exception: %s" % ex)
+        raise self.retry(exc=ex)
+
+
+@shared_task(name='notify.process_campaign', bind=True, max_retries=3, default_retry_delay=30)
+def process_campaign(self, campaign_id: str, run_token: str) -> str:
+    """
+    Celery task that materialises one chunk of a campaign, then schedules itself for the next chunk.
+
+    The countdown between chunks paces the campaign at its send rate. Pausing, cancelling or resuming
+    the campaign (which issues a new run token) ends this chain at its next tick.
+
+    :param self: Reference to the Celery task instance (for retries).
+    :param campaign_id: Primary key of the campaign.
+    :param run_token: Token of the chain of ticks this task belongs to.
+    :return: "success" if task completes without raising an exception.
+    """
+    from core.backend.campaign_manager import CampaignManager
+
+    try:
+        next_tick = CampaignManager().process_tick(campaign_id, run_token)
+    except Exception as ex:
+        logger.exception("CeleryTasks - process_campaign exception: %s" % ex)
+        if self.request.retries >= self.max_retries:
+            CampaignManager.fail(campaign_id, str(ex))
+            return "failed"
+        raise self.retry(exc=ex)
+
+    if next_tick is not None:
+        process_campaign.apply_async((campaign_id, run_token), countdown=next_tick)
+    return "success"
+
+
+@shared_task(name='notify.dispatch_due_notifications')
+def dispatch_due_notifications() -> str:
+    """
+    Periodic (beat) task that hands scheduled notifications coming due to delivery.
+
+    :return: "success" if task completes without raising an exception.
+    """
+    from core.backend.scheduled_dispatcher import dispatch_due_notifications as dispatch
+
+    try:
+        dispatch()
+        return "success"
+    except Exception as ex:
+        logger.exception("CeleryTasks - dispatch_due_notifications exception: %s" % ex)
+        return "failed"
+
+
+@shared_task(name='notify.release_paced_notifications')
+def release_paced_notifications() -> str:
+    """
+    Periodic (beat) task that releases the paced backlog at each system's, organisation's and campaign's send rate.
+
+    :return: "success" if task completes without raising an exception.
+    """
+    from core.backend.send_pacer import release_paced_notifications as release
+
+    try:
+        release()
+        return "success"
+    except Exception as ex:
+        logger.exception("CeleryTasks - release_paced_notifications exception: %s" % ex)
+        return "failed"
@@ -1,3 +1,1206 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from firebase_admin import exceptions as firebase_exceptions, messaging
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from core.backend.async_delivery_worker import DELIVER_NOTIFICATION_TASK, AsyncDeliveryWorker
+from core.backend.attachments import EncodedAttachmentCache, attachment_cache, build_attachment_parts, store_blob
+from core.backend.campaign_manager import CampaignManager, CampaignSourceReader
+from core.backend.metrics import DB_POOL, timed_stage
+from core.backend.notification_manager import NotificationManager
+from core.backend.notification_types.email_notification import EmailNotification
+from core.backend.notification_types.push_notification import PushNotification
+from core.backend.notification_types.sms_notification import SMSNotification
+from core.backend.provider_simulators import FCMSimulator, SMSGatewaySimulator, SimulatorBehaviour, SimulatorStats
+from core.backend.providers.africas_talking_sms_provider import AfricasTalkingSMSProvider
+from core.backend.providers.belio_sms_provider import BelioSMSProvider
+from core.backend.providers.firebase_push_provider import FirebasePushProvider
+from core.backend.providers.providers_registry import get_provider_class
+from core.backend.recipient_normaliser import (
+    INVALID_EMAIL_ADDRESS, INVALID_PHONE_NUMBER, normalise_email_addresses, normalise_phone_numbers)
+from core.backend.reference_cache import reference_cache
+from core.backend.scheduled_dispatcher import _publish
+from core.backend.send_pacer import release_paced_notifications
+from core.backend.services import DeviceTokenService, NotificationService
+from core.backend.sms_encoding import GSM_7, UCS_2, SMSSegments, segment_sms
+from core.backend.sms_router import SMSRouter, by_cost
+from core.backend.suppression_list import SuppressionList, suppression_list
+from core.backend.task_profiler import finish_task_profile, start_task_profile
+from core.backend.worker_warmup import warm_up_worker
+from core.management.commands.loadgen import Command as LoadgenCommand
+from core.models import (
+    Campaign, DeviceToken, Notification, NotificationRecipient, NotificationType, Organisation, Provider, SMSRoute,
+    State, Suppression, System, Template)
+from core.views import NotifyAPIsManager
+from notify.celery import app
+from utils.query_budget import QueryBudgetTestMixin
+
+
+class NotificationTestCase(QueryBudgetTestMixin, TestCase):
+    """
+    Base test case with an SMS system, template and Belio provider, provider requests and system
+    callbacks mocked out, and the process-level caches (states, references, suppressions) emptied.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # States are cached per process; rows cached by a rolled-back test would leave stale pks behind
+        State.clear_cache()
+        reference_cache.clear()
+        suppression_list.clear()
+        self.addCleanup(State.clear_cache)
+        self.addCleanup(reference_cache.clear)
+        self.addCleanup(suppression_list.clear)
+
+        for name in ("Pending", "Sent", "Failed", "Confirmation Pending", "Coalesced"):
+            State.objects.create(name=name)
+        self.sms = NotificationType.objects.create(name="sms")
+        self.system = System.objects.create(
+            name="billing", default_from_email="billing@example.com",
+            webhook_url="https://billing.example.com/callback")
+        self.template = Template.objects.create(
+            name="payment_received", notification_type=self.sms, body="Received {{ amount }}")
+        self.provider = Provider.objects.create(
+            name="belio", notification_type=self.sms, priority=1, class_name="BelioSMSProvider", config={
+                "api_key": "key", "cookie": "cookie", "url": "https://belio.example.com/sms",
+                "default_sms_service_id": "1", "callback_url": "https://notify.example.com/belio-sms-callback/"})
+
+        post = mock.patch("core.backend.providers.belio_sms_provider.requests.post")
+        self.provider_post = post.start()
+        self.addCleanup(post.stop)
+        callback = mock.patch.object(NotificationManager, "send_callback_to_system")
+        self.callback = callback.start()
+        self.addCleanup(callback.stop)
+
+    def payload(self, recipients="254712345678", **kwargs):
+        return {
+            "system": "billing", "notification_type": "sms", "template": "payment_received",
+            "recipients": recipients, "context": {"amount": "KES 100"}, "unique_identifier": "payment-1", **kwargs}
+
+    def save(self, **kwargs) -> Notification:
+        return NotificationManager().save_notification(self.payload(**kwargs))
+
+    def callback_payloads(self):
+        return [call.kwargs.get("payload") or call.args[1] for call in self.callback.call_args_list]
+
+    @staticmethod
+    def post(data) -> RequestFactory:
+        return RequestFactory().post("/", json.dumps(data), content_type="application/json")
+
+
+class QueryBudgetTests(NotificationTestCase):
+    def test_send_notification_within_budget(self):
+        notification = self.save(recipients="254712345678,254722345678")
+        with self.assertQueryBudget("send_notification"):
+            self.assertTrue(NotificationManager().send_notification(notification))
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, State.confirmation_pending())
+        self.assertEqual(notification.recipient_count, 2)
+
+    def test_queue_send_notification_within_budget(self):
+        with mock.patch("core.views.send_notification.delay") as delay, self.assertQueryBudget("ingestion"):
+            response = NotifyAPIsManager.queue_send_notification(self.post(self.payload()))
+        self.assertEqual(json.loads(response.content)["code"], "100.000.000")
+        delay.assert_called_once()
+
+    @override_settings(INGESTION_MODE="claim_check")
+    def test_claim_check_ingestion_within_budget(self):
+        with mock.patch("core.views.deliver_notification.delay") as delay, \
+                self.assertQueryBudget("claim_check_ingestion"):
+            response = NotifyAPIsManager.queue_send_notification(self.post(self.payload()))
+        notification_id = json.loads(response.content)["notification_id"]
+        delay.assert_called_once_with(notification_id)
+        self.assertTrue(Notification.objects.filter(pk=notification_id, dispatched_at__isnull=False).exists())
+
+    def test_dlr_callback_within_budget(self):
+        notification = self.save()
+        NotificationManager().send_notification(notification)
+        report = {
+            "deliveryStatus": "DeliveredToTerminal", "correlator": str(notification.id),
+            "address": "tel:+254712345678", "timestamp": "2026-10-19T10:00:00Z"}
+        with self.assertQueryBudget("dlr_callback"):
+            response = NotifyAPIsManager().belio_sms_provider_callback(self.post(report))
+        self.assertEqual(response.status_code, 200)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, State.sent())
+
+
+class IngestionTests(NotificationTestCase):
+    def test_bulk_ingestion_reports_each_failure_and_keeps_going(self):
+        ingest_notification = NotificationManager.ingest_notification
+
+        def fail_payment_2(manager, notification_data):
+            if notification_data["unique_identifier"] == "payment-2":
+                raise RuntimeError("database is down")
+            return ingest_notification(manager, notification_data)
+
+        with mock.patch.object(NotificationManager, "ingest_notification", fail_payment_2):
+            results = NotificationManager().ingest_notifications([
+                self.payload(unique_identifier="payment-1"), self.payload(unique_identifier="payment-2"),
+                self.payload(system="unknown", unique_identifier="payment-3"), "not an object",
+                self.payload(unique_identifier="payment-5")])
+
+        self.assertEqual(
+            [result.get("error") for result in results],
+            [None, "database is down", results[2]["error"], "Notification must be an object", None])
+        self.assertTrue(results[2]["error"])
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_bulk_queueing_reports_the_notifications_that_failed_to_publish(self):
+        notifications = [self.payload(unique_identifier=f"payment-{index}") for index in range(3)]
+        with mock.patch("core.views.send_notification.apply_async", side_effect=[None, RuntimeError("down"), None]):
+            response = NotifyAPIsManager.queue_send_bulk_notifications(self.post({"notifications": notifications}))
+        self.assertEqual(json.loads(response.content), {
+            "code": "100.000.000", "message": "Notifications queued successfully", "queued": 2, "failed": [1]})
+
+        with mock.patch("core.views.send_notification.apply_async", side_effect=RuntimeError("down")):
+            response = NotifyAPIsManager.queue_send_bulk_notifications(self.post({"notifications": notifications}))
+        self.assertEqual(json.loads(response.content)["code"], "999.999.999")
+
+
+class DeliveryTests(NotificationTestCase):
+    FIRST, SECOND, THIRD = "254712345678", "254722345678", "254733345678"
+
+    def send(self, *recipients) -> Notification:
+        notification = self.save(recipients=",".join(recipients))
+        self.assertTrue(NotificationManager().send_notification(notification))
+        notification.refresh_from_db()
+        return notification
+
+    def report(self, notification, delivered, address=None):
+        NotificationManager().record_delivery_report(
+            notification.id, "DeliveredToTerminal" if delivered else "DeliveryUncertain", delivered, address,
+            "2026-10-19T10:00:00Z")
+        notification.refresh_from_db()
+
+    @staticmethod
+    def deliveries(notification):
+        return dict(NotificationRecipient.objects.filter(notification=notification).values_list("recipient", "status"))
+
+    def test_partial_send_records_each_recipient(self):
+        notification = self.save(recipients=",".join((self.FIRST, self.SECOND, self.THIRD)))
+        NotificationManager()._complete_send(notification, [
+            {"recipients": [self.FIRST, self.SECOND], "status": State.confirmation_pending(),
+             "provider": self.provider, "attempts": 1, "provider_request_ms": 10,
+             "recipient_statuses": {self.SECOND: {"status": "failed", "error": "Invalid number"}}},
+            {"recipients": [self.THIRD], "status": None, "provider": None, "attempts": 2,
+             "provider_request_ms": 20, "recipient_statuses": {}},
+        ])
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, State.confirmation_pending())
+        self.assertEqual(
+            (notification.recipient_count, notification.sent_count, notification.failed_count), (3, 0, 2))
+        self.assertEqual(self.deliveries(notification), {
+            self.FIRST: NotificationRecipient.STATUS_CONFIRMATION_PENDING,
+            self.SECOND: NotificationRecipient.STATUS_FAILED,
+            self.THIRD: NotificationRecipient.STATUS_FAILED,
+        })
+
+    def test_partial_delivery_report_keeps_the_notification_pending(self):
+        notification = self.send(self.FIRST, self.SECOND)
+        self.report(notification, True, self.FIRST)
+        self.assertEqual(notification.status, State.confirmation_pending())
+        self.assertEqual((notification.sent_count, notification.failed_count), (1, 0))
+        self.assertIsNotNone(notification.delivered_at)
+
+        # A repeated report for a settled recipient is not counted again
+        self.report(notification, True, self.FIRST)
+        self.assertEqual((notification.sent_count, notification.failed_count), (1, 0))
+
+    def test_final_delivery_report_settles_the_status(self):
+        notification = self.send(self.FIRST, self.SECOND)
+        self.report(notification, True, self.FIRST)
+        self.report(notification, False, self.SECOND)
+        self.assertEqual(notification.status, State.sent())
+        self.assertEqual((notification.sent_count, notification.failed_count), (1, 1))
+
+        notification = self.send(self.FIRST, self.SECOND)
+        self.report(notification, False, self.FIRST)
+        self.report(notification, False)
+        self.assertEqual(notification.status, State.failed())
+        self.assertEqual((notification.sent_count, notification.failed_count), (0, 2))
+        self.assertEqual(set(self.deliveries(notification).values()), {NotificationRecipient.STATUS_FAILED})
+
+    def test_add_delivery_counts_leaves_the_status_until_every_recipient_is_settled(self):
+        notification = self.send(self.FIRST, self.SECOND, self.THIRD)
+        NotificationService().add_delivery_counts(notification.id, sent=0, failed=2, reported_at=timezone.now())
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, State.confirmation_pending())
+        self.assertIsNone(notification.delivered_at)
+
+        NotificationService().add_delivery_counts(notification.id, sent=1, failed=0, reported_at=timezone.now())
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, State.sent())
+        self.assertEqual((notification.sent_count, notification.failed_count), (1, 2))
+
+    def test_resend_overwrites_recipient_rows(self):
+        notification = self.send(self.FIRST, self.SECOND)
+        self.report(notification, True, self.FIRST)
+        self.assertTrue(NotificationManager().send_notification(notification))
+        notification.refresh_from_db()
+        self.assertEqual(NotificationRecipient.objects.filter(notification=notification).count(), 2)
+        self.assertEqual(
+            set(self.deliveries(notification).values()), {NotificationRecipient.STATUS_CONFIRMATION_PENDING})
+        self.assertEqual(
+            (notification.status, notification.sent_count, notification.failed_count),
+            (State.confirmation_pending(), 0, 0))
+
+
+class SMSContentTests(NotificationTestCase):
+    def prepare(self, amount) -> dict:
+        notification = self.save(context={"amount": amount})
+        return SMSNotification(notification).prepare_content()
+
+    def test_bodies_within_the_segment_limit_are_prepared(self):
+        self.system.max_sms_segments = 2
+        self.system.save()
+        content = self.prepare("a" * 297)
+        self.assertEqual((content["encoding"], content["segments"]), (GSM_7, 2))
+
+    def test_bodies_over_the_system_segment_limit_are_rejected(self):
+        self.system.max_sms_segments = 1
+        self.system.save()
+        with self.assertRaises(ValidationError):
+            self.prepare("a" * 152)
+
+    @override_settings(SMS_MAX_SEGMENTS=2)
+    def test_bodies_over_the_default_segment_limit_are_rejected(self):
+        with self.assertRaises(ValidationError):
+            self.prepare("Ж" * 126)
+
+
+class CoalescingTests(NotificationTestCase):
+    NOW = datetime(2026, 10, 19, 10, 0, 45, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        super().setUp()
+        self.template.digest_body = (
+            "{{ count }} payments: {% for payment in notifications %}{{ payment.amount }}"
+            "{% if not forloop.last %}, {% endif %}{% endfor %}")
+        self.template.save()
+        self.system.coalesce_window = 3600
+        self.system.save()
+
+    def window(self, recipients=("254712345678",), now=NOW, template=None):
+        return NotificationManager._coalescing_window(
+            self.system, None, template or self.template, list(recipients), now)
+
+    def test_window_key_and_send_at(self):
+        key, send_at = self.window()
+        self.assertEqual(send_at, datetime(2026, 10, 19, 11, tzinfo=dt_timezone.utc))
+        self.assertEqual(self.window(now=self.NOW - timedelta(seconds=45)), (key, send_at))
+        self.assertEqual(self.window(now=send_at), (key, send_at + timedelta(hours=1)))
+        self.assertNotEqual(self.window(recipients=["254722345678"])[0], key)
+
+    def test_only_single_recipient_digest_templates_are_coalesced(self):
+        self.assertEqual(self.window(recipients=["254712345678", "254722345678"]), (None, None))
+        self.assertEqual(self.window(template=Template(name="plain", body="Hi")), (None, None))
+        # The template's window overrides the system's, and 0 turns coalescing off
+        self.template.coalesce_window = 0
+        self.assertEqual(self.window(), (None, None))
+
+    def test_digest_merges_the_window_and_calls_back_per_member(self):
+        notifications = [
+            self.save(unique_identifier=f"payment-{index}", context={"amount": amount})
+            for index, amount in enumerate(("KES 100", "KES 200", "KES 300"))]
+        self.assertEqual(len({(n.coalesce_key, n.send_at) for n in notifications}), 1)
+        self.assertEqual({n.status for n in notifications}, {State.pending()})
+
+        digest = notifications[1]
+        self.assertTrue(NotificationManager().deliver_notification(digest.id))
+        self.assertFalse(NotificationManager().deliver_notification(notifications[0].id))
+
+        digest.refresh_from_db()
+        self.assertEqual(digest.coalesced_count, 2)
+        self.assertEqual(digest.context["count"], 3)
+        self.assertEqual(digest.context["amount"], "KES 300")
+        self.assertEqual(
+            SMSNotification(digest).render("body"), "3 payments: KES 100, KES 200, KES 300")
+        self.assertEqual(self.provider_post.call_count, 1)
+
+        members = [notifications[0], notifications[2]]
+        for member in members:
+            member.refresh_from_db()
+            self.assertEqual((member.status, member.coalesced_into_id), (State.coalesced(), digest.id))
+        member_callbacks = [payload for payload in self.callback_payloads() if "coalesced_into" in payload]
+        self.assertEqual(member_callbacks, [{
+            "notification_id": str(member.id), "unique_identifier": member.unique_identifier,
+            "status": "Coalesced", "coalesced_into": str(digest.id)} for member in members])
+
+    def test_dispatcher_publishes_one_notification_per_window(self):
+        now = timezone.now()
+        due = [
+            ("first", now, "window-a"), ("second", now, "window-a"), ("later", now + timedelta(minutes=1), "window-a"),
+            ("other", now, "window-b"), ("plain", now, None), ("plain-too", now, None)]
+        with mock.patch("core.tasks.deliver_notification.apply_async") as apply_async:
+            _publish(due, 0)
+        self.assertEqual(
+            [call.args[0] for call in apply_async.call_args_list],
+            [("first",), ("later",), ("other",), ("plain",), ("plain-too",)])
+
+    def test_dispatcher_spreads_etas_from_send_at(self):
+        send_at = timezone.now() + timedelta(seconds=30)
+        due = [(f"notification-{index}", send_at, None) for index in range(4)]
+        with mock.patch("core.tasks.deliver_notification.apply_async") as apply_async:
+            _publish(due, 60)
+        self.assertEqual(
+            [call.kwargs["eta"] for call in apply_async.call_args_list],
+            [send_at + timedelta(seconds=index * 15) for index in range(4)])
+
+
+class SuppressionTests(NotificationTestCase):
+    @override_settings(SMS_DEFAULT_COUNTRY_CODE="254")
+    def test_imported_local_numbers_suppress_international_recipients(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as fil:
+            fil.write("recipient,reason\n0712345678,opt_out\n+254 722-345 678,manual\n")
+        self.addCleanup(os.unlink, fil.name)
+        call_command("suppressions", "import", fil.name, system="billing", stderr=io.StringIO())
+
+        self.assertEqual(
+            set(Suppression.objects.values_list("recipient", flat=True)), {"254712345678", "254722345678"})
+        self.assertEqual(
+            suppression_list.split(self.system, ["254712345678", "254733345678"]),
+            (["254733345678"], ["254712345678"]))
+        results = NotificationManager().ingest_notifications([self.payload(recipients="+254712345678,0722345678")])
+        self.assertEqual(results, [{"error": "All recipients are suppressed"}])
+
+
+class LatencyReportTests(NotificationTestCase):
+    def add(self, created, queue_lag_ms, send_at=None):
+        notification = self.save(unique_identifier=f"payment-{created.isoformat()}-{queue_lag_ms}")
+        queued_at = created + timedelta(seconds=1)
+        started_at = (send_at or queued_at) + timedelta(milliseconds=queue_lag_ms)
+        Notification.objects.filter(pk=notification.pk).update(
+            date_created=created, queued_at=queued_at, send_at=send_at, processing_started_at=started_at,
+            provider=self.provider, provider_request_ms=queue_lag_ms // 10,
+            sent_time=started_at + timedelta(seconds=1))
+
+    def report(self, **options) -> list:
+        out = io.StringIO()
+        call_command(
+            "latency_report", since="2026-10-19T00:00:00Z", until="2026-10-20T00:00:00Z", stdout=out, **options)
+        return [re.split(r"\s{2,}", line.strip()) for line in out.getvalue().splitlines()]
+
+    def test_percentiles_per_hour(self):
+        ten = datetime(2026, 10, 19, 10, 5, tzinfo=dt_timezone.utc)
+        for queue_lag_ms in (400, 100, 300, 200):
+            self.add(ten, queue_lag_ms)
+        # A scheduled notification's lag counts from when it was due
+        self.add(ten + timedelta(hours=1), 50, send_at=ten + timedelta(hours=3))
+
+        header, *rows = self.report(window="hour", percentiles="50,100")
+        self.assertEqual(header, ["window", "system", "provider", "metric", "count", "p50", "p100"])
+        lags = {row[0]: row[4:] for row in rows if row[3] == "queue_lag_ms"}
+        self.assertEqual(lags, {"2026-10-19 10:00": ["4", "200", "400"], "2026-10-19 11:00": ["1", "50", "50"]})
+        self.assertIn(["2026-10-19 10:00", "billing", "belio", "provider_request_ms", "4", "20", "40"], rows)
+
+    def test_single_window_and_empty_period(self):
+        self.add(datetime(2026, 10, 19, 10, 5, tzinfo=dt_timezone.utc), 100)
+        self.assertEqual([row[0] for row in self.report()[1:]], ["all", "all", "all"])
+        self.assertEqual(self.report(system="other"), [["No notifications in the selected period"]])
+
+
+@override_settings(CAMPAIGN_TICK_SECONDS=1)
+class CampaignTestCase(NotificationTestCase):
+    """
+    Notification test case that stores campaign source files in a temporary media root.
+    """
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def campaign(self, filename: str, content: str, **data) -> Campaign:
+        campaign = CampaignManager().create_campaign(
+            {"name": "October", "system": "billing", "notification_type": "sms", "template": "payment_received",
+             "context": {"amount": "KES 100"}, "send_rate": 2, **data},
+            SimpleUploadedFile(filename, content.encode()))
+        campaign.refresh_from_db()
+        return campaign
+
+    def tick(self, campaign: Campaign, run_token=None):
+        next_tick = CampaignManager().process_tick(campaign.id, str(run_token or campaign.run_token))
+        campaign.refresh_from_db()
+        return next_tick
+
+    @staticmethod
+    def release(campaign: Campaign) -> None:
+        # What the send pacer does once notifications are due
+        Notification.objects.filter(campaign=campaign).update(processing_started_at=timezone.now())
+
+
+class CampaignTests(CampaignTestCase):
+    def test_source_reader_resumes_at_the_offset(self):
+        source = io.BytesIO(b"recipient,amount\n254711111111,1\n254722222222,2\n254733333333,3\n")
+        reader = CampaignSourceReader(source, "csv")
+        rows = reader.rows()
+        self.assertEqual(next(rows), {"recipient": "254711111111", "amount": "1"})
+
+        reader = CampaignSourceReader(source, "csv", reader.offset)
+        self.assertEqual([row["amount"] for row in reader.rows()], ["2", "3"])
+        self.assertEqual(reader.offset, len(source.getvalue()))
+
+    def test_csv_is_read_chunk_by_chunk_to_an_exact_multiple(self):
+        campaign = self.campaign("payments.csv", "recipient,amount\n" + "".join(
+            f"25471234567{index},KES {index}00\n" for index in range(4)))
+        self.assertEqual(campaign.status, Campaign.STATUS_RUNNING)
+
+        self.assertIsNotNone(self.tick(campaign))
+        self.assertEqual((campaign.rows_read, campaign.notifications_created), (2, 2))
+        # The backlog is topped up to two chunks, then reading waits for the pacer to release some
+        self.assertIsNotNone(self.tick(campaign))
+        self.assertEqual(self.tick(campaign), 1)
+        self.assertEqual(campaign.rows_read, 4)
+
+        # Four rows make two full chunks, so only the next tick finds the end of the file
+        self.release(campaign)
+        self.assertIsNone(self.tick(campaign))
+        self.assertEqual(campaign.status, Campaign.STATUS_COMPLETED)
+        self.assertEqual((campaign.rows_read, campaign.rows_rejected, campaign.notifications_created), (4, 0, 4))
+        notifications = Notification.objects.filter(campaign=campaign).order_by("context__amount")
+        self.assertEqual(
+            [(n.recipients, n.context["amount"], n.paced) for n in notifications],
+            [([f"25471234567{index}"], f"KES {index}00", True) for index in range(4)])
+
+    def test_rejected_ndjson_rows_are_counted(self):
+        suppression_list.suppress(self.system, ["254799999999"], "opt_out")
+        campaign = self.campaign("payments.ndjson", "\n".join([
+            '{"recipient": "254711111111", "context": {"amount": "KES 500"}}',
+            "not json",
+            '["254722222222"]',
+            '{"amount": "KES 5"}',
+            '{"recipient": "12"}',
+            '{"recipient": "254799999999"}',
+            "",
+            '{"recipient": "0733333333", "unique_identifier": "row-7"}',
+        ]))
+        while self.tick(campaign) is not None:
+            self.release(campaign)
+
+        self.assertEqual(campaign.status, Campaign.STATUS_COMPLETED)
+        self.assertEqual((campaign.rows_read, campaign.rows_rejected, campaign.notifications_created), (7, 5, 2))
+        self.assertEqual(
+            sorted(Notification.objects.filter(campaign=campaign).values_list("unique_identifier", "context__amount")),
+            [("", "KES 500"), ("row-7", "KES 100")])
+
+    def test_pause_and_resume_retire_the_old_run(self):
+        campaign = self.campaign("payments.csv", "recipient\n" + "".join(
+            f"25471234567{index}\n" for index in range(5)))
+        first_run = campaign.run_token
+        self.tick(campaign)
+
+        self.assertTrue(CampaignManager.pause(campaign.id))
+        self.assertIsNone(self.tick(campaign))
+        self.assertFalse(CampaignManager.pause(campaign.id))
+        self.assertTrue(CampaignManager().resume(campaign.id))
+        self.assertFalse(CampaignManager().resume(campaign.id))
+        campaign.refresh_from_db()
+        self.assertNotEqual(campaign.run_token, first_run)
+
+        # The chain scheduled before the pause ends at its next tick; the new one carries on from row 3
+        self.assertIsNone(self.tick(campaign, run_token=first_run))
+        self.assertEqual(campaign.rows_read, 2)
+        self.release(campaign)
+        self.tick(campaign)
+        self.assertEqual(campaign.rows_read, 4)
+
+    def test_cancel_fails_the_unsent_backlog(self):
+        campaign = self.campaign("payments.csv", "recipient\n" + "".join(
+            f"25471234567{index}\n" for index in range(5)))
+        self.tick(campaign)
+        released = Notification.objects.filter(campaign=campaign).first()
+        Notification.objects.filter(pk=released.pk).update(processing_started_at=timezone.now())
+
+        self.assertTrue(CampaignManager.cancel(campaign.id))
+        self.assertFalse(CampaignManager.cancel(campaign.id))
+        self.assertIsNone(self.tick(campaign))
+        self.assertEqual(campaign.status, Campaign.STATUS_CANCELLED)
+        self.assertEqual(
+            dict(Notification.objects.filter(campaign=campaign).values_list("pk", "status__name")),
+            {released.pk: "Pending", **{
+                pk: "Failed" for pk in Notification.objects.filter(campaign=campaign).exclude(
+                    pk=released.pk).values_list("pk", flat=True)}})
+        self.assertEqual(CampaignManager.progress(campaign.id)["backlog"], 0)
+
+
+@override_settings(SEND_PACING_TICK_SECONDS=1)
+class SendPacerTests(CampaignTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now().replace(microsecond=0)
+        publish = mock.patch("core.backend.send_pacer._publish")
+        self.publish = publish.start()
+        self.addCleanup(publish.stop)
+
+    def paced(self, count: int, **kwargs) -> list:
+        return [Notification.objects.create(
+            system=self.system, notification_type=self.sms, template=self.template, recipients=["254712345678"],
+            context={"amount": "KES 100"}, status=State.pending(), paced=True, **kwargs).pk for _ in range(count)]
+
+    def release(self, now=None) -> list:
+        self.publish.reset_mock()
+        release_paced_notifications(now or self.now)
+        return self.publish.call_args.args[0] if self.publish.called else []
+
+    def offsets(self, released) -> list:
+        return [(eta - self.now).total_seconds() for _, eta in released]
+
+    def test_slots_are_one_over_the_rate_apart(self):
+        System.objects.filter(pk=self.system.pk).update(max_send_rate=2)
+        self.paced(6)
+
+        # Slots within the two-tick horizon: 0, 0.5, 1 and 1.5 seconds from now
+        self.assertEqual(self.offsets(self.release()), [0, 0.5, 1, 1.5])
+        self.assertEqual(Notification.objects.filter(dispatched_at=self.now).count(), 4)
+
+    def test_slowest_budget_sets_the_pace(self):
+        organisation = Organisation.objects.create(name="acme", system=self.system, max_send_rate=1)
+        System.objects.filter(pk=self.system.pk).update(max_send_rate=10)
+        self.paced(4, organisation=organisation)
+
+        self.assertEqual(self.offsets(self.release()), [0, 1])
+        organisation.refresh_from_db()
+        self.system.refresh_from_db()
+        self.assertEqual(organisation.paced_until, self.now + timedelta(seconds=2))
+        self.assertEqual(self.system.paced_until, self.now + timedelta(seconds=1.1))
+
+    def test_paced_until_carries_over_to_the_next_run(self):
+        System.objects.filter(pk=self.system.pk).update(max_send_rate=2)
+        self.paced(6)
+        self.release()
+        self.system.refresh_from_db()
+        self.assertEqual(self.system.paced_until, self.now + timedelta(seconds=2))
+
+        # A run a second later starts at the saved slot rather than at its own time
+        self.assertEqual(self.offsets(self.release(self.now + timedelta(seconds=1))), [2, 2.5])
+
+    def test_paused_campaigns_are_skipped(self):
+        campaign = self.campaign("payments.csv", "recipient\n254711111111\n254722222222\n")
+        CampaignManager().process_tick(campaign.id, str(campaign.run_token))
+        other = self.paced(1)
+
+        CampaignManager.pause(campaign.id)
+        self.assertEqual([pk for pk, _ in self.release()], other)
+
+        CampaignManager().resume(campaign.id)
+        released = self.release()
+        self.assertEqual(len(released), 2)
+        self.assertEqual(
+            set(Notification.objects.filter(pk__in=[pk for pk, _ in released]).values_list("campaign", flat=True)),
+            {campaign.id})
+
+    def test_groups_of_a_system_are_interleaved(self):
+        large = Organisation.objects.create(name="large", system=self.system)
+        small = Organisation.objects.create(name="small", system=self.system)
+        System.objects.filter(pk=self.system.pk).update(max_send_rate=2)
+        large_backlog = self.paced(4, organisation=large)
+        small_backlog = self.paced(2, organisation=small)
+
+        released = self.release()
+        self.assertEqual(self.offsets(released), [0, 0.5, 1, 1.5])
+        # zip_longest takes the groups in turn, whichever of the two comes first
+        order = [pk in large_backlog for pk, _ in released]
+        self.assertIn(order, ([True, False, True, False], [False, True, False, True]))
+        self.assertEqual(len([pk for pk, _ in released if pk in small_backlog]), 2)
+
+
+class ProviderSimulatorTests(SimpleTestCase):
+    @staticmethod
+    def requests(simulator, *requests) -> list:
+        async def send():
+            transport = httpx.ASGITransport(app=simulator)
+            async with httpx.AsyncClient(transport=transport, base_url="http://simulator") as client:
+                return [await client.request(method, path, **kwargs) for method, path, kwargs in requests]
+        return asyncio.run(send())
+
+    def test_injected_sms_gateway_errors(self):
+        stats = SimulatorStats()
+        simulator = SMSGatewaySimulator(SimulatorBehaviour(error_rate=1), stats)
+        belio, africas_talking = self.requests(
+            simulator,
+            ("POST", "/sms", {"json": {"addresses": ["254711111111", "254722222222"]}}),
+            ("POST", "/version1/messaging", {"data": {"to": "+254711111111,+254722222222", "message": "Hi"}}))
+
+        self.assertEqual(belio.status_code, 500)
+        # Africa's Talking accepts the request and fails each recipient instead
+        self.assertEqual(africas_talking.status_code, 201)
+        self.assertEqual(
+            [recipient["statusCode"] for recipient in africas_talking.json()["SMSMessageData"]["Recipients"]],
+            [501, 501])
+        self.assertEqual(
+            stats.counters["sms"], {"requests": 2, "messages_failed": 4, "responses_500": 1, "responses_201": 1})
+
+        simulator.behaviour.error_rate = 0
+        [accepted] = self.requests(simulator, ("POST", "/sms", {"json": {"addresses": ["254711111111"]}}))
+        self.assertEqual(accepted.json()["status"], "Accepted")
+
+    def test_throttled_requests_get_429(self):
+        stats = SimulatorStats()
+        simulator = FCMSimulator(SimulatorBehaviour(max_rps=2), stats)
+        message = {"json": {"message": {"token": "device-1"}}}
+        responses = self.requests(simulator, *[("POST", "/v1/projects/shop/messages:send", message)] * 3)
+
+        self.assertEqual([response.status_code for response in responses], [200, 200, 429])
+        self.assertEqual(responses[2].headers["retry-after"], "1")
+        self.assertEqual(responses[2].json()["error"]["details"][0]["errorCode"], "QUOTA_EXCEEDED")
+        self.assertEqual(stats.counters["fcm"]["throttled"], 1)
+        self.assertEqual(responses[0].json()["name"].split("/messages/")[0], "projects/shop")
+
+    def test_fcm_token_and_error_injection(self):
+        simulator = FCMSimulator(SimulatorBehaviour(error_rate=1), SimulatorStats())
+        invalid, failed = self.requests(
+            simulator,
+            ("POST", "/v1/projects/shop/messages:send", {"json": {"message": {"token": "invalid-1"}}}),
+            ("POST", "/v1/projects/shop/messages:send", {"json": {"message": {"token": "device-1"}}}))
+
+        self.assertEqual(invalid.status_code, 404)
+        self.assertEqual(invalid.json()["error"]["details"][0]["errorCode"], "UNREGISTERED")
+        self.assertEqual(failed.status_code, 503)
+        self.assertEqual(failed.json()["error"]["status"], "UNAVAILABLE")
+
+
+class LoadgenTests(NotificationTestCase):
+    def run_loadgen(self, handler, **options) -> dict:
+        async_client = httpx.AsyncClient
+
+        def client(**kwargs):
+            return async_client(transport=httpx.MockTransport(handler), timeout=kwargs["timeout"])
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        output = os.path.join(directory.name, "results.json")
+        with mock.patch.object(httpx, "AsyncClient", side_effect=client):
+            call_command("loadgen", mix="sms", completion_timeout=0, output=output, stdout=io.StringIO(), **options)
+        with open(output) as fil:
+            return json.load(fil)
+
+    def test_closed_loop_counts_each_outcome(self):
+        def handler(request):
+            index = int(json.loads(request.content)["unique_identifier"].rsplit("-", 1)[1])
+            if index % 4 == 3:
+                raise httpx.ReadTimeout("timed out", request=request)
+            if index % 4 == 2:
+                return httpx.Response(500, text="Server Error")
+            return httpx.Response(200, json={"code": "100.000.000" if index % 4 == 0 else "999.999.999"})
+
+        results = self.run_loadgen(handler, mode="closed", concurrency=1, requests=8)
+        self.assertEqual(
+            {key: results[key] for key in ("sent", "accepted", "rejected", "http_errors", "timeouts", "dropped")},
+            {"sent": 8, "accepted": 2, "rejected": 2, "http_errors": 2, "timeouts": 2, "dropped": 0})
+        self.assertEqual(results["error_rate"], 0.75)
+        self.assertEqual((results["completed"], results["incomplete"]), (0, 2))
+        self.assertEqual(results["by_system"], {"billing": {"sent": 8, "accepted": 2}})
+        self.assertIsNotNone(results["ingestion_latency"])
+
+    def test_open_loop_drops_requests_over_the_in_flight_limit(self):
+        async def handler(request):
+            await asyncio.sleep(0.02)
+            return httpx.Response(200, json={"code": "100.000.000"})
+
+        results = self.run_loadgen(handler, mode="open", rps=1000, max_in_flight=1, requests=3)
+        self.assertEqual((results["sent"], results["accepted"]), (3, 3))
+        self.assertGreater(results["dropped"], 0)
+        self.assertEqual(results["target_rps"], 1000)
+
+    def test_completion_is_the_first_terminal_state(self):
+        sent = self.save(unique_identifier="loadgen-run-0")
+        self.save(unique_identifier="loadgen-run-1")
+        Notification.objects.filter(pk=sent.pk).update(status=State.sent())
+        accepted_at = sent.date_modified.timestamp() - 2
+        command = LoadgenCommand(stdout=io.StringIO())
+
+        completion = command._watch(
+            "run", {"loadgen-run-0": accepted_at, "loadgen-run-1": accepted_at},
+            {"completion_timeout": 0.01, "poll_interval": 0})
+        self.assertEqual(list(completion), ["loadgen-run-0"])
+        self.assertEqual(completion["loadgen-run-0"][0], "Sent")
+        self.assertGreaterEqual(completion["loadgen-run-0"][1], 2)
+
+
+@override_settings(
+    TASK_PROFILE_SAMPLE_RATE=1, TASK_PROFILE_TASKS=["notify.send_notification"], TASK_PROFILE_SLOW_SECONDS=0)
+class TaskProfilerTests(TestCase):
+    task = SimpleNamespace(name="notify.send_notification")
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def run_task(self, task=None, task_id="task-1"):
+        start_task_profile(task_id=task_id, task=task or self.task)
+        with timed_stage("save"):
+            State.objects.count()
+        finish_task_profile(task_id=task_id, task=task or self.task, state="SUCCESS")
+
+    def test_slow_runs_are_reported(self):
+        with self.settings(TASK_PROFILE_DIR=self.directory), \
+                self.assertLogs("core.backend.task_profiler", "WARNING") as logs:
+            self.run_task()
+
+        [line] = logs.output
+        report = json.loads(line.split("slow task: ", 1)[1])
+        self.assertEqual(
+            {key: report[key] for key in ("task", "task_id", "state", "sql_count")},
+            {"task": "notify.send_notification", "task_id": "task-1", "state": "SUCCESS", "sql_count": 1})
+        self.assertEqual(list(report["stages_ms"]), ["save"])
+        self.assertIn("core_state", report["sql"][0]["sql"])
+        self.assertEqual(os.path.dirname(report["profile"]), self.directory)
+        self.assertTrue(os.path.exists(report["profile"]))
+        self.assertTrue(report["top_functions"])
+
+    def test_fast_runs_are_not_reported(self):
+        with self.settings(TASK_PROFILE_SLOW_SECONDS=60, TASK_PROFILE_DIR=self.directory), \
+                self.assertNoLogs("core.backend.task_profiler", "WARNING"):
+            self.run_task()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_only_sampled_tasks_are_profiled(self):
+        with mock.patch("core.backend.task_profiler.TaskProfile") as profile:
+            with self.settings(TASK_PROFILE_SAMPLE_RATE=0):
+                self.run_task()
+            self.run_task(task=SimpleNamespace(name="notify.process_campaign"))
+            with mock.patch("core.backend.task_profiler.random.random", return_value=0.5), \
+                    self.settings(TASK_PROFILE_SAMPLE_RATE=0.4):
+                self.run_task()
+        profile.assert_not_called()
+
+    def test_only_the_profiled_task_finishes_its_profile(self):
+        start_task_profile(task_id="task-1", task=self.task)
+        # A nested task on the same thread neither starts a second profile nor ends the first
+        start_task_profile(task_id="task-2", task=self.task)
+        with self.assertNoLogs("core.backend.task_profiler", "WARNING"):
+            finish_task_profile(task_id="task-2", task=self.task, state="SUCCESS")
+        with self.settings(TASK_PROFILE_DIR=self.directory), \
+                self.assertLogs("core.backend.task_profiler", "WARNING") as logs:
+            finish_task_profile(task_id="task-1", task=self.task, state="SUCCESS")
+        self.assertIn('"task_id": "task-1"', logs.output[0])
+
+
+@override_settings(SMS_DEFAULT_COUNTRY_CODE="254")
+class RecipientNormaliserTests(SimpleTestCase):
+    def test_phone_number_prefixes_and_separators(self):
+        result = normalise_phone_numbers([
+            "254712345678", "+254712345678", "00254712345678", "0712345678", "tel:+254712345678",
+            "+254 712-345 678", "(0712) 345.678", 254712345678])
+        self.assertEqual(result, (["254712345678"], {}))
+        self.assertEqual(normalise_phone_numbers("0712345678", default_country_code="255").valid, ["255712345678"])
+
+    def test_phone_numbers_longer_than_e164_are_rejected(self):
+        result = normalise_phone_numbers([
+            "+123456789012345", "+1234567890123456", "001234567890123456",
+            # 14 digits are short enough as given but not once the country code is added
+            "012345678901234"])
+        self.assertEqual(result.valid, ["123456789012345"])
+        self.assertEqual(result.rejected, {
+            "+1234567890123456": INVALID_PHONE_NUMBER, "001234567890123456": INVALID_PHONE_NUMBER,
+            "012345678901234": INVALID_PHONE_NUMBER})
+
+    def test_invalid_and_empty_phone_numbers(self):
+        result = normalise_phone_numbers(" 12 ,07123abc,+0712345678, , 0722000000")
+        self.assertEqual(result.valid, ["254722000000"])
+        self.assertEqual(result.rejected, {
+            "12": INVALID_PHONE_NUMBER, "07123abc": INVALID_PHONE_NUMBER, "+0712345678": INVALID_PHONE_NUMBER})
+
+    def test_duplicates_keep_the_first_position(self):
+        result = normalise_phone_numbers(["0722000000", "254711000000", "+254722000000", "0711000000", "0733000000"])
+        self.assertEqual(result.valid, ["254722000000", "254711000000", "254733000000"])
+
+    def test_email_addresses(self):
+        result = normalise_email_addresses(
+            " Jane.Doe@Example.COM ,jane.doe@example.com,Jane.Doe@example.com,not-an-email,, jane@example")
+        # Only the domain is case-insensitive
+        self.assertEqual(result.valid, ["Jane.Doe@example.com", "jane.doe@example.com"])
+        self.assertEqual(
+            result.rejected, {"not-an-email": INVALID_EMAIL_ADDRESS, "jane@example": INVALID_EMAIL_ADDRESS})
+
+
+class ProviderRegistryTests(SimpleTestCase):
+    def test_resolves_registered_names_and_dotted_paths(self):
+        self.assertIs(get_provider_class("BelioSMSProvider"), BelioSMSProvider)
+        self.assertIs(
+            get_provider_class("core.backend.providers.belio_sms_provider.BelioSMSProvider"), BelioSMSProvider)
+
+    def test_rejects_classes_that_are_not_providers(self):
+        for class_name in ("collections.OrderedDict", "os.path.join", "core.backend.providers.Missing", "Missing"):
+            with self.subTest(class_name=class_name), self.assertRaises(ValueError):
+                get_provider_class(class_name)
+
+
+class WorkerWarmupTests(SimpleTestCase):
+    @override_settings(WORKER_WARMUP_TIMEOUT=0.2)
+    def test_hung_provider_warm_up_is_abandoned_at_the_timeout(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def hang():
+            release.wait(10)
+            return {}
+
+        report = warm_up_worker([("provider_clients", hang), ("states", lambda: {"states": 0})])
+        self.assertEqual(report["steps"]["provider_clients"]["error"], "timeout")
+        self.assertLess(report["ms"], 2000)
+        self.assertEqual(report["steps"]["states"], {"skipped": "timeout"})
+
+
+class MetricsTests(SimpleTestCase):
+    @override_settings(PROCESS_TYPE="worker")
+    def test_pool_gauge_is_labelled_per_process_and_merged_across_processes(self):
+        with mock.patch.object(DB_POOL, "collect", lambda: [({"alias": "default", "stat": "pool_size"}, 3)]):
+            snapshot = DB_POOL.snapshot()
+        ((key, value),) = snapshot.items()
+        process_type, process, alias, stat = json.loads(key)
+        self.assertEqual((process_type, alias, stat, value), ("worker", "default", "pool_size", [3]))
+
+        web = {json.dumps(["web", "web-1", "default", "pool_size"]): [5]}
+        merged = DB_POOL.values([{DB_POOL.name: snapshot}, {DB_POOL.name: web}])
+        self.assertEqual(merged, {**snapshot, **web})
+
+
+class SMSRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.cheap = Provider(name="cheap", cost_per_segment=Decimal("0.5"))
+        self.pricey = Provider(name="pricey", cost_per_segment=Decimal("1.2"))
+        self.unpriced = Provider(name="unpriced")
+
+    def test_by_cost_puts_cheapest_first_and_unpriced_last_in_priority_order(self):
+        other_unpriced = Provider(name="other")
+        self.assertEqual(
+            by_cost([self.unpriced, self.pricey, other_unpriced, self.cheap]),
+            [self.cheap, self.pricey, self.unpriced, other_unpriced])
+
+    def test_longest_prefix_wins(self):
+        router = SMSRouter([
+            SMSRoute(prefix="254", provider=self.pricey), SMSRoute(prefix="25471", provider=self.cheap)])
+        self.assertEqual(router.lookup("+254712345678"), ("25471", [self.cheap]))
+        self.assertEqual(router.lookup("254733345678"), ("254", [self.pricey]))
+        self.assertEqual(router.lookup("255712345678"), ("", []))
+
+    def test_route_cost_overrides_provider_cost(self):
+        router = SMSRouter([
+            SMSRoute(prefix="254", provider=self.cheap, cost_per_segment=Decimal("2")),
+            SMSRoute(prefix="254", provider=self.pricey)])
+        self.assertEqual(router.lookup("254712345678")[1], [self.pricey, self.cheap])
+
+    def test_split_falls_back_to_default_providers_without_repeating_them(self):
+        router = SMSRouter([SMSRoute(prefix="254", provider=self.unpriced)])
+        groups = router.split(["254712345678", "255712345678"], [self.unpriced, self.pricey, self.cheap])
+        self.assertEqual(groups, [
+            (["254712345678"], [self.unpriced, self.cheap, self.pricey]),
+            (["255712345678"], [self.cheap, self.pricey, self.unpriced]),
+        ])
+
+    def test_split_groups_recipients_sharing_routed_providers(self):
+        router = SMSRouter([
+            SMSRoute(prefix="25471", provider=self.pricey), SMSRoute(prefix="25472", provider=self.pricey),
+            SMSRoute(prefix="256", provider=self.cheap)])
+        groups = router.split(
+            ["254712345678", "256712345678", "254722345678", "257712345678"], [self.cheap])
+        self.assertEqual(groups, [
+            (["254712345678", "254722345678"], [self.pricey, self.cheap]),
+            (["256712345678"], [self.cheap]),
+            (["257712345678"], [self.cheap]),
+        ])
+
+    def test_split_without_routes_uses_the_defaults_by_cost(self):
+        recipients = ["254712345678", "255712345678"]
+        self.assertEqual(
+            SMSRouter([]).split(recipients, [self.pricey, self.cheap]), [(recipients, [self.cheap, self.pricey])])
+
+
+class SuppressionListTests(SimpleTestCase):
+    def test_added_hashes_stay_sorted_and_unique(self):
+        suppressions = SuppressionList()
+        suppressions._add_hashes(None, [5, 1, 3])
+        # A large batch, overlapping what is already indexed, is merged rather than inserted one at a time
+        suppressions._add_hashes(None, [3, 3, -7] + list(range(100, 200, 2)))
+        suppressions._add_hashes(None, [4, 5])
+        expected = sorted({1, 3, 4, 5, -7} | set(range(100, 200, 2)))
+        self.assertEqual(list(suppressions._hashes[None]), expected)
+
+
+class SegmentSMSTests(SimpleTestCase):
+    def test_segments(self):
+        cases = [
+            ("", SMSSegments(GSM_7, 1, 0)),
+            ("a" * 160, SMSSegments(GSM_7, 1, 160)),
+            ("a" * 161, SMSSegments(GSM_7, 2, 161)),
+            ("a" * 306, SMSSegments(GSM_7, 2, 306)),
+            ("a" * 307, SMSSegments(GSM_7, 3, 307)),
+            # Escaped characters count as two septets
+            ("€" * 80, SMSSegments(GSM_7, 1, 160)),
+            ("a" * 159 + "€", SMSSegments(GSM_7, 2, 161)),
+            ("{}" * 76 + "a", SMSSegments(GSM_7, 2, 305)),
+            # An escaped character is never split, so one straddling 153 septets starts the next part
+            ("a" * 152 + "€" + "a" * 152, SMSSegments(GSM_7, 3, 306)),
+            ("ç", SMSSegments(UCS_2, 1, 1)),
+            ("Ж" * 70, SMSSegments(UCS_2, 1, 70)),
+            ("Ж" * 71, SMSSegments(UCS_2, 2, 71)),
+            ("a" * 133 + "Ж", SMSSegments(UCS_2, 2, 134)),
+            ("Ж" * 135, SMSSegments(UCS_2, 3, 135)),
+            # Surrogate pairs take two code units and are never split either
+            ("😀" * 35, SMSSegments(UCS_2, 1, 70)),
+            ("😀" * 36, SMSSegments(UCS_2, 2, 72)),
+            ("Ж" * 66 + "😀" + "Ж" * 66, SMSSegments(UCS_2, 3, 134)),
+        ]
+        for body, expected in cases:
+            with self.subTest(body=body[:20], length=len(body)):
+                self.assertEqual(segment_sms(body), expected)
+
+
+class AttachmentTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = os.path.join(directory.name, "blobs")
+        self.outside = os.path.join(directory.name, "secret.txt")
+        os.makedirs(self.root)
+        with open(self.outside, "w") as fil:
+            fil.write("SECRET_KEY")
+        root = override_settings(ATTACHMENT_BLOB_ROOT=self.root)
+        root.enable()
+        self.addCleanup(root.disable)
+        attachment_cache.clear()
+        self.addCleanup(attachment_cache.clear)
+
+    @staticmethod
+    def payload(part) -> bytes:
+        return base64.b64decode(part.get_payload())
+
+    def test_blob_references_are_attached(self):
+        reference = store_blob(io.BytesIO(b"invoice"))
+        (part,) = build_attachment_parts([{"blob": reference, "filename": "invoice.pdf"}])
+        self.assertEqual(self.payload(part), b"invoice")
+        self.assertEqual(part.get_content_type(), "application/pdf")
+
+    def test_paths_outside_the_blob_store_are_rejected(self):
+        link = os.path.join(self.root, "link.txt")
+        os.symlink(self.outside, link)
+        for reference in (self.outside, {"path": self.outside}, os.path.join(self.root, "..", "secret.txt"), link):
+            with self.subTest(reference=reference), self.assertRaises(ValueError):
+                build_attachment_parts([reference])
+
+    def test_paths_inside_the_blob_store_are_attached(self):
+        path = os.path.join(self.root, "report.csv")
+        with open(path, "wb") as fil:
+            fil.write(b"a,b")
+        (part,) = build_attachment_parts([path])
+        self.assertEqual(self.payload(part), b"a,b")
+
+    def test_oversize_attachments_are_not_cached_or_are_refused(self):
+        content = os.urandom(2000)
+        reference = store_blob(io.BytesIO(content))
+        with mock.patch("core.backend.attachments.attachment_cache", EncodedAttachmentCache(4096)) as cache:
+            (part,) = build_attachment_parts([reference])
+            self.assertEqual(self.payload(part), content)
+            self.assertEqual(cache.current_bytes, 0)
+        with override_settings(ATTACHMENT_MAX_BYTES=1000), self.assertRaises(ValueError):
+            build_attachment_parts([reference])
+
+    def test_email_context_may_only_attach_blobs(self):
+        notification = SimpleNamespace(
+            template=Template(name="receipt", subject="Receipt", body="Hi"), recipients=["ann@example.com"],
+            context={}, coalesced_count=0)
+        for attachments, valid in (
+                (["sha256:" + "a" * 64], True), ([{"blob": "sha256:" + "a" * 64, "filename": "a.pdf"}], True),
+                (["/etc/passwd"], False), ([{"path": "/etc/passwd"}], False), ("sha256:" + "a" * 64, False)):
+            notification.context = {"attachments": attachments}
+            with self.subTest(attachments=attachments):
+                if valid:
+                    self.assertTrue(EmailNotification(notification).validate())
+                else:
+                    with self.assertRaises(ValidationError):
+                        EmailNotification(notification).validate()
+
+
+class DeviceTokenTests(TestCase):
+    def test_mark_invalid_upserts_and_invalid_tokens_finds_them(self):
+        DeviceToken.objects.create(token="live")
+        DeviceTokenService().mark_invalid({"gone": "UNREGISTERED", "live": "INVALID_ARGUMENT"})
+        DeviceTokenService().mark_invalid({"gone": "UNREGISTERED"})
+        self.assertEqual(DeviceToken.objects.count(), 2)
+        self.assertEqual(
+            dict(DeviceToken.objects.filter(is_valid=False).values_list("token", "invalid_reason")),
+            {"gone": "UNREGISTERED", "live": "INVALID_ARGUMENT"})
+        self.assertEqual(DeviceTokenService().invalid_tokens(["gone", "live", "new"]), {"gone", "live"})
+        self.assertEqual(DeviceTokenService().invalid_tokens([]), set())
+
+    def test_dead_tokens_are_filtered_before_sending(self):
+        DeviceTokenService().mark_invalid({"gone": "UNREGISTERED"})
+        notification = SimpleNamespace(
+            template=Template(name="alert", body="Hi"), recipients=["live", "gone"], context={}, coalesced_count=0)
+        push = PushNotification(notification)
+        self.assertTrue(push.validate())
+        self.assertEqual(push.recipients, ["live"])
+
+        notification.recipients = ["gone"]
+        with self.assertRaises(ValidationError):
+            PushNotification(notification).validate()
+
+
+class FirebasePushProviderTests(SimpleTestCase):
+    def test_tokens_are_sent_in_concurrent_chunks(self):
+        tokens = [f"token-{index}" for index in range(1201)]
+        # Every chunk waits for the other two, so sending them one after another breaks the barrier
+        barrier = threading.Barrier(3, timeout=5)
+
+        def send_each_for_multicast(message, app):
+            barrier.wait()
+            return SimpleNamespace(responses=[
+                SimpleNamespace(success=True, message_id=f"m-{token}", exception=None) for token in message.tokens])
+
+        provider = FirebasePushProvider({})
+        with mock.patch.object(FirebasePushProvider, "get_app"), \
+                mock.patch.object(messaging, "send_each_for_multicast", side_effect=send_each_for_multicast) as send, \
+                mock.patch("core.backend.providers.firebase_push_provider.State") as state:
+            self.assertEqual(provider.send(tokens, {"title": "Hi", "body": "Hello"}), state.sent.return_value)
+
+        self.assertEqual(sorted(len(call.args[0].tokens) for call in send.call_args_list), [201, 500, 500])
+        self.assertEqual(provider.recipient_statuses, {
+            token: {"status": "sent", "message_id": f"m-{token}"} for token in tokens})
+
+    def test_apps_are_cached_per_config(self):
+        config = {"project_id": "shop", "private_key_id": "1"}
+        with mock.patch.dict("core.backend.providers.firebase_push_provider._firebase_apps", clear=True), \
+                mock.patch("core.backend.providers.firebase_push_provider.credentials.Certificate"), \
+                mock.patch("firebase_admin.initialize_app", side_effect=lambda credential, name: name) as initialize:
+            first = FirebasePushProvider(dict(config)).get_app()
+            self.assertEqual(FirebasePushProvider(dict(config)).get_app(), first)
+            other = FirebasePushProvider({**config, "private_key_id": "2"}).get_app()
+
+        self.assertEqual(initialize.call_count, 2)
+        self.assertTrue(first.startswith("notify-shop-"))
+        self.assertNotEqual(other, first)
+
+    @staticmethod
+    def invalid_argument(field):
+        details = [{"@type": "type.googleapis.com/google.rpc.BadRequest",
+                    "fieldViolations": [{"field": field, "description": "Invalid value"}]}]
+        response = mock.Mock(**{"json.return_value": {"error": {"status": "INVALID_ARGUMENT", "details": details}}})
+        return firebase_exceptions.InvalidArgumentError("Invalid argument", http_response=response)
+
+    def test_only_token_errors_mark_tokens_dead(self):
+        responses = [
+            SimpleNamespace(success=True, message_id="m1", exception=None),
+            SimpleNamespace(success=False, exception=messaging.UnregisteredError("Unregistered")),
+            SimpleNamespace(success=False, exception=self.invalid_argument("message.token")),
+            SimpleNamespace(success=False, exception=self.invalid_argument("message.data")),
+            SimpleNamespace(success=False, exception=firebase_exceptions.InvalidArgumentError("Message too big")),
+        ]
+        tokens = ["ok", "unregistered", "bad-token", "bad-data", "too-big"]
+        provider = FirebasePushProvider({})
+        with mock.patch.object(messaging, "send_each_for_multicast", return_value=SimpleNamespace(responses=responses)):
+            provider.recipient_statuses = provider._send_chunk(None, tokens, {"title": "Hi", "body": "Hello"})
+        with mock.patch.object(DeviceTokenService, "mark_invalid") as mark_invalid:
+            provider._prune_dead_tokens()
+
+        mark_invalid.assert_called_once_with({"unregistered": "UNREGISTERED", "bad-token": "INVALID_ARGUMENT"})
+        self.assertEqual(
+            {token: result["error"] for token, result in provider.recipient_statuses.items() if "error" in result},
+            {"unregistered": "UNREGISTERED", "bad-token": "INVALID_ARGUMENT", "bad-data": "INVALID_ARGUMENT",
+             "too-big": "INVALID_ARGUMENT"})
+
+    def test_async_send_handles_non_json_error_bodies(self):
+        responses = {
+            "ok": httpx.Response(200, json={"name": "projects/p/messages/1"}),
+            "proxy": httpx.Response(502, text="<html>Bad Gateway</html>"),
+            "gone": httpx.Response(404, json={"error": {"status": "NOT_FOUND", "details": [
+                {"@type": "type.googleapis.com/google.firebase.fcm.v1.FcmError", "errorCode": "UNREGISTERED"}]}}),
+        }
+        client = mock.Mock(post=mock.AsyncMock(
+            side_effect=lambda url, headers, json: responses[json["message"]["token"]]))
+        provider = FirebasePushProvider({})
+        with mock.patch("core.backend.providers.firebase_push_provider.get_async_http_client", return_value=client):
+            results = {
+                token: asyncio.run(provider._send_token_async("https://fcm", {}, token, {"body": "Hi"}))
+                for token in responses}
+        self.assertEqual(results, {
+            "ok": {"status": "sent", "message_id": "projects/p/messages/1"},
+            "proxy": {"status": "failed", "error": "HTTP_502"},
+            "gone": {"status": "failed", "error": "UNREGISTERED", "invalid_token": True},
+        })
+
+
+@app.task(name="tests.retried_task", bind=True, max_retries=3)
+def retried_task(self, countdown):
+    raise self.retry(countdown=countdown)
+
+
+class AsyncDeliveryWorkerTests(SimpleTestCase):
+    def setUp(self):
+        self.worker = AsyncDeliveryWorker(max_retries=3, retry_delay=30)
+        send_task = mock.patch.object(app, "send_task")
+        self.send_task = send_task.start()
+        self.addCleanup(send_task.stop)
+
+    def handle(self, task_name, args=(), retries=0, eta=None):
+        message = mock.Mock(headers={"task": task_name, "id": "task-1", "retries": retries, "eta": eta})
+
+        async def run():
+            self.worker._slots = asyncio.Semaphore(1)
+            await self.worker._handle((list(args), {}, {}), message)
+
+        asyncio.run(run())
+        self.assertIs(self.worker._finished.get_nowait(), message)
+
+    def test_waits_for_the_eta_before_delivering(self):
+        eta = timezone.now() + timedelta(seconds=30)
+        with mock.patch.object(self.worker, "_deliver_notification") as deliver, \
+                mock.patch("core.backend.async_delivery_worker.asyncio.sleep") as sleep:
+            self.handle(DELIVER_NOTIFICATION_TASK, ["notification-1"], eta=eta.isoformat())
+        self.assertAlmostEqual(sleep.await_args.args[0], 30, delta=1)
+        deliver.assert_awaited_once_with("notification-1")
+        self.send_task.assert_not_called()
+
+    def test_failed_tasks_are_republished_until_the_retries_run_out(self):
+        with mock.patch.object(self.worker, "_deliver_notification", side_effect=RuntimeError("down")):
+            self.handle(DELIVER_NOTIFICATION_TASK, ["notification-1"], retries=1)
+            self.send_task.assert_called_once_with(
+                DELIVER_NOTIFICATION_TASK, args=["notification-1"], kwargs={}, retries=2, queue=self.worker.queue_name,
+                countdown=30)
+            self.send_task.reset_mock()
+            self.handle(DELIVER_NOTIFICATION_TASK, ["notification-1"], retries=3)
+        self.send_task.assert_not_called()
+
+    def test_fallback_tasks_retry_with_their_own_countdown(self):
+        self.handle("tests.retried_task", [120])
+        self.send_task.assert_called_once_with(
+            "tests.retried_task", args=[120], kwargs={}, retries=1, queue=self.worker.queue_name, countdown=120)
+
+    def test_unknown_tasks_are_dropped_without_retrying(self):
+        self.handle("tests.missing_task")
+        self.send_task.assert_not_called()
+
+
+class AfricasTalkingSMSProviderTests(SimpleTestCase):
+    def test_sdk_send_fails_when_no_recipient_is_accepted(self):
+        response = {"SMSMessageData": {"Recipients": [
+            {"number": "+254712345678", "statusCode": 403, "status": "InvalidPhoneNumber"}]}}
+        provider = AfricasTalkingSMSProvider({"username": "notify", "api_key": "key"})
+        with mock.patch("africastalking.initialize"), mock.patch("africastalking.SMS") as sms, \
+                mock.patch.object(State, "failed", return_value="failed"), \
+                mock.patch.object(State, "sent", return_value="sent"):
+            sms.send.return_value = response
+            self.assertEqual(provider.send(["254712345678"], {"body": "Hi"}), "failed")
+            response["SMSMessageData"]["Recipients"][0].update(statusCode=101, status="Success")
+            self.assertEqual(provider.send(["254712345678"], {"body": "Hi"}), "sent")
@@ -1,7 +1,33 @@
+from django.conf import settings
 from django.urls import path
 from .views import NotifyAPIsManager
 
-urlpatterns = [
-    path("send-notification/", NotifyAPIsManager().queue_send_notification, name="send_notification"),
-    path("belio-sms-callback/", NotifyAPIsManager().belio_sms_provider_callback, name="belio_sms_provider_callback"),
-]
\ No newline at end of file
+if settings.ASYNC_INGESTION:
+    # Non-blocking views for deployments served by an ASGI server
+    urlpatterns = [
+        path("send-notification/", NotifyAPIsManager().queue_send_notification_async, name="send_notification"),
+        path(
+            "send-bulk-notifications/", NotifyAPIsManager().queue_send_bulk_notifications_async,
+            name="send_bulk_notifications"),
+        path(
+            "belio-sms-callback/", NotifyAPIsManager().belio_sms_provider_callback_async,
+            name="belio_sms_provider_callback"),
+    ]
+else:
+    urlpatterns = [
+        path("send-notification/", NotifyAPIsManager().queue_send_notification, name="send_notification"),
+        path(
+            "send-bulk-notifications/", NotifyAPIsManager().queue_send_bulk_notifications,
+            name="send_bulk_notifications"),
+        path(
+            "belio-sms-callback/", NotifyAPIsManager().belio_sms_provider_callback,
+            name="belio_sms_provider_callback"),
+    ]
+
+urlpatterns += [
+    path("campaigns/", NotifyAPIsManager.create_campaign, name="create_campaign"),
+    path("campaigns/<uuid:campaign_id>/", NotifyAPIsManager.campaign_progress, name="campaign_progress"),
+    path(
+        "campaigns/<uuid:campaign_id>/<str:action>/", NotifyAPIsManager.campaign_action,
+        name="campaign_action"),
+]
@@ -1,17 +1,121 @@
+import asyncio
 import logging
 import json
 
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from django.core.handlers.wsgi import WSGIRequest
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 
-from core.backend.notification_manager import NotificationManager
-from core.models import State
-from core.tasks import send_notification
+from core.backend.broker import task_publisher
+from core.backend.campaign_manager import CampaignManager
+from core.backend.metrics import registry, timed_stage
+from core.tasks import deliver_notification, send_notification
+from notify.celery import app
+from utils.query_budget import query_budget
 
 logger = logging.getLogger(__name__)
 
+
+def _notification_manager():
+    # Imported on first use: the ingestion views only publish, so the web tier never loads the delivery stack
+    # unless it handles delivery reports or ingests in claim-check mode
+    from core.backend.notification_manager import NotificationManager
+    return NotificationManager()
+
+
 class NotifyAPIsManager:
+    @staticmethod
+    def _ingestion_labels(data: dict) -> dict:
+        return {
+            "system": str(data.get("system", "")).lower(),
+            "notification_type": str(data.get("notification_type", "")).lower(),
+        }
+
+    @staticmethod
+    def _claim_check() -> bool:
+        return settings.INGESTION_MODE == "claim_check"
+
+    @staticmethod
+    def _ingested_response(notification) -> JsonResponse:
+        return JsonResponse({
+            "code": "100.000.000",
+            "message": "Notification queued successfully",
+            "notification_id": str(notification.id),
+            "rejected_recipients": notification.rejected_recipients,
+        })
+
+    @staticmethod
+    def _ingested_bulk_response(results: list) -> JsonResponse:
+        return JsonResponse({
+            "code": "100.000.000",
+            "message": "Notifications queued successfully",
+            "queued": sum(1 for result in results if "notification_id" in result),
+            "notifications": [
+                {key: value for key, value in result.items() if key != "dispatched"} for result in results],
+        })
+
+    @staticmethod
+    def _queued_bulk_response(total: int, failed: list) -> JsonResponse:
+        # Publishes that went through stay on the broker, so the client is told which ones to resend
+        if total and len(failed) == total:
+            return JsonResponse({"code": "999.999.999", "message": "Send notifications failed with an exception"})
+        response = {
+            "code": "100.000.000",
+            "message": "Notifications queued successfully",
+            "queued": total - len(failed),
+        }
+        if failed:
+            response["failed"] = failed
+        return JsonResponse(response)
+
+    @staticmethod
+    def _rejected_response(ex: Exception) -> JsonResponse:
+        # KeyError's str() is the repr of its message
+        message = ex.args[0] if ex.args else ex
+        return JsonResponse({"code": "999.999.999", "message": f"Send notification failed: {message}"})
+
+    @staticmethod
+    def _ingest_notification(data: dict) -> JsonResponse:
+        """
+        Claim-check ingestion: validates and stores the notification, then queues only its id.
+
+        A notification whose id could not be queued is still stored as dispatched, so the scheduled
+        dispatcher queues it again later; the client is told it was queued either way.
+        """
+        try:
+            notification = _notification_manager().ingest_notification(data)
+        except (KeyError, ValueError) as ex:
+            return NotifyAPIsManager._rejected_response(ex)
+        if notification.dispatched_at:
+            try:
+                with query_budget("ingestion"), timed_stage(
+                        "ingestion", **NotifyAPIsManager._ingestion_labels(data)):
+                    deliver_notification.delay(str(notification.id))
+            except Exception as ex:
+                logger.exception("NotifyAPIsManager - _ingest_notification exception: %s" % ex)
+        return NotifyAPIsManager._ingested_response(notification)
+
+    @staticmethod
+    async def _ingest_notification_async(data: dict) -> JsonResponse:
+        """
+        Async counterpart of _ingest_notification; the validation and INSERT run in a worker thread.
+        """
+        try:
+            notification = await sync_to_async(
+                _notification_manager().ingest_notification, thread_sensitive=False)(data)
+        except (KeyError, ValueError) as ex:
+            return NotifyAPIsManager._rejected_response(ex)
+        if notification.dispatched_at:
+            try:
+                with timed_stage("ingestion", **NotifyAPIsManager._ingestion_labels(data)):
+                    await task_publisher.publish(deliver_notification.name, args=(str(notification.id),))
+            except Exception as ex:
+                logger.exception("NotifyAPIsManager - _ingest_notification_async exception: %s" % ex)
+        return NotifyAPIsManager._ingested_response(notification)
+
     @staticmethod
     @csrf_exempt
     def queue_send_notification(request: WSGIRequest) -> JsonResponse:
@@ -20,7 +124,9 @@ class NotifyAPIsManager:
 
         This view function handles HTTP POST requests to queue a notification for sending.
         It expects the request body to contain JSON data with the notification details.
-        The function uses Celery to queue the task for sending the notification.
+        The function uses Celery to queue the task for sending the notification. With INGESTION_MODE set to
+        "claim_check", the notification is validated and stored first and only its id is queued; the
+        response then carries the notification id, or the validation error.
 
         :param request: The HTTP request object.
         :type request: WSGIRequest
@@ -29,12 +135,127 @@ class NotifyAPIsManager:
         """
         try:
             data = json.loads(request.body)
-            send_notification.delay(data)
+            if NotifyAPIsManager._claim_check():
+                return NotifyAPIsManager._ingest_notification(data)
+            with query_budget("ingestion"), timed_stage("ingestion", **NotifyAPIsManager._ingestion_labels(data)):
+                send_notification.delay(data)
             return JsonResponse({"code": "100.000.000", "message": "Notification queued successfully"})
         except Exception as ex:
             logger.exception("NotifyAPIsManager - queue_send_notification exception: %s" % ex)
             return JsonResponse({"code": "999.999.999", "message": "Send notification failed with an exception"})
 
+    @staticmethod
+    @csrf_exempt
+    async def queue_send_notification_async(request: ASGIRequest) -> JsonResponse:
+        """
+        Queue a notification to be sent asynchronously, without blocking the event loop on the broker.
+
+        Async counterpart of queue_send_notification for deployments served by an ASGI server.
+
+        :param request: The HTTP request object.
+        :type request: ASGIRequest
+        :return: A JSON response indicating the result of the operation.
+        :rtype: JsonResponse
+        """
+        try:
+            data = json.loads(request.body)
+            if NotifyAPIsManager._claim_check():
+                return await NotifyAPIsManager._ingest_notification_async(data)
+            with timed_stage("ingestion", **NotifyAPIsManager._ingestion_labels(data)):
+                await task_publisher.publish(send_notification.name, args=(data,))
+            return JsonResponse({"code": "100.000.000", "message": "Notification queued successfully"})
+        except Exception as ex:
+            logger.exception("NotifyAPIsManager - queue_send_notification_async exception: %s" % ex)
+            return JsonResponse({"code": "999.999.999", "message": "Send notification failed with an exception"})
+
+    @staticmethod
+    @csrf_exempt
+    def queue_send_bulk_notifications(request: WSGIRequest) -> JsonResponse:
+        """
+        Queue several notifications in one request.
+
+        The request body is a JSON object with a "notifications" list, each item being the payload
+        accepted by queue_send_notification. All tasks are published over a single broker producer. In
+        claim-check mode the response lists, per notification, its id or the error it was rejected with.
+
+        :param request: The HTTP request object.
+        :type request: WSGIRequest
+        :return: A JSON response with the number of notifications queued and, if some could not be
+            published, the positions of those under "failed".
+        :rtype: JsonResponse
+        """
+        try:
+            notifications = json.loads(request.body).get("notifications", [])
+            if not isinstance(notifications, list):
+                raise ValueError("'notifications' must be a list")
+            if NotifyAPIsManager._claim_check():
+                results = _notification_manager().ingest_notifications(notifications)
+                try:
+                    with query_budget("ingestion"), timed_stage("bulk_ingestion"), \
+                            app.producer_or_acquire() as producer:
+                        for result in results:
+                            if result.get("dispatched"):
+                                deliver_notification.apply_async((result["notification_id"],), producer=producer)
+                except Exception as ex:
+                    logger.exception("NotifyAPIsManager - queue_send_bulk_notifications exception: %s" % ex)
+                return NotifyAPIsManager._ingested_bulk_response(results)
+            failed = []
+            with query_budget("ingestion"), timed_stage("bulk_ingestion"), app.producer_or_acquire() as producer:
+                for index, data in enumerate(notifications):
+                    try:
+                        send_notification.apply_async((data,), producer=producer)
+                    except Exception as ex:
+                        logger.exception("NotifyAPIsManager - queue_send_bulk_notifications exception: %s" % ex)
+                        failed.append(index)
+            return NotifyAPIsManager._queued_bulk_response(len(notifications), failed)
+        except Exception as ex:
+            logger.exception("NotifyAPIsManager - queue_send_bulk_notifications exception: %s" % ex)
+            return JsonResponse({"code": "999.999.999", "message": "Send notifications failed with an exception"})
+
+    @staticmethod
+    @csrf_exempt
+    async def queue_send_bulk_notifications_async(request: ASGIRequest) -> JsonResponse:
+        """
+        Queue several notifications in one request without blocking the event loop on the broker.
+
+        Async counterpart of queue_send_bulk_notifications; publishes run concurrently over the channel pool.
+
+        :param request: The HTTP request object.
+        :type request: ASGIRequest
+        :return: A JSON response with the number of notifications queued and, if some could not be
+            published, the positions of those under "failed".
+        :rtype: JsonResponse
+        """
+        try:
+            notifications = json.loads(request.body).get("notifications", [])
+            if not isinstance(notifications, list):
+                raise ValueError("'notifications' must be a list")
+            if NotifyAPIsManager._claim_check():
+                results = await sync_to_async(
+                    _notification_manager().ingest_notifications, thread_sensitive=False)(notifications)
+                with timed_stage("bulk_ingestion"):
+                    published = await asyncio.gather(
+                        *(task_publisher.publish(deliver_notification.name, args=(result["notification_id"],))
+                          for result in results if result.get("dispatched")), return_exceptions=True)
+                for ex in published:
+                    if isinstance(ex, Exception):
+                        logger.error(
+                            "NotifyAPIsManager - queue_send_bulk_notifications_async exception: %s" % ex, exc_info=ex)
+                return NotifyAPIsManager._ingested_bulk_response(results)
+            with timed_stage("bulk_ingestion"):
+                published = await asyncio.gather(
+                    *(task_publisher.publish(send_notification.name, args=(data,)) for data in notifications),
+                    return_exceptions=True)
+            failed = [index for index, result in enumerate(published) if isinstance(result, Exception)]
+            for index in failed:
+                logger.error(
+                    "NotifyAPIsManager - queue_send_bulk_notifications_async exception: %s" % published[index],
+                    exc_info=published[index])
+            return NotifyAPIsManager._queued_bulk_response(len(notifications), failed)
+        except Exception as ex:
+            logger.exception("NotifyAPIsManager - queue_send_bulk_notifications_async exception: %s" % ex)
+            return JsonResponse({"code": "999.999.999", "message": "Send notifications failed with an exception"})
+
     @csrf_exempt
     def belio_sms_provider_callback(self, request):
         """
@@ -42,7 +263,8 @@ class NotifyAPIsManager:
 
         This view function processes HTTP POST requests containing SMS delivery status updates.
         It expects the request body to contain JSON data with the delivery status, correlator, and timestamp.
-        Based on the delivery status, it updates the notification status in the database.
+        Based on the delivery status, it updates the recipients the report is for and the notification's
+        aggregate status in the database.
 
         :param request: The HTTP request object.
         :type request: WSGIRequest
@@ -56,20 +278,137 @@ class NotifyAPIsManager:
             notification_id = data.get("correlator", "")
             sent_time = data.get("timestamp", "")
 
-            if delivery_status == "DeliveredToTerminal":
-                NotificationManager().update_notification_status(
-                    notification_id=notification_id,
-                    status = State.sent(),
-                    sent_time=sent_time
-                )
-            else:
-                NotificationManager().update_notification_status(
-                    notification_id=notification_id,
-                    status=State.failed(),
-                    sent_time=None
-                )
+            with query_budget("dlr_callback"):
+                _notification_manager().record_delivery_report(
+                    notification_id, delivery_status, delivered=delivery_status == "DeliveredToTerminal",
+                    addresses=data.get("address"), reported_at=sent_time)
 
             return JsonResponse({"message": "Success"})
         except Exception as ex:
             logger.exception("NotifyAPIsManager - belio_sms_provider_callback exception: %s" % ex)
-            return JsonResponse({"message": "Internal server error"}, status=500)
\ No newline at end of file
+            return JsonResponse({"message": "Internal server error"}, status=500)
+
+    @csrf_exempt
+    async def belio_sms_provider_callback_async(self, request: ASGIRequest) -> JsonResponse:
+        """
+        Handle Belio SMS Provider delivery status callback under an ASGI server.
+
+        Async counterpart of belio_sms_provider_callback; the database update and system callback
+        run in a worker thread so the event loop keeps serving other requests.
+
+        :param request: The HTTP request object.
+        :type request: ASGIRequest
+        :return: A JSON response indicating the result of the operation.
+        :rtype: JsonResponse
+        """
+        try:
+            data = json.loads(request.body)
+
+            delivery_status = data.get("deliveryStatus", "")
+            notification_id = data.get("correlator", "")
+            sent_time = data.get("timestamp", "")
+
+            def update_status():
+                _notification_manager().record_delivery_report(
+                    notification_id, delivery_status, delivered=delivery_status == "DeliveredToTerminal",
+                    addresses=data.get("address"), reported_at=sent_time)
+
+            await sync_to_async(update_status, thread_sensitive=False)()
+
+            return JsonResponse({"message": "Success"})
+        except Exception as ex:
+            logger.exception("NotifyAPIsManager - belio_sms_provider_callback_async exception: %s" % ex)
+            return JsonResponse({"message": "Internal server error"}, status=500)
+
+    @staticmethod
+    @csrf_exempt
+    def create_campaign(request: WSGIRequest) -> JsonResponse:
+        """
+        Create a campaign that sends one template to every recipient in an uploaded file.
+
+        Expects a multipart POST with the campaign settings as form fields (name, system, notification_type,
+        template and optionally organisation, context as JSON, send_rate and source_format) and the CSV or
+        NDJSON recipient file as "recipients". The file is stored and streamed by a worker, never read here.
+
+        :param request: The HTTP request object.
+        :type request: WSGIRequest
+        :return: A JSON response with the campaign id.
+        :rtype: JsonResponse
+        """
+        try:
+            source = request.FILES.get("recipients")
+            if source is None:
+                raise KeyError("Missing 'recipients' file")
+            campaign = CampaignManager().create_campaign(request.POST.dict(), source)
+            return JsonResponse({
+                "code": "100.000.000", "message": "Campaign created successfully", "campaign_id": str(campaign.id)})
+        except Exception as ex:
+            logger.exception("NotifyAPIsManager - create_campaign exception: %s" % ex)
+            return JsonResponse({"code": "999.999.999", "message": f"Create campaign failed: {ex}"})
+
+    @staticmethod
+    def campaign_progress(request: WSGIRequest, campaign_id) -> JsonResponse:
+        """
+        Report a campaign's status, counters and its notifications counted by state.
+
+        :param request: The HTTP request object.
+        :type request: WSGIRequest
+        :param campaign_id: The campaign id.
+        :return: A JSON response with the campaign's progress.
+        :rtype: JsonResponse
+        """
+        try:
+            progress = CampaignManager.progress(campaign_id)
+            if progress is None:
+                return JsonResponse({"code": "404.000.000", "message": "Campaign not found"}, status=404)
+            return JsonResponse({"code": "100.000.000", "message": "Success", **progress})
+        except Exception as ex:
+            logger.exception("NotifyAPIsManager - campaign_progress exception: %s" % ex)
+            return JsonResponse({"code": "999.999.999", "message": "Campaign progress failed with an exception"})
+
+    @staticmethod
+    @csrf_exempt
+    def campaign_action(request: WSGIRequest, campaign_id, action: str) -> JsonResponse:
+        """
+        Pause, resume or cancel a campaign.
+
+        :param request: The HTTP request object.
+        :type request: WSGIRequest
+        :param campaign_id: The campaign id.
+        :param action: One of "pause", "resume" or "cancel".
+        :return: A JSON response indicating the result of the operation.
+        :rtype: JsonResponse
+        """
+        try:
+            actions = {
+                "pause": (CampaignManager.pause, "paused"),
+                "resume": (CampaignManager().resume, "resumed"),
+                "cancel": (CampaignManager.cancel, "cancelled"),
+            }
+            if request.method != "POST" or action not in actions:
+                return JsonResponse({"code": "999.999.999", "message": "Unsupported campaign action"}, status=400)
+            handler, done = actions[action]
+            if not handler(campaign_id):
+                return JsonResponse({
+                    "code": "999.999.999", "message": f"Campaign cannot be {done} in its current state"})
+            return JsonResponse({"code": "100.000.000", "message": f"Campaign {done} successfully"})
+        except Exception as ex:
+            logger.exception("NotifyAPIsManager - campaign_action exception: %s" % ex)
+            return JsonResponse({"code": "999.999.999", "message": "Campaign action failed with an exception"})
+
+    @staticmethod
+    def metrics(request: WSGIRequest) -> HttpResponse:
+        """
+        Expose pipeline metrics in the Prometheus text format.
+
+        If METRICS_AUTH_TOKEN is set, the request must carry it as a bearer token.
+
+        :param request: The HTTP request object.
+        :type request: WSGIRequest
+        :return: The metrics exposition.
+        :rtype: HttpResponse
+        """
+        auth_token = getattr(settings, "METRICS_AUTH_TOKEN", None)
+        if auth_token and request.headers.get("Authorization") != f"Bearer {auth_token}":
+            return HttpResponse(status=401)
+        return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,6 +1,8 @@
 import os
+import time
 
 from celery import Celery
+from celery.signals import before_task_publish
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'notify.settings')
 
@@ -8,4 +10,11 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'notify.settings')
 app = Celery("notify")
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.conf.task_default_queue = "notification_queue"
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+
+@before_task_publish.connect
+def stamp_enqueue_time(headers=None, **kwargs):
+    """ record the publish time so workers can measure queue wait """
+    if headers is not None:
+        headers.setdefault("enqueued_at", time.time())
@@ -124,6 +124,12 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Email attachments. Files are only ever read from ATTACHMENT_BLOB_ROOT; larger than ATTACHMENT_MAX_BYTES
+# they are refused, and encodings over a quarter of ATTACHMENT_CACHE_MAX_BYTES are not cached
+ATTACHMENT_BLOB_ROOT = BASE_DIR / 'blobs'
+ATTACHMENT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+ATTACHMENT_MAX_BYTES = 25 * 1024 * 1024
+
 """ RabbitMQ configs """
 # RABBITMQ_USER = os.environ.get('RABBITMQ_USER')
 # RABBITMQ_PASSWORD = os.environ.get('RABBITMQ_PASSWORD')
@@ -142,3 +148,120 @@ CELERY_BROKER_URL = f'amqp://{RABBITMQ_USER}:{RABBITMQ_PASSWORD}@{RABBITMQ_HOST}
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+
+# Ingestion: serve the async views (requires an ASGI server) and publish over a pooled aio-pika channel
+ASYNC_INGESTION = False
+BROKER_CHANNEL_POOL_SIZE = 10
+# "queue" publishes each payload for a worker to validate and store; "claim_check" validates and stores the
+# notification in the request, returns its id and queues only the id, so payloads stay out of the broker
+INGESTION_MODE = "queue"
+
+# Metrics: with METRICS_MULTIPROC_DIR set, every process (web, Celery, delivery worker) writes
+# its metrics there and /metrics aggregates them. The files of processes that exited on the scraping host
+# are folded into one "<hostname>-dead.json" per host
+METRICS_ENABLED = True
+METRICS_MULTIPROC_DIR = None
+METRICS_FLUSH_INTERVAL = 5
+METRICS_AUTH_TOKEN = None
+
+# Query budgets: maximum database queries per code path. Set QUERY_BUDGET_MODE to "warn" to log
+# paths that exceed their budget, or "raise" (e.g. in tests) to fail them
+QUERY_BUDGET_MODE = "warn"
+QUERY_BUDGETS = {
+    # Publishing only; the task's queries are charged to its own budgets
+    "ingestion": 0,
+    # The INSERT, plus up to four reference cache reloads (system, organisation, notification type, template),
+    # a suppression list refresh and a suppression lookup for recipients whose hash is on the list
+    "save_notification": 7,
+    # save_notification's queries, run in the request in claim-check ingestion mode
+    "claim_check_ingestion": 7,
+    # Device token check (push only), the per-recipient delivery upsert and the status UPDATE, plus active
+    # provider and SMS route cache reloads and the suppression of hard-bounced recipients
+    "send_notification": 6,
+    # The per-recipient UPDATE, the notification's counter UPDATE and its load and, for an undeliverable
+    # number, its suppression
+    "dlr_callback": 4,
+}
+
+# Slow task profiling: a TASK_PROFILE_SAMPLE_RATE fraction of TASK_PROFILE_TASKS runs under cProfile;
+# sampled runs slower than TASK_PROFILE_SLOW_SECONDS dump a .prof file to TASK_PROFILE_DIR and log
+# their stage breakdown and SQL. 0.01 is cheap enough to leave on in production
+TASK_PROFILE_SAMPLE_RATE = 0
+TASK_PROFILE_SLOW_SECONDS = 10
+TASK_PROFILE_DIR = BASE_DIR / 'profiles'
+TASK_PROFILE_TASKS = ["notify.send_notification"]
+TASK_PROFILE_MAX_SQL = 100
+
+# Reference data (systems, organisations, notification types, templates, active providers) is cached per
+# process and reloaded after REFERENCE_CACHE_TTL seconds; 0 reads it from the database every time
+REFERENCE_CACHE_TTL = 60
+
+# Worker warm-up: each worker process connects to the database, loads reference data, compiles templates
+# and initialises provider clients before it takes tasks. Warm-up gives up after WORKER_WARMUP_TIMEOUT
+# seconds; CELERY_WORKER_PROC_ALIVE_TIMEOUT must leave room for it. WORKER_READY_FILE is written once
+# the worker consumes (e.g. for a readiness probe)
+WORKER_WARMUP = True
+WORKER_WARMUP_TIMEOUT = 20
+CELERY_WORKER_PROC_ALIVE_TIMEOUT = WORKER_WARMUP_TIMEOUT + 10
+WORKER_READY_FILE = None
+
+# Database connections: PROCESS_TYPE (web, worker, delivery or beat) labels this process's connection
+# metrics. Connections are kept for a minute and health-checked before reuse; SQLite has no pool
+PROCESS_TYPE = "web"
+DB_POOL = False
+DATABASES['default']['CONN_MAX_AGE'] = 60
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Uploaded files (campaign recipient lists). Web and worker processes must share this directory
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Campaigns: each tick materialises send_rate * CAMPAIGN_TICK_SECONDS recipients (at most
+# CAMPAIGN_MAX_CHUNK_SIZE) into the paced backlog; campaigns without a send_rate use CAMPAIGN_DEFAULT_SEND_RATE
+CAMPAIGN_DEFAULT_SEND_RATE = 100
+CAMPAIGN_TICK_SECONDS = 5
+CAMPAIGN_MAX_CHUNK_SIZE = 5000
+
+# Send pacing: notifications of systems and organisations with a max_send_rate, and of campaigns, wait in the
+# database and are released every SEND_PACING_TICK_SECONDS at the lowest of their system's, organisation's
+# and campaign's rates, at most SEND_PACING_MAX_RELEASE per system, organisation and campaign per tick
+SEND_PACING_TICK_SECONDS = 1
+SEND_PACING_MAX_RELEASE = 5000
+
+# Scheduled sends: every SCHEDULED_DISPATCH_INTERVAL seconds beat dispatches the notifications whose send_at
+# falls before the next run, claiming them in batches of SCHEDULED_DISPATCH_BATCH_SIZE (at most
+# SCHEDULED_DISPATCH_MAX_PER_RUN). Notifications due at the same time are spread over SCHEDULED_SPREAD_SECONDS.
+# Dispatched notifications no worker picked up after SCHEDULED_REDISPATCH_AFTER seconds are dispatched again
+SCHEDULED_DISPATCH_INTERVAL = 60
+SCHEDULED_DISPATCH_BATCH_SIZE = 500
+SCHEDULED_DISPATCH_MAX_PER_RUN = 20000
+SCHEDULED_SPREAD_SECONDS = 60
+SCHEDULED_REDISPATCH_AFTER = 600
+CELERY_BEAT_SCHEDULE = {
+    "dispatch-due-notifications": {
+        "task": "notify.dispatch_due_notifications",
+        "schedule": SCHEDULED_DISPATCH_INTERVAL,
+        "options": {"expires": SCHEDULED_DISPATCH_INTERVAL},
+    },
+    "release-paced-notifications": {
+        "task": "notify.release_paced_notifications",
+        "schedule": SEND_PACING_TICK_SECONDS,
+        "options": {"expires": SEND_PACING_TICK_SECONDS},
+    },
+}
+
+# Suppression lists: recipients on a system's list (or the global one) are dropped before sending. Each process
+# reads entries added elsewhere every SUPPRESSION_CACHE_TTL seconds (0 checks the database for every
+# recipient) and reloads the whole list every SUPPRESSION_FULL_RELOAD_SECONDS. Numbers reported with one of
+# SUPPRESSION_DLR_STATUSES are suppressed automatically, as are hard-bounced addresses
+SUPPRESSION_CACHE_TTL = 30
+SUPPRESSION_FULL_RELOAD_SECONDS = 3600
+SUPPRESSION_DLR_STATUSES = ["DeliveryImpossible"]
+
+# Recipient normalisation: phone numbers are stored as E.164 digits without the '+'; local numbers (starting
+# with a single 0) take SMS_DEFAULT_COUNTRY_CODE. Invalid recipients are dropped and reported in the callback
+SMS_DEFAULT_COUNTRY_CODE = "254"
+
+# SMS segmentation: a body is sent as GSM-7 (160 characters, 153 per part when concatenated) unless it has
+# a character outside that alphabet, which makes it UCS-2 (70, 67 per part). Systems without their own
+# max_sms_segments may send bodies of up to SMS_MAX_SEGMENTS segments
+SMS_MAX_SEGMENTS = 3
@@ -18,7 +18,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from core.views import NotifyAPIsManager
+
 urlpatterns = [
     path('cia/', admin.site.urls),
-    path('core/', include('core.urls'))
+    path('core/', include('core.urls')),
+    path('metrics', NotifyAPIsManager.metrics, name='metrics'),
 ]
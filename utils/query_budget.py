@@ -0,0 +1,142 @@
+import logging
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\((?:\s*\?\s*,?)+\)")
+
+_active = threading.local()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def normalise_sql(sql: str) -> str:
+    """
+    Replaces literals in a SQL statement so that repeats of the same query with different parameters compare equal.
+    """
+    return _IN_LISTS.sub("(?)", _LITERALS.sub("?", sql))
+
+
+class QueryBudget:
+    """
+    Context manager that counts the database queries run inside a block and checks them against a budget.
+
+    Queries run by nested budgets are charged to the innermost one only, so a view's budget is not
+    consumed by work (e.g. an eager Celery task) that has its own budget. Statements repeated at
+    least `repeat_threshold` times with different parameters are reported as likely N+1 queries.
+
+    :param label: Name of the code path, used in reports.
+    :param max_queries: Allowed number of queries, or None to only count.
+    :param mode: "raise" to raise QueryBudgetExceeded, "warn" to log a warning.
+    :param using: Database alias to watch.
+    :param repeat_threshold: Number of repeats of one statement reported as an N+1 pattern.
+    """
+
+    def __init__(
+            self, label: str, max_queries: Optional[int] = None, mode: str = "raise", using: str = DEFAULT_DB_ALIAS,
+            repeat_threshold: int = 3):
+        self.label = label
+        self.max_queries = max_queries
+        self.mode = mode
+        self.repeat_threshold = repeat_threshold
+        self._context = CaptureQueriesContext(connections[using])
+        self._nested_indexes: List[Tuple[int, int]] = []
+        self.queries: List[Dict[str, str]] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    def __enter__(self) -> "QueryBudget":
+        stack = getattr(_active, "stack", None)
+        if stack is None:
+            stack = _active.stack = []
+        stack.append(self)
+        self._context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._context.__exit__(exc_type, exc_value, traceback)
+        _active.stack.pop()
+
+        start, end = self._context.initial_queries, self._context.final_queries
+        if _active.stack:
+            _active.stack[-1]._nested_indexes.append((start, end))
+        captured = self._context.captured_queries
+        excluded = set()
+        for nested_start, nested_end in self._nested_indexes:
+            excluded.update(range(nested_start - start, nested_end - start))
+        self.queries = [query for index, query in enumerate(captured) if index not in excluded]
+
+        if exc_type is None:
+            self.check()
+
+    def repeated_queries(self) -> List[Tuple[str, int]]:
+        """
+        Returns the statements run at least `repeat_threshold` times, most repeated first.
+        """
+        counts = Counter(normalise_sql(query["sql"]) for query in self.queries)
+        return [(sql, count) for sql, count in counts.most_common() if count >= self.repeat_threshold]
+
+    def report(self) -> str:
+        lines = [f"{self.label}: {self.count} queries (budget {self.max_queries})"]
+        lines.extend(f"  {index}. {query['sql']}" for index, query in enumerate(self.queries, start=1))
+        for sql, count in self.repeated_queries():
+            lines.append(f"  Possible N+1, run {count} times: {sql}")
+        return "\n".join(lines)
+
+    def check(self) -> None:
+        if self.max_queries is None or self.count <= self.max_queries:
+            return
+        if self.mode == "raise":
+            raise QueryBudgetExceeded(self.report())
+        logger.warning("QueryBudget - budget exceeded by %s", self.report())
+
+
+@contextmanager
+def query_budget(label: str) -> Iterator[Optional[QueryBudget]]:
+    """
+    Applies the budget declared for a code path in settings.QUERY_BUDGETS.
+
+    Does nothing unless settings.QUERY_BUDGET_MODE is "warn" or "raise", so production paths pay
+    no capturing overhead.
+
+    :param label: Key of the code path in QUERY_BUDGETS.
+    """
+    mode = getattr(settings, "QUERY_BUDGET_MODE", "off")
+    if mode not in ("warn", "raise"):
+        yield None
+        return
+    with QueryBudget(label, getattr(settings, "QUERY_BUDGETS", {}).get(label), mode=mode) as budget:
+        yield budget
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin asserting that a block stays within a query budget.
+
+    Usage:
+        with self.assertQueryBudget("send_notification"):
+            NotificationManager().send_notification(notification)
+    """
+
+    def assertQueryBudget(self, label: str, max_queries: Optional[int] = None, using: str = DEFAULT_DB_ALIAS):
+        """
+        :param label: Code path name; its budget is taken from settings.QUERY_BUDGETS unless max_queries is given.
+        :param max_queries: Explicit budget.
+        :param using: Database alias to watch.
+        """
+        if max_queries is None:
+            max_queries = settings.QUERY_BUDGETS[label]
+        return QueryBudget(label, max_queries, mode="raise", using=using)